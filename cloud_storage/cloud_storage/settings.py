@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "storage.metrics.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -98,13 +99,17 @@ LOGIN_REDIRECT_URL = "/"
 
 WSGI_APPLICATION = "cloud_storage.wsgi.application"
 
+# Режим запуска: wsgi (gunicorn sync) или asgi (gunicorn + uvicorn, асинхронные представления скачивания и загрузки)
+SERVER_MODE = env('SERVER_MODE', default='wsgi')
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # для замеров и локальной разработки можно задать django.db.backends.sqlite3 (DB_NAME - путь к файлу)
+        'ENGINE': env('DB_ENGINE', default='django.db.backends.postgresql'),
         'NAME': env('DB_NAME'),
         'HOST': env('DB_HOST', default='localhost'),
         'PORT': env('DB_PORT'),
@@ -165,6 +170,121 @@ MEDIA_ROOT = os.path.join(BASE_DIR, env('STORAGE_PATH'))
 
 APPEND_SLASH=False
 
+# Хранилище файлов пользователей:
+#   filesystem - каталог MEDIA_ROOT
+#   s3         - S3-совместимое объектное хранилище (AWS S3, MinIO); MEDIA_ROOT остаётся для временных файлов
+STORAGE_BACKEND = env('STORAGE_BACKEND', default='filesystem')
+if STORAGE_BACKEND == 's3':
+    STORAGES = {
+        'default': {
+            'BACKEND': 'storage.s3.ObjectStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        },
+    }
+# Параметры объектного хранилища (S3_ENDPOINT_URL - адрес MinIO или другого S3-совместимого сервера)
+S3_BUCKET = env('S3_BUCKET', default='')
+S3_ENDPOINT_URL = env('S3_ENDPOINT_URL', default=None)
+S3_ACCESS_KEY = env('S3_ACCESS_KEY', default=None)
+S3_SECRET_KEY = env('S3_SECRET_KEY', default=None)
+S3_REGION = env('S3_REGION', default=None)
+# время жизни подписанных ссылок на скачивание, секунды
+S3_URL_EXPIRE = env.int('S3_URL_EXPIRE', default=300)
+
+# Дедупликация: одинаковое содержимое хранится один раз в хранилище под именем BLOBS_DIR/ab/cd/<sha256>
+STORAGE_DEDUPLICATION = env('STORAGE_DEDUPLICATION', default='False') == 'True'
+BLOBS_DIR = env('BLOBS_DIR', default='.blobs')
+
+# Способ отдачи файлов при скачивании:
+#   python   - файл читает и отправляет воркер Django
+#   nginx    - заголовок X-Accel-Redirect на internal location DOWNLOAD_INTERNAL_URL
+#   sendfile - заголовок X-Sendfile с абсолютным путём (Apache mod_xsendfile, lighttpd)
+#   redirect - перенаправление на подписанную ссылку объектного хранилища (STORAGE_BACKEND=s3)
+DOWNLOAD_BACKEND = env('DOWNLOAD_BACKEND', default='redirect' if STORAGE_BACKEND == 's3' else 'python')
+DOWNLOAD_INTERNAL_URL = env('DOWNLOAD_INTERNAL_URL', default='/protected/')
+
+# Подписанные ссылки на скачивание: ключ HMAC (смена ключа отзывает все выданные ссылки),
+# срок действия по умолчанию и максимальный, секунды
+SIGNED_URL_KEY = env('SIGNED_URL_KEY', default=SECRET_KEY)
+SIGNED_URL_TTL = env.int('SIGNED_URL_TTL', default=3600)
+SIGNED_URL_MAX_TTL = env.int('SIGNED_URL_MAX_TTL', default=7 * 24 * 3600)
+
+# Интервал пакетной записи статистики скачиваний, секунды (0 - записывать сразу)
+DOWNLOAD_STATS_FLUSH_INTERVAL = env.int('DOWNLOAD_STATS_FLUSH_INTERVAL', default=10)
+
+# Кэш Django (например, CACHE_URL=redis://redis:6379/1 для общего кэша нескольких процессов)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Кэш коротких ссылок: LRU в памяти процесса и, опционально, общий кэш из CACHES
+SHORT_LINK_CACHE_SIZE = env.int('SHORT_LINK_CACHE_SIZE', default=10000)
+SHORT_LINK_CACHE_TTL = env.int('SHORT_LINK_CACHE_TTL', default=30)
+SHORT_LINK_CACHE_BACKEND = env('SHORT_LINK_CACHE_BACKEND', default='')
+
+# Метрики Prometheus на /metrics; METRICS_TOKEN - токен для заголовка Authorization: Bearer
+METRICS_ENABLED = env('METRICS_ENABLED', default='False') == 'True'
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Токены API: срок действия в секундах (0 - бессрочно) и кэш токенов, устроенный как кэш коротких ссылок
+TOKEN_EXPIRE = env.int('TOKEN_EXPIRE', default=0)
+TOKEN_CACHE_SIZE = env.int('TOKEN_CACHE_SIZE', default=10000)
+TOKEN_CACHE_TTL = env.int('TOKEN_CACHE_TTL', default=60)
+TOKEN_CACHE_BACKEND = env('TOKEN_CACHE_BACKEND', default='')
+
+# Превью изображений: размер стороны, каталог дискового кэша в MEDIA_ROOT и его предельный размер в байтах
+PREVIEW_SIZE = env.int('PREVIEW_SIZE', default=256)
+PREVIEW_CACHE_DIR = env('PREVIEW_CACHE_DIR', default='.previews')
+PREVIEW_CACHE_MAX_SIZE = env.int('PREVIEW_CACHE_MAX_SIZE', default=512 * 1024 * 1024)
+# создавать превью в фоне сразу после загрузки, а не при первом запросе
+PREVIEW_ON_UPLOAD = env('PREVIEW_ON_UPLOAD', default='False') == 'True'
+
+# Фоновые задачи: database (очередь в БД и команда run_jobs), thread (пул потоков процесса, без сохранения) или inline
+JOB_QUEUE = env('JOB_QUEUE', default='database')
+JOB_MAX_ATTEMPTS = env.int('JOB_MAX_ATTEMPTS', default=5)
+# задержка перед первым повтором, секунды; далее удваивается
+JOB_RETRY_DELAY = env.int('JOB_RETRY_DELAY', default=10)
+# задача, не завершённая за это время, передаётся другому обработчику
+JOB_VISIBILITY_TIMEOUT = env.int('JOB_VISIBILITY_TIMEOUT', default=300)
+JOB_POLL_INTERVAL = env.int('JOB_POLL_INTERVAL', default=1)
+# проверка загруженных файлов (например, антивирусом): путь к функции, получающей путь к файлу
+FILE_SCAN_HOOK = env('FILE_SCAN_HOOK', default='')
+
+# Квота пользователя по умолчанию в байтах (0 - без ограничений)
+DEFAULT_USER_QUOTA = env.int('DEFAULT_USER_QUOTA', default=0)
+
+# Максимальная вложенность папок
+FOLDER_MAX_DEPTH = env.int('FOLDER_MAX_DEPTH', default=32)
+
+# Журнал изменений (GET /storagefiles/changes/): наибольшее время ожидания long-poll
+# и интервал опроса БД во время ожидания, секунды
+CHANGES_MAX_WAIT = env.int('CHANGES_MAX_WAIT', default=30)
+CHANGES_POLL_INTERVAL = env.float('CHANGES_POLL_INTERVAL', default=2.0)
+CHANGES_PAGE_SIZE = env.int('CHANGES_PAGE_SIZE', default=500)
+# Ожидание в синхронном представлении занимает рабочий процесс WSGI, поэтому оно ограничено отдельно
+# (0 - ответ сразу); без ограничения long-poll обслуживает асинхронное представление (SERVER_MODE=asgi)
+CHANGES_SYNC_MAX_WAIT = env.int('CHANGES_SYNC_MAX_WAIT', default=0)
+
+# Максимальное число файлов в одной групповой операции
+BULK_MAX_FILES = env.int('BULK_MAX_FILES', default=1000)
+
+# Загрузка файлов по частям
+UPLOAD_CHUNK_SIZE = env.int('UPLOAD_CHUNK_SIZE', default=8 * 1024 * 1024)
+UPLOAD_MAX_CHUNK_SIZE = env.int('UPLOAD_MAX_CHUNK_SIZE', default=64 * 1024 * 1024)
+# время жизни незавершённой сессии загрузки, секунды
+UPLOAD_SESSION_TTL = env.int('UPLOAD_SESSION_TTL', default=24 * 60 * 60)
+
+# Версии файлов: сколько прежних версий хранить (0 - без версий) и сколько секунд
+# хранить заменённую версию (0 - без ограничения, удаляет команда prune_versions)
+FILE_VERSIONS = env.int('FILE_VERSIONS', default=0)
+FILE_VERSION_MAX_AGE = env.int('FILE_VERSION_MAX_AGE', default=0)
+
+# Обновление файла по блокам (POST /storagefiles/<id>/delta/): размер блока по умолчанию
+# и время хранения подписей блоков в кэше, секунды
+DELTA_BLOCK_SIZE = env.int('DELTA_BLOCK_SIZE', default=4 * 1024 * 1024)
+DELTA_SIGNATURE_CACHE_TTL = env.int('DELTA_SIGNATURE_CACHE_TTL', default=24 * 60 * 60)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -172,7 +292,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'storage.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
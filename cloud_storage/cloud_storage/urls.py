@@ -20,14 +20,16 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 
-from storage.views import custom_register, csrf_token_view
+from storage import async_views
+from storage.views import custom_register, csrf_token_view, download_signed, metrics_view
 
-from storage.views import UserViewSet, StorageFilesViewSet, CustomAuthToken
+from storage.views import UserViewSet, FolderViewSet, StorageFilesViewSet, CustomAuthToken
 
 
 router = routers.DefaultRouter()
 router.register(r'users', UserViewSet, basename="users")
 router.register(r'storagefiles', StorageFilesViewSet)
+router.register(r'folders', FolderViewSet, basename='folders')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -39,11 +41,25 @@ urlpatterns = [
     # эндпоинт для получения токенов
     path('api-token-auth/', CustomAuthToken.as_view(), name='api_token_auth'),
     path('api/csrf/', csrf_token_view, name='api-csrf'),
+    path('metrics', metrics_view, name='metrics'),
 
     path('storagefiles/by_user/', StorageFilesViewSet.as_view({'get': 'by_user'}), name='storagefiles-by-user'),
     path('storagefiles/<int:pk>/generate_short_link/', StorageFilesViewSet.as_view({'post': 'generate_short_link'}),
          name='storagefiles-generate-short-link'),
+    path('storagefiles/signed/<str:token>/', download_signed, name='storagefiles-download-signed'),
 ]
 
+if settings.SERVER_MODE == 'asgi':
+    # асинхронные представления перекрывают соответствующие маршруты StorageFilesViewSet
+    urlpatterns = [
+        path('storagefiles/<int:pk>/download/', async_views.download_by_id, name='async-download-by-id'),
+        path('storagefiles/download/<str:short_link>/', async_views.download_by_short_link,
+             name='async-download-by-short-link'),
+        path('storagefiles/uploads/<uuid:upload_id>/chunks/<int:index>/', async_views.upload_chunk,
+             name='async-upload-chunk'),
+        path('storagefiles/signed/<str:token>/', async_views.download_signed, name='async-download-signed'),
+        path('storagefiles/changes/', async_views.changes, name='async-changes'),
+    ] + urlpatterns
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -12,4 +12,15 @@ then
     echo "PostgreSQL started"
 fi
 
+# команда контейнера (например, python manage.py run_jobs) вместо веб-сервера
+if [ "$#" -gt 0 ]
+then
+    exec "$@"
+fi
+
+if [ "$SERVER_MODE" = "asgi" ]
+then
+    exec gunicorn --timeout 120 -k uvicorn.workers.UvicornWorker cloud_storage.asgi:application --bind 0.0.0.0:8000
+fi
+
 exec gunicorn --timeout 120 cloud_storage.wsgi:application --bind 0.0.0.0:8000
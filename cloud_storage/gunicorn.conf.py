@@ -0,0 +1,7 @@
+# Настройки gunicorn (файл подхватывается автоматически из рабочего каталога)
+
+
+def worker_exit(server, worker):
+    # перед остановкой воркера записываем накопленную статистику скачиваний
+    from storage.stats import download_recorder
+    download_recorder.flush()
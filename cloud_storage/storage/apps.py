@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class StorageConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "storage"
+
+    def ready(self):
+        # регистрация фоновых задач
+        from . import tasks  # noqa: F401
+        from .search import ensure_sqlite_index
+
+        post_migrate.connect(ensure_sqlite_index, sender=self)
@@ -0,0 +1,75 @@
+import io
+import os
+import zipfile
+
+from django.utils import timezone
+
+COMPRESSION = {
+    'store': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+}
+
+
+class ZipStream(io.RawIOBase):
+    """Несбрасываемый (unseekable) буфер: zipfile пишет в него, генератор забирает записанное"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def archive_name(name, used):
+    """Имя файла внутри архива без каталогов и без повторов"""
+    name = os.path.basename(name.replace('\\', '/')) or 'file'
+    base, ext = os.path.splitext(name)
+    candidate, index = name, 1
+    while candidate in used:
+        candidate = f'{base} ({index}){ext}'
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+def zip_stream(files, compression=zipfile.ZIP_STORED, on_file=None):
+    """
+    Генератор ZIP-архива из записей StorageFiles.
+    Архив не собирается ни на диске, ни в памяти: zipfile пишет в ZipStream
+    (с дескрипторами данных, так как поток не поддерживает seek), а записанное сразу отдаётся клиенту.
+    Для файлов больше 2 ГБ используется ZIP64.
+    """
+    stream = ZipStream()
+    used = set()
+    with zipfile.ZipFile(stream, 'w', compression=compression, allowZip64=True) as archive:
+        for file_instance in files:
+            modified = timezone.localtime(file_instance.last_update_date)
+            info = zipfile.ZipInfo(archive_name(file_instance.original_name, used), modified.timetuple()[:6])
+            info.compress_type = compression
+            info.file_size = file_instance.size
+            try:
+                source = file_instance.file.open('rb')
+            except FileNotFoundError:
+                continue
+            with source, archive.open(info, 'w', force_zip64=file_instance.size >= zipfile.ZIP64_LIMIT) as target:
+                for chunk in source.chunks():
+                    target.write(chunk)
+                    yield stream.take()
+            if on_file is not None:
+                on_file(file_instance)
+            yield stream.take()
+    yield stream.take()
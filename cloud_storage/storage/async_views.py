@@ -0,0 +1,186 @@
+"""
+Асинхронные представления для режима ASGI (SERVER_MODE=asgi).
+
+Скачивание и загрузка частей файла не занимают поток на всё время передачи:
+файловый ввод-вывод выполняется в пуле потоков, запросы к БД - через асинхронный ORM.
+"""
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, JsonResponse
+from django.core.signing import BadSignature
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+
+from . import metrics
+from .authentication import authenticate_token
+from .cache import short_link_resolver
+from .changes import await_changes
+from .downloads import can_download, conditional_response, file_response
+from .models import StorageFiles, UploadChunk, UploadSession
+from .serializers import ChangesSerializer
+from .signing import LinkExpired, unsign_download
+from .stats import download_recorder
+
+offload = partial(sync_to_async, thread_sensitive=False)
+
+
+def error_response(detail, status):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def csrf_failed(request):
+    """Проверка CSRF для сессионной аутентификации, как в SessionAuthentication DRF"""
+    check = CsrfViewMiddleware(lambda req: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {}) is not None
+
+
+async def authenticate(request):
+    """Пользователь по заголовку Authorization: Token <key> или по сессии"""
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(header) == 2 and header[0].lower() == 'token':
+        try:
+            user, token = await sync_to_async(authenticate_token)(header[1])
+        except AuthenticationFailed:
+            return None
+        return user
+    if not hasattr(request, 'auser'):
+        # AuthenticationMiddleware не подключён
+        return None
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and csrf_failed(request):
+        return None
+    return user
+
+
+async def throttle(request):
+    """Ограничение частоты запросов как в DEFAULT_THROTTLE_CLASSES DRF"""
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        if not await sync_to_async(throttle_class().allow_request)(request, None):
+            return False
+    return True
+
+
+async def serve_file(request, file_instance):
+    if not can_download(request.user, file_instance):
+        return error_response("You do not have permission to download this file.", 403)
+
+    not_modified = conditional_response(request, file_instance)
+    if not_modified is not None:
+        return not_modified
+
+    await sync_to_async(download_recorder.record)(file_instance.pk)
+    try:
+        return file_response(request, file_instance, asynchronous=True)
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+
+async def download_by_id(request, pk):
+    """Скачивание файла по ID"""
+    request.user = await authenticate(request)
+    if request.user is None:
+        return error_response("Authentication credentials were not provided.", 401)
+    if not await throttle(request):
+        return error_response("Request was throttled.", 429)
+    try:
+        file_instance = await StorageFiles.objects.aget(pk=pk)
+    except StorageFiles.DoesNotExist:
+        raise Http404("File not found")
+    return await serve_file(request, file_instance)
+
+
+async def download_by_short_link(request, short_link):
+    """Скачивание файла по короткой ссылке"""
+    request.user = await authenticate(request) or AnonymousUser()
+    if not await throttle(request):
+        return error_response("Request was throttled.", 429)
+    try:
+        file_instance = await sync_to_async(short_link_resolver.resolve)(short_link)
+    except StorageFiles.DoesNotExist:
+        raise Http404("File not found")
+    return await serve_file(request, file_instance)
+
+
+@require_safe
+async def download_signed(request, token):
+    """Скачивание по подписанной ссылке без обращения к БД"""
+    try:
+        file_instance = unsign_download(token)
+    except LinkExpired:
+        return error_response("Link expired.", 410)
+    except BadSignature:
+        return error_response("Invalid link.", 403)
+
+    not_modified = conditional_response(request, file_instance)
+    if not_modified is not None:
+        return not_modified
+    await sync_to_async(download_recorder.record)(file_instance.pk)
+    try:
+        return file_response(request, file_instance, asynchronous=True)
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+
+@require_safe
+async def changes(request):
+    """Журнал изменений с ожиданием (long-poll), не занимающим поток"""
+    request.user = await authenticate(request)
+    if request.user is None:
+        return error_response("Authentication credentials were not provided.", 401)
+    if not await throttle(request):
+        return error_response("Request was throttled.", 429)
+    serializer = ChangesSerializer(data=request.GET)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    data = serializer.validated_data
+    page = await await_changes(
+        request.user.pk,
+        data.get('since'),
+        data.get('limit', settings.CHANGES_PAGE_SIZE),
+        data['wait'],
+        {'request': request},
+    )
+    return JsonResponse(page)
+
+
+@csrf_exempt
+async def upload_chunk(request, upload_id, index):
+    """Приём части файла; тело запроса - содержимое части"""
+    if request.method != 'PUT':
+        return error_response(f'Method "{request.method}" not allowed.', 405)
+    request.user = await authenticate(request)
+    if request.user is None:
+        return error_response("Authentication credentials were not provided.", 401)
+    if not await throttle(request):
+        return error_response("Request was throttled.", 429)
+    try:
+        session = await UploadSession.objects.select_related('owner').aget(pk=upload_id, owner=request.user)
+    except UploadSession.DoesNotExist:
+        raise Http404("Upload session not found")
+    if session.is_expired():
+        await sync_to_async(session.discard)()
+        raise Http404("Upload session expired")
+
+    if index >= session.chunks_count:
+        return error_response("Chunk index out of range.", 400)
+    length = session.chunk_length(index)
+    if int(request.META.get('CONTENT_LENGTH') or 0) != length:
+        return error_response(f"Chunk {index} must be {length} bytes.", 400)
+
+    with metrics.transfer('upload') as transfer:
+        written, etag = await offload(session.write_chunk_data)(index, request)
+        if written == length:
+            transfer.size = written
+    if written != length:
+        return error_response(f"Chunk {index} is incomplete: {written} of {length} bytes received.", 400)
+    await UploadChunk.objects.aupdate_or_create(session=session, index=index, defaults={'size': written, 'etag': etag})
+    return JsonResponse({'index': index, 'size': written})
@@ -0,0 +1,61 @@
+"""
+Аутентификация по токену API с кэшированием.
+
+Токен и пользователь берутся из кэша token_cache, поэтому запрос к БД выполняется
+только при промахе. Записи кэша сбрасываются при изменении пользователя (в том числе деактивации)
+и при смене токена; в остальных случаях изменения видны не позже чем через TOKEN_CACHE_TTL.
+"""
+import copy
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import token_cache
+
+
+def token_expired(created):
+    lifetime = settings.TOKEN_EXPIRE
+    return bool(lifetime) and created + timedelta(seconds=lifetime) <= timezone.now()
+
+
+def rotate_token(user):
+    """Заменяет токен пользователя новым; старый перестаёт действовать сразу"""
+    with transaction.atomic():
+        token_cache.invalidate_user(user.pk)
+        Token.objects.filter(user=user).delete()
+        return Token.objects.create(user=user)
+
+
+def issue_token(user):
+    """Действующий токен пользователя; просроченный заменяется новым"""
+    token, created = Token.objects.get_or_create(user=user)
+    if not created and token_expired(token.created):
+        token = rotate_token(user)
+    return token
+
+
+def authenticate_token(key):
+    """(пользователь, токен) по ключу токена или AuthenticationFailed"""
+    try:
+        user, created = token_cache.lookup(key)
+    except Token.DoesNotExist:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    if token_expired(created):
+        raise exceptions.AuthenticationFailed('Token has expired.')
+    # объект пользователя из локального кэша общий для потоков, запрос получает свою копию
+    user = copy.copy(user)
+    return user, Token(key=key, user=user, created=created)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без обращения к БД при попадании в кэш и со сроком действия TOKEN_EXPIRE"""
+
+    def authenticate_credentials(self, key):
+        return authenticate_token(key)
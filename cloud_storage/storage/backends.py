@@ -0,0 +1,40 @@
+"""
+Хранилища файлов.
+
+Файлы пользователей хранятся в default_storage, который выбирается настройкой STORAGE_BACKEND:
+filesystem - FileSystemStorage в MEDIA_ROOT (по умолчанию);
+s3         - S3-совместимое объектное хранилище (storage.s3.ObjectStorage: AWS S3, MinIO и т.п.).
+С объектным хранилищем MEDIA_ROOT используется только для временных файлов загрузки и кэша превью.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# ограничения загрузки по частям в S3: минимальный размер части (кроме последней) и число частей
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def is_local(storage):
+    """Хранит ли storage файлы в локальной файловой системе (доступен ли путь к файлу)"""
+    try:
+        storage.path('')
+    except NotImplementedError:
+        return False
+    return True
+
+
+@contextmanager
+def local_file(field_file):
+    """Путь к файлу на диске; файл из объектного хранилища скачивается во временный файл"""
+    if is_local(field_file.storage):
+        yield field_file.path
+        return
+    fd, path = tempfile.mkstemp(prefix='.download-')
+    try:
+        with os.fdopen(fd, 'wb') as target, field_file.storage.open(field_file.name, 'rb') as source:
+            shutil.copyfileobj(source, target)
+        yield path
+    finally:
+        os.remove(path)
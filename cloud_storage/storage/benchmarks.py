@@ -0,0 +1,292 @@
+"""
+Замеры производительности API хранилища (python manage.py benchmark).
+
+Запросы выполняются в процессе через тестовый клиент DRF, без сети и веб-сервера,
+поэтому результаты отражают стоимость кода Django и запросов к БД. Пользователи и файлы
+создаются заново в тестовой БД, файлы - во временном каталоге. Результаты - словарь,
+пригодный для сохранения в JSON и сравнения между коммитами функцией compare.
+"""
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from base64 import urlsafe_b64encode
+
+import django
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .authentication import CachedTokenAuthentication
+from .cache import short_link_resolver, token_cache
+from .models import StorageFiles, UserStorage
+from .stats import download_recorder
+
+SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# окружение замеров: без ограничения частоты запросов (DummyCache), фоновые задачи - сразу
+BENCHMARK_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'JOB_QUEUE': 'inline',
+    'PREVIEW_ON_UPLOAD': False,
+    'FILE_SCAN_HOOK': '',
+    'METRICS_ENABLED': False,
+}
+
+
+def parse_size(value):
+    """Размер в байтах из строки вида 4096, 64K, 16M"""
+    value = str(value).strip().upper()
+    if value[-1:] in SIZE_SUFFIXES:
+        return int(value[:-1]) * SIZE_SUFFIXES[value[-1]]
+    return int(value)
+
+
+def summary(samples, size=None):
+    """
+    Медиана, 95-й процентиль, операций в секунду и, если задан размер, МБ/с.
+    Скорости считаются по медиане, чтобы единичные выбросы не искажали сравнение запусков.
+    """
+    samples = sorted(samples)
+    median = statistics.median(samples)
+    result = {
+        'count': len(samples),
+        'median_ms': round(median * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'ops_per_sec': round(1 / median, 1) if median else None,
+    }
+    if size is not None and median:
+        result['mb_per_sec'] = round(size / median / 1024 ** 2, 1)
+    return result
+
+
+def measure(func, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_commit():
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+class Benchmark:
+    def __init__(self, repeat=20, upload_sizes=(64 * 1024, 1024 ** 2, 16 * 1024 ** 2),
+                 list_counts=(100, 1000, 10000), page_size=20):
+        self.repeat = repeat
+        self.upload_sizes = list(upload_sizes)
+        self.list_counts = list(list_counts)
+        self.page_size = page_size
+        self.users = 0
+
+    def make_user(self):
+        self.users += 1
+        return UserStorage.objects.create_user(
+            f'bench-{self.users}', f'bench-{self.users}@example.com', 'bench-password', quota_bytes=0,
+        )
+
+    def make_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def make_file(self, user, size):
+        content = SimpleUploadedFile(f'bench-{size}.bin', os.urandom(size))
+        return StorageFiles.objects.create(owner=user, file=content)
+
+    def run(self):
+        # отладочные сообщения при каждом запросе искажают замеры
+        logging.disable(logging.INFO)
+        try:
+            with tempfile.TemporaryDirectory(prefix='storage-benchmark-') as media_root:
+                with override_settings(MEDIA_ROOT=media_root, **BENCHMARK_SETTINGS):
+                    results = {
+                        'meta': self.meta(),
+                        'upload': self.bench_upload(),
+                        'download': self.bench_download(),
+                        'list': self.bench_list(),
+                        'short_link': self.bench_short_link(),
+                        'auth': self.bench_auth(),
+                    }
+                    # накопленная статистика скачиваний записывается, пока тестовая БД существует
+                    download_recorder.flush()
+                    return results
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def meta(self):
+        return {
+            'commit': git_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': self.repeat,
+        }
+
+    def bench_upload(self):
+        """Загрузка файла одним multipart-запросом по размерам файла"""
+        user = self.make_user()
+        client = self.make_client(user)
+        url = reverse('storagefiles-list')
+        results = {}
+        for size in self.upload_sizes:
+            content = os.urandom(size)
+
+            def upload():
+                data = {'file': SimpleUploadedFile('upload.bin', content)}
+                response = client.post(url, data, format='multipart')
+                assert response.status_code == 201, response.content
+
+            results[str(size)] = summary(measure(upload, self.repeat), size)
+            StorageFiles.objects.filter(owner=user).delete_files()
+        return results
+
+    def bench_download(self):
+        """Скачивание: тело отдаёт Django (python) или веб-сервер по X-Accel-Redirect (nginx)"""
+        user = self.make_user()
+        client = self.make_client(user)
+        results = {}
+        for backend in ('python', 'nginx'):
+            results[backend] = {}
+            with override_settings(DOWNLOAD_BACKEND=backend):
+                for size in self.upload_sizes:
+                    url = reverse('storagefiles-download-by-id', kwargs={'pk': self.make_file(user, size).pk})
+
+                    def download():
+                        response = client.get(url)
+                        assert response.status_code == 200, response.status_code
+                        if response.streaming:
+                            for chunk in response.streaming_content:
+                                pass
+
+                    results[backend][str(size)] = summary(measure(download, self.repeat), size)
+        return results
+
+    def bench_list(self):
+        """Список файлов по числу файлов пользователя и глубине страницы: limit/offset, keyset и ?serializer=fast"""
+        url = reverse('storagefiles-list')
+        results = {}
+        for count in self.list_counts:
+            user = self.make_user()
+            client = self.make_client(user)
+            StorageFiles.objects.bulk_create(
+                StorageFiles(
+                    owner=user,
+                    file=f'bench/{user.pk}/{index}.bin',
+                    original_name=f'{index}.bin',
+                    size=index,
+                )
+                for index in range(count)
+            )
+            rows = list(StorageFiles.objects.filter(owner=user).order_by('upload_date', 'id')
+                        .values_list('upload_date', 'id'))
+            results[str(count)] = {}
+            for depth in sorted({0, count // 2, max(count - self.page_size, 0)}):
+                offset_url = f'{url}?limit={self.page_size}&offset={depth}'
+                params = f'?pagination=cursor&ordering=upload_date&limit={self.page_size}'
+                if depth:
+                    upload_date, pk = rows[depth - 1]
+                    cursor = urlsafe_b64encode(json.dumps([upload_date.isoformat(), pk]).encode()).decode('ascii')
+                    params += f'&cursor={cursor}'
+                results[str(count)][str(depth)] = {
+                    'offset': summary(measure(lambda: client.get(offset_url), self.repeat)),
+                    'cursor': summary(measure(lambda: client.get(url + params), self.repeat)),
+                    'fast': summary(measure(lambda: client.get(url + params + '&serializer=fast'), self.repeat)),
+                }
+        return results
+
+    def bench_short_link(self):
+        """Скачивание по короткой ссылке (nginx, без чтения файла) с холодным и прогретым кэшем"""
+        user = self.make_user()
+        client = self.make_client(user)
+        file_instance = self.make_file(user, 1024)
+        file_instance.generate_short_link()
+        url = reverse('storagefiles-download-by-short-link', kwargs={'short_link': file_instance.short_link})
+
+        def resolve():
+            assert client.get(url).status_code == 200
+
+        def resolve_cold():
+            short_link_resolver.local.clear()
+            resolve()
+
+        with override_settings(DOWNLOAD_BACKEND='nginx'):
+            return {
+                'cold': summary(measure(resolve_cold, self.repeat)),
+                'warm': summary(measure(resolve, self.repeat)),
+            }
+
+    def bench_auth(self):
+        """Аутентификация по токену: TokenAuthentication DRF и CachedTokenAuthentication"""
+        user = self.make_user()
+        token = Token.objects.create(user=user)
+        django_request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        results = {}
+        for name, auth_class in (('token', TokenAuthentication), ('cached_token', CachedTokenAuthentication)):
+            auth = auth_class()
+
+            def authenticate():
+                assert auth.authenticate(Request(django_request)) is not None
+
+            token_cache.local.clear()
+            results[name] = summary(measure(authenticate, self.repeat * 10))
+            with CaptureQueriesContext(connection) as queries:
+                authenticate()
+            results[name]['queries'] = len(queries)
+        return results
+
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}"""
+    values = {}
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            values.update(flatten(value, path + '.'))
+        else:
+            values[path] = value
+    return values
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Сравнение с результатами другого запуска по медианам и пропускной способности.
+    Возвращает [(метрика, было, стало, изменение, регрессия)]; изменение - доля, положительная - лучше.
+    """
+    old_values, new_values = flatten(baseline), flatten(current)
+    rows = []
+    for path, new in new_values.items():
+        old = old_values.get(path)
+        metric = path.rpartition('.')[2]
+        if metric not in ('median_ms', 'ops_per_sec', 'mb_per_sec') or not old or new is None:
+            continue
+        if metric == 'median_ms':
+            change = (old - new) / old
+        else:
+            change = (new - old) / old
+        rows.append((path, old, new, round(change, 3), change < -tolerance))
+    return rows
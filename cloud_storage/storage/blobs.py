@@ -0,0 +1,59 @@
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+
+from .backends import is_local
+
+logger = logging.getLogger(__name__)
+
+
+def blob_name(checksum):
+    """Путь содержимого в хранилище: blobs/ab/cd/abcd..."""
+    return os.path.join(settings.BLOBS_DIR, checksum[:2], checksum[2:4], checksum)
+
+
+def write_content(storage, name, content):
+    """Атомарно записывает content в файл name хранилища, перезаписывая существующий"""
+    if not is_local(storage):
+        storage.write(name, content)
+        return
+    path = storage.path(name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    if hasattr(content, 'temporary_file_path'):
+        # загрузка уже лежит во временном файле - переносим без копирования, если это возможно
+        file_move_safe(content.temporary_file_path(), path, allow_overwrite=True)
+        return
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in content.chunks():
+                f.write(chunk)
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def move_file(storage, source_path, name):
+    """Переносит локальный файл в name хранилища"""
+    if not is_local(storage):
+        with open(source_path, 'rb') as f:
+            storage.write(name, File(f))
+        os.remove(source_path)
+        return
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(source_path, path)
+
+
+def delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.exception("Failed to delete %s", name)
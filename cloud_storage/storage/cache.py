@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш ограниченного размера с временем жизни записей"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ShortLinkResolver:
+    """
+    Кэш соответствия короткой ссылки файлу: локальный LRU процесса
+    и, если задан SHORT_LINK_CACHE_BACKEND, общий кэш Django.
+    """
+    key_prefix = 'short_link:'
+    fields = ['id', 'owner_id', 'original_name', 'file', 'size', 'last_update_date', 'checksum', 'blob_id']
+
+    def __init__(self):
+        self.local = TTLCache(settings.SHORT_LINK_CACHE_SIZE, settings.SHORT_LINK_CACHE_TTL)
+
+    @property
+    def shared(self):
+        alias = settings.SHORT_LINK_CACHE_BACKEND
+        return caches[alias] if alias else None
+
+    def lookup(self, short_link):
+        """Данные файла по короткой ссылке: id, путь в хранилище, размер, время изменения"""
+        key = self.key_prefix + short_link
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        shared = self.shared
+        if shared is not None:
+            entry = shared.get(key)
+        if entry is None:
+            from .models import StorageFiles
+            entry = StorageFiles.objects.filter(short_link=short_link).values(*self.fields).first()
+            if entry is None:
+                raise StorageFiles.DoesNotExist
+            if shared is not None:
+                shared.set(key, entry, settings.SHORT_LINK_CACHE_TTL)
+        self.local.set(key, entry)
+        return entry
+
+    def resolve(self, short_link):
+        """Экземпляр StorageFiles (без обращения к БД при попадании в кэш)"""
+        from .models import StorageFiles
+        entry = self.lookup(short_link)
+        return StorageFiles(short_link=short_link, **entry)
+
+    def invalidate(self, short_link):
+        if not short_link:
+            return
+        key = self.key_prefix + short_link
+
+        def delete():
+            self.local.delete(key)
+            shared = self.shared
+            if shared is not None:
+                shared.delete(key)
+
+        delete()
+        # повторно после фиксации, чтобы параллельный запрос не оставил в кэше старые данные
+        transaction.on_commit(delete)
+
+
+short_link_resolver = ShortLinkResolver()
+
+
+class TokenCache:
+    """
+    Кэш токенов аутентификации: локальный LRU процесса
+    и, если задан TOKEN_CACHE_BACKEND, общий кэш Django.
+    Запись - пользователь токена и время создания токена.
+    """
+    key_prefix = 'auth_token:'
+
+    def __init__(self):
+        self.local = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+    @property
+    def shared(self):
+        alias = settings.TOKEN_CACHE_BACKEND
+        return caches[alias] if alias else None
+
+    def lookup(self, token_key):
+        """(пользователь, время создания токена); Token.DoesNotExist, если токена нет"""
+        key = self.key_prefix + token_key
+        entry = self.local.get(key)
+        if entry is not None:
+            return entry
+        shared = self.shared
+        if shared is not None:
+            entry = shared.get(key)
+        if entry is None:
+            from rest_framework.authtoken.models import Token
+            token = Token.objects.select_related('user').get(key=token_key)
+            entry = (token.user, token.created)
+            if shared is not None:
+                shared.set(key, entry, settings.TOKEN_CACHE_TTL)
+        self.local.set(key, entry)
+        return entry
+
+    def invalidate(self, token_key):
+        key = self.key_prefix + token_key
+
+        def delete():
+            self.local.delete(key)
+            shared = self.shared
+            if shared is not None:
+                shared.delete(key)
+
+        delete()
+        # повторно после фиксации, чтобы параллельный запрос не оставил в кэше старые данные
+        transaction.on_commit(delete)
+
+    def invalidate_user(self, user_id):
+        from rest_framework.authtoken.models import Token
+        for token_key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+            self.invalidate(token_key)
+
+
+token_cache = TokenCache()
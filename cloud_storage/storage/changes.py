@@ -0,0 +1,56 @@
+"""
+Синхронизация клиентов по журналу изменений (GET /storagefiles/changes/?since=<seq>).
+
+Клиент получает текущий номер журнала запросом без since, загружает список файлов и дальше
+запрашивает только изменения после известного номера. С параметром wait запрос ждёт
+изменений (long-poll): в этом процессе его будит change_notifier, изменения из других
+процессов находятся опросом журнала раз в CHANGES_POLL_INTERVAL секунд.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import FileChange, StorageFiles
+from .notifier import change_notifier
+from .serializers import FileChangeSerializer
+
+
+def changes_page(owner_id, since, limit, context):
+    """Изменения пользователя после since и номер, с которого продолжать"""
+    if since is None:
+        return {'changes': [], 'cursor': FileChange.last_seq(owner_id), 'has_more': False}
+    changes = list(FileChange.objects.filter(owner_id=owner_id, seq__gt=since).order_by('seq')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    file_ids = {change.file_id for change in changes if change.action != FileChange.DELETE}
+    files = StorageFiles.objects.filter(owner_id=owner_id).in_bulk(file_ids) if file_ids else {}
+    return {
+        'changes': FileChangeSerializer(changes, many=True, context={**context, 'files': files}).data,
+        'cursor': changes[-1].seq if changes else since,
+        'has_more': has_more,
+    }
+
+
+def wait_for_changes(owner_id, since, limit, wait, context):
+    deadline = time.monotonic() + wait
+    while True:
+        # номер, известный до запроса: уведомление о более новом изменении прервёт ожидание
+        known = max(since or 0, change_notifier.last_seq(owner_id))
+        page = changes_page(owner_id, since, limit, context)
+        remaining = deadline - time.monotonic()
+        if page['changes'] or since is None or remaining <= 0:
+            return page
+        change_notifier.wait(owner_id, known, min(remaining, settings.CHANGES_POLL_INTERVAL))
+
+
+async def await_changes(owner_id, since, limit, wait, context):
+    """wait_for_changes для асинхронного представления: ожидание не занимает поток"""
+    deadline = time.monotonic() + wait
+    while True:
+        known = max(since or 0, change_notifier.last_seq(owner_id))
+        page = await sync_to_async(changes_page)(owner_id, since, limit, context)
+        remaining = deadline - time.monotonic()
+        if page['changes'] or since is None or remaining <= 0:
+            return page
+        await change_notifier.async_wait(owner_id, known, min(remaining, settings.CHANGES_POLL_INTERVAL))
@@ -1,12 +1,13 @@
 from functools import wraps
 
 from django.core.exceptions import PermissionDenied
-from django.utils import timezone
-from django.http import FileResponse, Http404
+from django.http import Http404
 from rest_framework import status
 from rest_framework.response import Response
 
+from .downloads import conditional_response, file_response
 from .models import StorageFiles
+from .stats import download_recorder
 
 
 def handle_file_download(get_file_instance):
@@ -18,12 +19,14 @@ def handle_file_download(get_file_instance):
             if not viewset.has_permission_to_download(request.user, file_instance):
                 raise PermissionDenied("You do not have permission to download this file.")
 
-            file_instance.last_download_date = timezone.now()
-            file_instance.save()
-            response = FileResponse(file_instance.file.open(), as_attachment=True, filename=file_instance.file.name)
-            response['Access-Control-Expose-Headers'] = 'Content-Disposition'
-            return response
-        except StorageFiles.DoesNotExist:
+            not_modified = conditional_response(request, file_instance)
+            if not_modified is not None:
+                return not_modified
+
+            download_recorder.record(file_instance.pk)
+            return file_response(request, file_instance)
+        except (StorageFiles.DoesNotExist, FileNotFoundError):
+            # FileNotFoundError - файл удалён, а запись ещё осталась в кэше коротких ссылок
             raise Http404("File not found")
         except PermissionDenied as e:
             return Response({"detail": str(e)}, status=status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,118 @@
+"""
+Обновление файла по блокам, как в rsync.
+
+Клиент получает подписи хранимой версии (GET /storagefiles/<id>/blocks/): для каждого блока
+размера block_size - слабую скользящую сумму Adler-32 и SHA-256. Скользящей суммой клиент
+находит в новой версии блоки, которые уже есть на сервере, и отправляет
+(POST /storagefiles/<id>/delta/) только инструкции и изменённые данные:
+    {"copy": <номер блока>, "count": <число блоков подряд, по умолчанию 1>}
+    {"data": <число байт из поля data>}
+Сервер собирает новую версию за один проход во временный файл, проверяет её SHA-256
+и заменяет содержимое файла так же, как при обычной загрузке (StorageFiles.save).
+"""
+import hashlib
+import os
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .exceptions import InvalidDelta
+from .uploadhandlers import HashedUploadedFile, upload_temp_dir
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def block_signatures(fileobj, block_size):
+    """[(weak, strong), ...] по блокам файла"""
+    signatures = []
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            return signatures
+        signatures.append((zlib.adler32(block), hashlib.sha256(block).hexdigest()))
+
+
+def file_signatures(file_instance, etag, block_size):
+    """
+    Подписи блоков хранимой версии. Для файлов с контрольной суммой (сильный ETag)
+    они кэшируются: ETag меняется вместе с содержимым.
+    """
+    key = None
+    if not etag.startswith('W/'):
+        key = f'delta-signatures:{file_instance.pk}:{etag}:{block_size}'
+        signatures = cache.get(key)
+        if signatures is not None:
+            return signatures
+    with file_instance.file.storage.open(file_instance.file.name, 'rb') as f:
+        signatures = block_signatures(f, block_size)
+    if key is not None:
+        cache.set(key, signatures, settings.DELTA_SIGNATURE_CACHE_TTL)
+    return signatures
+
+
+def copy_part(source, target, length, digest):
+    copied = 0
+    while copied < length:
+        data = source.read(min(COPY_BUFFER_SIZE, length - copied))
+        if not data:
+            break
+        target.write(data)
+        digest.update(data)
+        copied += len(data)
+    return copied
+
+
+def apply_delta(source, size, block_size, instructions, data, target, digest):
+    """Пишет в target новую версию по инструкциям, возвращает её размер"""
+    blocks = -(-size // block_size)
+    written = 0
+    for instruction in instructions:
+        if 'copy' in instruction:
+            start, count = instruction['copy'], instruction.get('count', 1)
+            if start + count > blocks:
+                raise InvalidDelta(f'Block {start + count - 1} is out of range: the file has {blocks} blocks.')
+            offset = start * block_size
+            length = min(count * block_size, size - offset)
+            source.seek(offset)
+            if copy_part(source, target, length, digest) != length:
+                raise InvalidDelta('The stored file is shorter than expected.')
+        else:
+            length = instruction['data']
+            if data is None or copy_part(data, target, length, digest) != length:
+                raise InvalidDelta('The data is shorter than the instructions require.')
+        written += length
+    if data is not None and data.read(1):
+        raise InvalidDelta('The data is longer than the instructions require.')
+    return written
+
+
+def assemble(file_instance, block_size, instructions, data, checksum):
+    """
+    Собирает новую версию во временный файл рядом с хранилищем.
+    Возвращает HashedUploadedFile для StorageFiles.save (на месте он переносится переименованием).
+    """
+    directory = upload_temp_dir(file_instance.owner.username)
+    os.makedirs(directory, exist_ok=True)
+    target = tempfile.NamedTemporaryFile(dir=directory, prefix='.delta-', delete=False)
+    digest = hashlib.sha256()
+    try:
+        with file_instance.file.storage.open(file_instance.file.name, 'rb') as source:
+            size = apply_delta(source, file_instance.size, block_size, instructions, data, target, digest)
+        if digest.hexdigest() != checksum:
+            raise InvalidDelta('Checksum of the assembled file does not match.')
+        target.flush()
+        target.seek(0)
+    except BaseException:
+        target.close()
+        os.remove(target.name)
+        raise
+    return HashedUploadedFile(
+        file=target,
+        name=file_instance.original_name,
+        content_type='application/octet-stream',
+        size=size,
+        charset=None,
+        checksum=checksum,
+    )
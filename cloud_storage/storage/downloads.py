@@ -0,0 +1,239 @@
+import mimetypes
+import os
+import re
+from functools import partial
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import get_random_string
+from django.utils.http import content_disposition_header, http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from . import metrics
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+# больше диапазонов в одном запросе не обслуживаем, отдаём файл целиком
+MAX_RANGES = 32
+BLOCK_SIZE = 64 * 1024
+
+
+def download_filename(file_instance):
+    # при дедупликации имя в хранилище - контрольная сумма, поэтому отдаём исходное имя
+    return file_instance.original_name or os.path.basename(file_instance.file.name)
+
+
+def can_download(user, file_instance):
+    # Проверка прав доступа: разрешить только администратору или владельцу файла
+    return user.is_superuser or user.is_staff or user.pk == file_instance.owner_id
+
+
+def file_etag(file_instance):
+    if file_instance.checksum:
+        return quote_etag(file_instance.checksum)
+    # для файлов без контрольной суммы - слабый ETag по размеру и времени изменения
+    return 'W/' + quote_etag(f'{file_instance.size:x}-{int(file_instance.last_update_date.timestamp()):x}')
+
+
+def file_last_modified(file_instance):
+    return int(file_instance.last_update_date.timestamp())
+
+
+def conditional_response(request, file_instance):
+    """Ответ 304/412 на условный запрос (If-None-Match, If-Modified-Since и т.п.) или None"""
+    return get_conditional_response(
+        request,
+        etag=file_etag(file_instance),
+        last_modified=file_last_modified(file_instance),
+    )
+
+
+def parse_range_header(header, size):
+    """
+    Разбирает заголовок Range.
+    Возвращает список диапазонов [(start, end), ...] (end включительно),
+    пустой список, если ни один диапазон не выполним, или None, если заголовок нужно проигнорировать.
+    """
+    if not header or size == 0:
+        return None
+    units, _, ranges_spec = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    specs = ranges_spec.split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        match = RANGE_RE.match(spec)
+        if not match:
+            return None
+        first, last = match.groups()
+        if first == '' and last == '':
+            return None
+        if first == '':
+            # суффикс: последние N байт
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            end = min(end, size - 1)
+        ranges.append((start, end))
+    return ranges
+
+
+def if_range_matches(request, file_instance):
+    """Проверка If-Range: диапазоны отдаются, только если файл не изменился"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        etag = file_etag(file_instance)
+        # If-Range допускает только сильное сравнение
+        return not etag.startswith('W/') and etag in parse_etags(if_range)
+    return parse_http_date_safe(if_range) == file_last_modified(file_instance)
+
+
+def read_range(file, start, end):
+    file.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = file.read(min(BLOCK_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def range_content(field_file, ranges, parts=None):
+    """Содержимое диапазонов файла; parts - заголовки частей multipart/byteranges"""
+    with field_file.storage.open(field_file.name, 'rb') as file:
+        for index, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[index]
+            yield from read_range(file, start, end)
+    if parts:
+        yield parts[-1]
+
+
+async def arange_content(field_file, ranges, parts=None):
+    """Асинхронный вариант range_content: чтение файла выполняется в пуле потоков"""
+    offload = partial(sync_to_async, thread_sensitive=False)
+    file = await offload(field_file.storage.open)(field_file.name, 'rb')
+    try:
+        for index, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[index]
+            await offload(file.seek)(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = await offload(file.read)(min(BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        if parts:
+            yield parts[-1]
+    finally:
+        await offload(file.close)()
+
+
+def range_response(file_instance, ranges, content_type, asynchronous=False):
+    size = file_instance.size
+    content = arange_content if asynchronous else range_content
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(content(file_instance.file, ranges), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+        return response
+
+    boundary = get_random_string(32)
+    parts = [
+        (
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode()
+        for start, end in ranges
+    ]
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    length = sum(len(part) for part in parts) + sum(end - start + 1 for start, end in ranges)
+    response = StreamingHttpResponse(
+        content(file_instance.file, ranges, parts),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}',
+    )
+    response['Content-Length'] = length
+    return response
+
+
+def offload_response(file_instance, header, value):
+    """Ответ без тела: файл отдаст веб-сервер по заголовку header"""
+    filename = download_filename(file_instance)
+    content_type, encoding = mimetypes.guess_type(filename)
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    response[header] = value
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def python_response(request, file_instance, asynchronous=False):
+    filename = download_filename(file_instance)
+    ranges = None
+    if request.method == 'GET' and if_range_matches(request, file_instance):
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), file_instance.size)
+
+    if ranges is None:
+        if not asynchronous:
+            return FileResponse(file_instance.file.open('rb'), as_attachment=True, filename=filename)
+        content_type, encoding = mimetypes.guess_type(filename)
+        response = StreamingHttpResponse(
+            arange_content(file_instance.file, [(0, file_instance.size - 1)]),
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Content-Length'] = file_instance.size
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+    if not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{file_instance.size}'
+        return response
+
+    content_type, encoding = mimetypes.guess_type(filename)
+    response = range_response(file_instance, ranges, content_type or 'application/octet-stream', asynchronous)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def file_response(request, file_instance, asynchronous=False):
+    """
+    Формирует ответ со скачиваемым файлом в соответствии с DOWNLOAD_BACKEND.
+    asynchronous - тело ответа отдаётся асинхронным итератором (для async-представлений под ASGI).
+    """
+    backend = settings.DOWNLOAD_BACKEND
+    if backend == 'redirect':
+        # клиент скачивает файл прямо из объектного хранилища по подписанной ссылке
+        url = file_instance.file.storage.download_url(file_instance.file.name, download_filename(file_instance))
+        response = HttpResponseRedirect(url)
+    elif backend == 'nginx':
+        # nginx отдаёт файл из internal location над MEDIA_ROOT и сам обрабатывает Range
+        uri = settings.DOWNLOAD_INTERNAL_URL + quote(file_instance.file.name)
+        response = offload_response(file_instance, 'X-Accel-Redirect', uri)
+    elif backend == 'sendfile':
+        # Apache mod_xsendfile / lighttpd ожидают абсолютный путь к файлу
+        response = offload_response(file_instance, 'X-Sendfile', file_instance.file.path)
+    else:
+        response = python_response(request, file_instance, asynchronous)
+    response['ETag'] = file_etag(file_instance)
+    response['Last-Modified'] = http_date(file_last_modified(file_instance))
+    response['Accept-Ranges'] = 'bytes'
+    response['Access-Control-Expose-Headers'] = 'Content-Disposition, Content-Range, ETag'
+    return metrics.track_download(response, backend)
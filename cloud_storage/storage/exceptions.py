@@ -0,0 +1,20 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Storage quota exceeded.'
+    default_code = 'quota_exceeded'
+
+
+class InvalidFolder(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid folder.'
+    default_code = 'invalid_folder'
+
+
+class InvalidDelta(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'Invalid delta.'
+    default_code = 'invalid_delta'
@@ -0,0 +1,140 @@
+"""
+Фоновые задачи.
+
+Режим выполнения задаётся JOB_QUEUE:
+inline   - сразу после фиксации транзакции в том же потоке (тесты, отладка);
+thread   - в пуле потоков текущего процесса; задачи теряются при остановке процесса;
+database - задача записывается в таблицу Job в той же транзакции, что и изменения,
+           и выполняется отдельным процессом: python manage.py run_jobs (по умолчанию).
+
+Задача, не завершившаяся за JOB_VISIBILITY_TIMEOUT, снова становится доступной обработчикам,
+поэтому задачи должны быть идемпотентными. Задача, исчерпавшая JOB_MAX_ATTEMPTS, помечается failed.
+"""
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# зарегистрированные задачи: имя -> функция
+tasks = {}
+
+job_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='storage-jobs')
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу name; аргументы задачи должны сериализоваться в JSON"""
+    def decorator(func):
+        tasks[name] = func
+        return func
+    return decorator
+
+
+def run_task(name, payload):
+    tasks[name](**payload)
+
+
+def run_task_safely(name, payload, close_connections=False):
+    try:
+        run_task(name, payload)
+    except Exception:
+        logger.exception("Job %s failed", name)
+    finally:
+        if close_connections:
+            # у потока пула собственные соединения с БД
+            connections.close_all()
+
+
+def enqueue(name, **payload):
+    """Ставит задачу в очередь; задача выполняется только после фиксации текущей транзакции"""
+    mode = settings.JOB_QUEUE
+    if mode == 'database':
+        from .models import Job
+
+        Job.objects.create(name=name, payload=payload, max_attempts=settings.JOB_MAX_ATTEMPTS)
+    elif mode == 'inline':
+        transaction.on_commit(partial(run_task_safely, name, payload))
+    else:
+        transaction.on_commit(partial(job_executor.submit, run_task_safely, name, payload, True))
+
+
+def claim_job():
+    """Захватывает очередную задачу из БД на JOB_VISIBILITY_TIMEOUT секунд или возвращает None"""
+    from .models import Job
+
+    while True:
+        now = timezone.now()
+        # обработчик упал на последней попытке: повторов больше не будет
+        Job.objects.filter(status=Job.PENDING, locked_until__lte=now, attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED,
+            locked_until=None,
+            last_error='Visibility timeout expired on the last attempt',
+        )
+        with transaction.atomic():
+            job = (
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status=Job.PENDING, run_after__lte=now, attempts__lt=F('max_attempts'))
+                .filter(Q(locked_until__isnull=True) | Q(locked_until__lte=now))
+                .order_by('run_after', 'pk')
+                .first()
+            )
+            if job is None:
+                return None
+            locked_until = now + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT)
+            # условие на число попыток защищает от двойного захвата в БД без SKIP LOCKED (SQLite)
+            claimed = Job.objects.filter(pk=job.pk, attempts=job.attempts).update(
+                attempts=F('attempts') + 1,
+                locked_until=locked_until,
+            )
+        if claimed:
+            job.attempts += 1
+            job.locked_until = locked_until
+            return job
+
+
+def run_job(job):
+    """Выполняет захваченную задачу; при ошибке задача повторяется с экспоненциальной задержкой"""
+    from .models import Job
+
+    try:
+        run_task(job.name, job.payload)
+    except Exception:
+        logger.exception("Job %s #%s failed (attempt %s of %s)", job.name, job.pk, job.attempts, job.max_attempts)
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, locked_until=None, last_error=error)
+        else:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                run_after=timezone.now() + timedelta(seconds=delay),
+                locked_until=None,
+                last_error=error,
+            )
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def work(once=False):
+    """
+    Цикл обработчика очереди в БД, возвращает число выполненных задач.
+    once - завершиться, когда доступных задач не останется.
+    """
+    processed = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            if once:
+                return processed
+            time.sleep(settings.JOB_POLL_INTERVAL)
+            continue
+        run_job(job)
+        processed += 1
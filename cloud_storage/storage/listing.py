@@ -0,0 +1,102 @@
+"""
+Быстрый вывод списков файлов (?serializer=fast, ?stream=true).
+
+Вместо экземпляров модели и ModelSerializer выбираются только выводимые столбцы (values),
+а строка собирается по заранее составленной проекции: для каждого поля сериализатора -
+столбец и, если значение нужно преобразовать, функция преобразования. Вывод совпадает
+с выводом сериализатора. При ?stream=true JSON страницы отдаётся по частям, без сборки
+всего ответа в памяти.
+"""
+from functools import lru_cache, partial
+
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
+
+# значения этих полей выводятся так, как их вернула БД
+PLAIN_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+    serializers.FloatField,
+    PrimaryKeyRelatedField,
+)
+STREAM_BATCH_ROWS = 200
+
+
+@lru_cache(maxsize=None)
+def compile_projection(serializer_class):
+    """[(имя поля, столбец, поле DRF для преобразования или None)] для ModelSerializer"""
+    projection = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, PrimaryKeyRelatedField):
+            # внешний ключ выводится как id, он есть в самой строке
+            projection.append((name, field.source + '_id', None))
+        elif isinstance(field, PLAIN_FIELDS):
+            projection.append((name, field.source, None))
+        elif isinstance(field, (serializers.DateTimeField, serializers.FileField)):
+            projection.append((name, field.source, field))
+        else:
+            raise TypeError(f'Field {name} ({type(field).__name__}) is not supported by the fast listing.')
+    return tuple(projection)
+
+
+class FastListing:
+    def __init__(self, serializer_class, request):
+        self.projection = compile_projection(serializer_class)
+        self.request = request
+
+    @property
+    def columns(self):
+        return [column for name, column, field in self.projection]
+
+    def file_url(self, storage, name):
+        # как FileField.to_representation с use_url и запросом в контексте
+        if not name:
+            return None
+        return self.request.build_absolute_uri(storage.url(name))
+
+    def converters(self, model):
+        converters = []
+        for name, column, field in self.projection:
+            if field is None:
+                converters.append((name, column, None))
+            elif isinstance(field, serializers.FileField):
+                storage = model._meta.get_field(column).storage
+                converters.append((name, column, partial(self.file_url, storage)))
+            else:
+                converters.append((name, column, field.to_representation))
+        return converters
+
+    def render(self, rows, model):
+        """Строки из queryset.values(*columns) в представление сериализатора"""
+        converters = self.converters(model)
+        for row in rows:
+            yield {
+                name: row[column] if convert is None or row[column] is None else convert(row[column])
+                for name, column, convert in converters
+            }
+
+
+def stream_json(envelope, results):
+    """
+    JSON ответа пагинации по частям: envelope - ответ без результатов (results - последний ключ),
+    results - итератор строк. Кодирование - как у JSONRenderer DRF.
+    """
+    renderer = JSONRenderer()
+    head = renderer.render({**envelope, 'results': []})
+    # ...,"results":[]} -> ...,"results":[
+    yield head[:-2]
+    batch = []
+    separator = b''
+    for row in results:
+        batch.append(renderer.render(row))
+        if len(batch) >= STREAM_BATCH_ROWS:
+            yield separator + b','.join(batch)
+            separator = b','
+            batch = []
+    if batch:
+        yield separator + b','.join(batch)
+    yield b']}'
@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from storage.benchmarks import Benchmark, compare, parse_size
+
+
+class Command(BaseCommand):
+    help = 'Замеры производительности API на синтетических данных в тестовой БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл для результатов в JSON (по умолчанию - вывод в консоль)')
+        parser.add_argument('--compare', help='JSON с результатами предыдущего запуска для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help='Допустимое ухудшение при сравнении (доля), по умолчанию 0.1')
+        parser.add_argument('--repeat', type=int, default=20, help='Число повторов каждого замера')
+        parser.add_argument('--sizes', nargs='+', default=['64K', '1M', '16M'],
+                            help='Размеры файлов для загрузки и скачивания: 4096, 64K, 16M')
+        parser.add_argument('--counts', nargs='+', type=int, default=[100, 1000, 10000],
+                            help='Число файлов пользователя для замеров списка')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую БД после замеров')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        benchmark = Benchmark(
+            repeat=options['repeat'],
+            upload_sizes=[parse_size(size) for size in options['sizes']],
+            list_counts=options['counts'],
+        )
+        # синтетические пользователи и файлы создаются в тестовой БД (test_<DB_NAME> или SQLite в памяти)
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            results = benchmark.run()
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = 0
+            for path, old, new, change, regression in compare(baseline, results, options['tolerance']):
+                regressions += regression
+                self.stdout.write(f"{'REGRESSION ' if regression else ''}{path}: {old} -> {new} ({change:+.1%})")
+            if regressions:
+                raise CommandError(f'{regressions} metrics regressed by more than {options["tolerance"]:.0%}')
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from storage.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные сессии загрузки по частям вместе с временными файлами'
+
+    def handle(self, *args, **options):
+        expired_before = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        sessions = UploadSession.objects.filter(created_date__lt=expired_before).select_related('owner')
+        count = 0
+        for session in sessions:
+            session.discard()
+            count += 1
+        self.stdout.write(f'Removed {count} expired upload sessions')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from storage.models import Blob
+
+
+class Command(BaseCommand):
+    # пересчёт не блокирует загрузки, поэтому команду лучше запускать в период низкой нагрузки
+    help = 'Пересчитывает ссылки на содержимое (дедупликация) и удаляет содержимое без ссылок'
+
+    def handle(self, *args, **options):
+        fixed = 0
+        # на содержимое ссылаются файлы и их прежние версии
+        refs = Count('storagefiles', distinct=True) + Count('versions', distinct=True)
+        for blob in Blob.objects.annotate(refs=refs).iterator():
+            if blob.ref_count != blob.refs:
+                Blob.objects.filter(pk=blob.pk).update(ref_count=blob.refs)
+                fixed += 1
+
+        collected = 0
+        for pk in Blob.objects.filter(ref_count__lte=0).values_list('pk', flat=True):
+            if Blob.collect(pk):
+                collected += 1
+        self.stdout.write(f'Fixed {fixed} reference counts, removed {collected} unreferenced blobs')
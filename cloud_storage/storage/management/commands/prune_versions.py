@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from storage.models import FileVersion
+
+
+class Command(BaseCommand):
+    # удаление по возрасту выполняется только этой командой, поэтому её стоит запускать периодически (cron)
+    help = 'Удаляет версии файлов сверх FILE_VERSIONS и старше FILE_VERSION_MAX_AGE и освобождает их содержимое'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Версий в одной транзакции')
+
+    def handle(self, *args, **options):
+        deleted = FileVersion.prune(batch_size=options['batch_size'])
+        self.stdout.write(f'Removed {deleted} file versions')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from storage.models import FileVersion, Folder, StorageFiles, UserStorage
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает занятое пользователями и папками место и число файлов по таблицам файлов и версий'
+
+    def handle(self, *args, **options):
+        fixed = 0
+        fixed_folders = 0
+        for user_id in UserStorage.objects.values_list('pk', flat=True).iterator():
+            with transaction.atomic():
+                # блокировка строки пользователя: счётчики меняются в тех же транзакциях, что и файлы
+                user = UserStorage.objects.select_for_update().only('used_bytes', 'files_count').get(pk=user_id)
+                totals = StorageFiles.objects.filter(owner_id=user_id).aggregate(used_bytes=Sum('size'), files_count=Count('pk'))
+                # место версий учитывается вместе с файлами
+                versions_bytes = FileVersion.objects.filter(file__owner_id=user_id).aggregate(size=Sum('size'))['size']
+                used_bytes = (totals['used_bytes'] or 0) + (versions_bytes or 0)
+                if (user.used_bytes, user.files_count) != (used_bytes, totals['files_count']):
+                    UserStorage.objects.filter(pk=user_id).update(used_bytes=used_bytes, files_count=totals['files_count'])
+                    fixed += 1
+                fixed_folders += Folder.recompute_totals(user_id)
+        self.stdout.write(f'Fixed usage counters of {fixed} users and {fixed_folders} folders')
@@ -0,0 +1,29 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from storage.jobs import work
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в БД (JOB_QUEUE=database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Число процессов-обработчиков')
+        parser.add_argument('--once', action='store_true', help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        once = options['once']
+        if processes <= 1:
+            processed = work(once=once)
+        else:
+            # дочерние процессы открывают собственные соединения с БД
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+                futures = [pool.submit(work, once) for _ in range(processes)]
+                processed = sum(future.result() for future in futures)
+        self.stdout.write(f'Processed {processed} jobs')
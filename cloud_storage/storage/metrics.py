@@ -0,0 +1,264 @@
+"""
+Метрики в формате Prometheus (эндпоинт /metrics).
+
+Включаются METRICS_ENABLED; в выключенном состоянии metrics_middleware не подключается,
+а функции учёта передач сразу возвращаются. Значения хранятся в памяти процесса,
+поэтому при нескольких рабочих процессах каждый отдаёт собственные метрики.
+"""
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.decorators import sync_and_async_middleware
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+RATE_BUCKETS = tuple(2 ** power for power in range(14, 34, 2))  # от 16 КБ/с до 4 ГБ/с
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def enabled():
+    return settings.METRICS_ENABLED
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            lines.extend(self.samples())
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, *labels):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # [счётчики по корзинам, сумма, количество]
+                state = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.labelnames, labels, [('le', format_value(bound))])
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}'
+            yield f'{self.name}_count{format_labels(self.labelnames, labels)} {count}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+http_requests = Counter('storage_http_requests_total', 'HTTP requests by view and status.', ['view', 'method', 'status'])
+http_duration = Histogram(
+    'storage_http_request_duration_seconds', 'Time to produce the response (without streaming the body).',
+    ['view', 'method'],
+)
+http_queries = Histogram(
+    'storage_http_request_db_queries', 'Database queries per request.', ['view'], buckets=QUERY_BUCKETS,
+)
+transfers_in_progress = Gauge('storage_transfers_in_progress', 'Uploads and downloads in progress.', ['direction'])
+transfer_duration = Histogram('storage_transfer_duration_seconds', 'Duration of completed transfers.', ['direction'])
+transfer_rate = Histogram(
+    'storage_transfer_bytes_per_second', 'Throughput of completed transfers.', ['direction'], buckets=RATE_BUCKETS,
+)
+transfer_bytes = Counter('storage_transfer_bytes_total', 'Bytes transferred.', ['direction'])
+downloads = Counter('storage_downloads_total', 'Downloads by DOWNLOAD_BACKEND.', ['backend'])
+
+
+class Transfer:
+    """
+    Учёт передачи файла: пока передача идёт, она учитывается в storage_transfers_in_progress.
+    Перед завершением в size записывается число переданных байт; передачи,
+    прерванные исключением или без данных, в длительность и скорость не попадают.
+    """
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.size = 0
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        transfers_in_progress.inc(self.direction)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.finish(failed=exc_type is not None)
+
+    def finish(self, failed=False):
+        transfers_in_progress.dec(self.direction)
+        if failed or not self.size:
+            return
+        elapsed = time.perf_counter() - self.start
+        transfer_duration.observe(elapsed, self.direction)
+        transfer_bytes.inc(self.direction, amount=self.size)
+        if elapsed > 0:
+            transfer_rate.observe(self.size / elapsed, self.direction)
+
+
+class NullTransfer:
+    """Заглушка Transfer при выключенных метриках"""
+    size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+null_transfer = NullTransfer()
+
+
+def transfer(direction):
+    """Контекстный менеджер учёта передачи (upload / download)"""
+    return Transfer(direction) if enabled() else null_transfer
+
+
+def track_download(response, backend):
+    """
+    Учёт скачивания. Если тело ответа отдаёт Django, передача считается завершённой
+    при закрытии ответа сервером, объём - по Content-Length.
+    """
+    if not enabled():
+        return response
+    downloads.inc(backend)
+    if response.streaming and response.status_code in (200, 206):
+        tracker = Transfer('download').__enter__()
+        tracker.size = int(response.get('Content-Length') or 0)
+        response._resource_closers.append(tracker.finish)
+    return response
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Длительность и число запросов по представлениям и число запросов к БД на запрос.
+    Запросы к БД асинхронных представлений выполняются в других потоках и не учитываются.
+    """
+    if not enabled():
+        raise MiddlewareNotUsed
+
+    def observe(request, response, start, queries=None):
+        view = view_label(request)
+        http_duration.observe(time.perf_counter() - start, view, request.method)
+        http_requests.inc(view, request.method, str(response.status_code))
+        if queries is not None:
+            http_queries.observe(queries[0], view)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            observe(request, response, start)
+            return response
+    else:
+        def middleware(request):
+            queries = [0]
+
+            def count_query(execute, sql, params, many, context):
+                queries[0] += 1
+                return execute(sql, params, many, context)
+
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_query):
+                response = get_response(request)
+            observe(request, response, start, queries)
+            return response
+
+    return middleware
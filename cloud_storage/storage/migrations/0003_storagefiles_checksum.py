@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0002_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagefiles',
+            name='checksum',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0004_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagefiles',
+            name='download_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0005_download_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='storagefiles',
+            name='short_link',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0006_short_link_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='storagefiles',
+            index=models.Index(fields=['owner', 'upload_date', 'id'], name='storagefile_owner_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storagefiles',
+            index=models.Index(fields=['owner', 'original_name', 'id'], name='storagefile_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='storagefiles',
+            index=models.Index(fields=['owner', 'size', 'id'], name='storagefile_owner_size_idx'),
+        ),
+    ]
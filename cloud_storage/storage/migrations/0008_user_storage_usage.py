@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0007_storagefiles_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstorage',
+            name='files_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userstorage',
+            name='quota_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstorage',
+            name='used_bytes',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0009_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadchunk',
+            name='etag',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='storage_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='storage_upload_id',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0010_object_storage_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Folder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('path', models.CharField(editable=False, max_length=1024)),
+                ('size', models.BigIntegerField(default=0, editable=False)),
+                ('files_count', models.IntegerField(default=0, editable=False)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('last_update_date', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='storage.folder')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='storagefiles',
+            name='folder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='files', to='storage.folder'),
+        ),
+        migrations.AddIndex(
+            model_name='storagefiles',
+            index=models.Index(fields=['owner', 'folder', 'upload_date', 'id'], name='storagefile_folder_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['owner', 'path'], name='folder_owner_path_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='folder',
+            constraint=models.UniqueConstraint(fields=('owner', 'parent', 'name'), name='folder_unique_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='folder',
+            constraint=models.UniqueConstraint(condition=models.Q(('parent__isnull', True)), fields=('owner', 'name'), name='folder_unique_root_name'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+def create_search_indexes(apps, schema_editor):
+    # индексы поиска только для PostgreSQL; для SQLite таблицу FTS5 создаёт search.ensure_sqlite_index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+
+    StorageFiles = apps.get_model('storage', 'StorageFiles')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.add_index(StorageFiles, GinIndex(
+        SearchVector('original_name', 'comment', config='simple'), name='storagefile_search_idx',
+    ))
+    # поиск подстроки в имени (icontains сравнивает UPPER(original_name))
+    schema_editor.add_index(StorageFiles, GinIndex(
+        OpClass(Upper('original_name'), name='gin_trgm_ops'), name='storagefile_name_trgm_idx',
+    ))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS storagefile_search_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS storagefile_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0011_folders'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0012_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('file_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('link', 'Short link')], max_length=8)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='filechange',
+            constraint=models.UniqueConstraint(fields=('owner', 'seq'), name='filechange_owner_seq'),
+        ),
+    ]
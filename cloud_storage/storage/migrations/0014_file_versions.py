@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0013_file_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.FileField(max_length=255, upload_to='')),
+                ('size', models.BigIntegerField()),
+                ('checksum', models.CharField(blank=True, max_length=64)),
+                ('created_date', models.DateTimeField()),
+                ('replaced_date', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='storage.blob')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='storage.storagefiles')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['file', 'replaced_date'], name='fileversion_file_date_idx')],
+            },
+        ),
+    ]
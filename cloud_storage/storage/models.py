@@ -1,10 +1,33 @@
+import hashlib
+import logging
 import os
+import tempfile
+import uuid
+from collections import Counter
+from datetime import timedelta
 
 import shortuuid
+from django.conf import settings
 from django.contrib.auth.models import User, AbstractUser
-from django.db import models
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Max, Q, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Concat, RowNumber, Substr
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 
 from cloud_storage.settings import STORAGE_PATH
+from .backends import is_local
+from .blobs import blob_name, move_file, write_content
+from .cache import short_link_resolver, token_cache
+from .exceptions import InvalidFolder, QuotaExceeded
+from .jobs import enqueue
+from .notifier import change_notifier
+from .previews import preview_supported
+from .uploadhandlers import upload_temp_dir
+
+logger = logging.getLogger(__name__)
 
 
 class UserStorage(AbstractUser):
@@ -13,14 +36,412 @@ class UserStorage(AbstractUser):
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
     storage_path = models.CharField(max_length=255)
+    # занятое место (файлы и их версии) поддерживается при изменении файлов, пересчёт - reconcile_storage_usage
+    used_bytes = models.BigIntegerField(default=0, editable=False)
+    files_count = models.IntegerField(default=0, editable=False)
+    # квота в байтах; пусто - DEFAULT_USER_QUOTA, 0 - без ограничений
+    quota_bytes = models.BigIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding and kwargs.get('update_fields') != ['last_login']:
+            # в кэше токенов хранится объект пользователя: сбрасываем, в том числе при деактивации
+            token_cache.invalidate_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        token_cache.invalidate_user(self.pk)
+        return super().delete(*args, **kwargs)
+
+    @staticmethod
+    def effective_quota(quota_bytes):
+        return settings.DEFAULT_USER_QUOTA if quota_bytes is None else quota_bytes
+
+    @classmethod
+    def check_quota(cls, user_id, size):
+        """Быстрая проверка по счётчику (без агрегации), хватит ли места ещё на size байт"""
+        used_bytes, quota_bytes = cls.objects.filter(pk=user_id).values_list('used_bytes', 'quota_bytes').get()
+        quota = cls.effective_quota(quota_bytes)
+        if quota and used_bytes + size > quota:
+            raise QuotaExceeded()
+
+    @classmethod
+    def change_usage(cls, user_id, size, count, check_quota=False):
+        """
+        Изменяет счётчики занятого места одним UPDATE.
+        При check_quota увеличение сверх квоты отклоняется условием в том же UPDATE,
+        поэтому параллельные загрузки не могут вместе превысить квоту.
+        """
+        queryset = cls.objects.filter(pk=user_id)
+        if check_quota and size > 0:
+            quota = Coalesce(F('quota_bytes'), Value(settings.DEFAULT_USER_QUOTA))
+            queryset = queryset.annotate(quota=quota).filter(
+                Q(quota=0) | Q(used_bytes__lte=F('quota') - size)
+            )
+        if not queryset.update(used_bytes=F('used_bytes') + size, files_count=F('files_count') + count):
+            raise QuotaExceeded()
+
+    @classmethod
+    def lock(cls, user_id):
+        """Блокирует строку пользователя до конца транзакции, чтобы изменения его файлов и папок шли по очереди"""
+        list(cls.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+
+    @classmethod
+    def change_usage_many(cls, changes):
+        """Изменяет счётчики нескольких пользователей одним UPDATE: {user_id: (size, count)}"""
+        if not changes:
+            return
+        cls.objects.filter(pk__in=changes).update(
+            used_bytes=F('used_bytes') + Case(
+                *(When(pk=pk, then=Value(size)) for pk, (size, count) in changes.items()),
+                default=Value(0),
+            ),
+            files_count=F('files_count') + Case(
+                *(When(pk=pk, then=Value(count)) for pk, (size, count) in changes.items()),
+                default=Value(0),
+            ),
+        )
+
+
+def file_checksum(fileobj, chunk_size=1024 * 1024):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    for chunk in fileobj.chunks(chunk_size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
 
 def user_directory_path(instance, filename):
-    # file will be uploaded to STORAGE_PATH/<username>/<filename>
-    return os.path.join(instance.owner.username, filename)
+    # file will be uploaded to STORAGE_PATH/<username>/<name>_<random>.<ext>
+    # случайная часть не даёт новому файлу получить имя удалённого: подписанные ссылки
+    # проверяются без БД и не должны открыть чужое содержимое под прежним именем
+    root, ext = os.path.splitext(filename)
+    return os.path.join(instance.owner.username, f'{root}_{get_random_string(12)}{ext}')
+
+
+def release_files_content(files):
+    """
+    Освобождает содержимое файлов [(name, blob_id), ...] после фиксации транзакции:
+    ссылки на blob снимаются одним UPDATE, собственные файлы удаляются фоновой задачей.
+    """
+    blob_refs = Counter(blob_id for name, blob_id in files if blob_id)
+    names = [name for name, blob_id in files if not blob_id and name]
+    if blob_refs:
+        Blob.release_many(blob_refs)
+    if names:
+        enqueue('delete_files', names=names)
+
+
+def release_file_content(name, blob_id):
+    release_files_content([(name, blob_id)])
+
+
+class Blob(models.Model):
+    '''Уникальное содержимое файлов при включённой дедупликации'''
+    checksum = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.checksum
+
+    @property
+    def name(self):
+        return blob_name(self.checksum)
+
+    @classmethod
+    def acquire(cls, checksum, size, write):
+        """
+        Добавляет ссылку на содержимое с контрольной суммой checksum.
+        Если такого содержимого ещё нет, оно записывается вызовом write(name).
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(checksum=checksum).first()
+            if blob is None:
+                name = blob_name(checksum)
+                if not default_storage.exists(name):
+                    write(name)
+                blob, created = cls.objects.get_or_create(checksum=checksum, defaults={'size': size})
+            cls.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+        return blob
+
+    @classmethod
+    def release(cls, pk):
+        cls.release_many({pk: 1})
+
+    @classmethod
+    def release_many(cls, refs):
+        """Снимает ссылки {blob_id: количество}, содержимое без ссылок удаляется фоновой задачей"""
+        cls.objects.filter(pk__in=refs).update(
+            ref_count=F('ref_count') - Case(
+                *(When(pk=pk, then=Value(count)) for pk, count in refs.items()),
+                default=Value(0),
+            ),
+        )
+        enqueue('collect_blobs', pks=list(refs))
+
+    @classmethod
+    def collect(cls, pk):
+        """Удаляет содержимое, на которое не осталось ссылок"""
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(pk=pk, ref_count__lte=0).first()
+            if blob is None:
+                return False
+            # файл удаляется под блокировкой, чтобы параллельный acquire не сослался на удалённый файл
+            default_storage.delete(blob.name)
+            blob.delete()
+        return True
+
+
+def increments(values):
+    """CASE для UPDATE нескольких строк: прибавка к полю по id из словаря {id: значение}"""
+    return Case(*(When(pk=pk, then=Value(value)) for pk, value in values.items()), default=Value(0))
+
+
+class Folder(models.Model):
+    '''Папки пользователя'''
+    owner = models.ForeignKey(UserStorage, on_delete=models.CASCADE)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    name = models.CharField(max_length=255)
+    # материализованный путь из id папок от корня, включая саму папку: /1/5/9/
+    path = models.CharField(max_length=1024, editable=False)
+    # размер и число файлов во всём поддереве, поддерживаются при изменении файлов
+    size = models.BigIntegerField(default=0, editable=False)
+    files_count = models.IntegerField(default=0, editable=False)
+    created_date = models.DateTimeField(auto_now_add=True)
+    last_update_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # индекс ограничения используется и для списка вложенных папок
+            models.UniqueConstraint(fields=['owner', 'parent', 'name'], name='folder_unique_name'),
+            models.UniqueConstraint(
+                fields=['owner', 'name'], condition=Q(parent__isnull=True), name='folder_unique_root_name',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'path'], name='folder_owner_path_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def ancestor_ids(path):
+        """id папок пути от корня, включая последнюю"""
+        return [int(pk) for pk in path.strip('/').split('/') if pk]
+
+    @staticmethod
+    def child_path(parent, pk):
+        return (parent.path if parent is not None else '/') + f'{pk}/'
+
+    @staticmethod
+    def check_depth(path):
+        if path.count('/') - 1 > settings.FOLDER_MAX_DEPTH:
+            raise InvalidFolder(f'Folders cannot be nested deeper than {settings.FOLDER_MAX_DEPTH} levels.')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            # путь и итоги меняются только запросами UPDATE (move_to, change_totals_many)
+            kwargs.setdefault('update_fields', ['name', 'parent', 'last_update_date'])
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # путь содержит id папки, поэтому записывается после вставки
+            self.check_depth(self.child_path(self.parent, 0))
+            self.path = ''
+            super().save(*args, **kwargs)
+            self.path = self.child_path(self.parent, self.pk)
+            Folder.objects.filter(pk=self.pk).update(path=self.path)
+
+    @classmethod
+    def add_totals(cls, totals):
+        """Прибавляет к размеру и числу файлов папок {folder_id: (size, count)} одним UPDATE"""
+        totals = {pk: value for pk, value in totals.items() if value != (0, 0)}
+        if totals:
+            cls.objects.filter(pk__in=totals).update(
+                size=F('size') + increments({pk: size for pk, (size, count) in totals.items()}),
+                files_count=F('files_count') + increments({pk: count for pk, (size, count) in totals.items()}),
+            )
+
+    @classmethod
+    def change_totals_many(cls, changes):
+        """
+        Учитывает изменение файлов в папках {folder_id: (size, count)}: прибавка распространяется
+        на все папки выше по пути. Два запроса независимо от числа папок и глубины.
+        """
+        changes = {pk: value for pk, value in changes.items() if pk and value != (0, 0)}
+        if not changes:
+            return
+        totals = {}
+        for pk, path in cls.objects.filter(pk__in=changes).values_list('pk', 'path'):
+            size, count = changes[pk]
+            for ancestor in cls.ancestor_ids(path):
+                total_size, total_count = totals.get(ancestor, (0, 0))
+                totals[ancestor] = (total_size + size, total_count + count)
+        cls.add_totals(totals)
+
+    def subtree(self):
+        """Папка со всеми вложенными папками"""
+        return Folder.objects.filter(owner_id=self.owner_id, path__startswith=self.path)
+
+    def move_to(self, parent):
+        """
+        Перемещает папку в parent (None - в корень). Меняются только пути вложенных папок
+        и итоги папок выше по старому и новому пути; файлы и их содержимое не затрагиваются.
+        """
+        with transaction.atomic():
+            UserStorage.lock(self.owner_id)
+            folder = Folder.objects.get(pk=self.pk)
+            if parent is not None:
+                parent = Folder.objects.get(pk=parent.pk)
+                if parent.path.startswith(folder.path):
+                    raise InvalidFolder('Cannot move a folder into itself.')
+            new_path = self.child_path(parent, folder.pk)
+            if new_path != folder.path:
+                subtree = folder.subtree()
+                deepest = max(subtree.values_list('path', flat=True), key=lambda path: path.count('/'))
+                self.check_depth(new_path + deepest[len(folder.path):])
+                subtree.update(path=Concat(
+                    Value(new_path), Substr('path', len(folder.path) + 1), output_field=models.CharField(),
+                ))
+                totals = {}
+                for pk in self.ancestor_ids(folder.path)[:-1]:
+                    totals[pk] = (-folder.size, -folder.files_count)
+                for pk in self.ancestor_ids(new_path)[:-1]:
+                    size, count = totals.get(pk, (0, 0))
+                    totals[pk] = (size + folder.size, count + folder.files_count)
+                Folder.add_totals(totals)
+            Folder.objects.filter(pk=folder.pk).update(parent=parent, last_update_date=timezone.now())
+        self.parent = parent
+        self.path = new_path
+
+    def delete_tree(self):
+        """Удаляет папку со всеми вложенными папками и файлами, возвращает id удалённых файлов"""
+        with transaction.atomic():
+            subtree = self.subtree()
+            deleted = StorageFiles.objects.filter(folder__in=subtree).delete_files()
+            subtree.delete()
+        return deleted
+
+    @classmethod
+    def recompute_totals(cls, owner_id):
+        """Пересчитывает итоги папок пользователя по таблице файлов, возвращает число исправленных папок"""
+        direct = {
+            row['folder']: (row['size'] or 0, row['count'])
+            for row in StorageFiles.objects.filter(owner_id=owner_id, folder__isnull=False)
+            .values('folder').annotate(size=Sum('size'), count=Count('pk'))
+        }
+        folders = list(cls.objects.filter(owner_id=owner_id).values_list('pk', 'path', 'size', 'files_count'))
+        totals = {pk: (0, 0) for pk, path, size, count in folders}
+        for pk, path, size, count in folders:
+            direct_size, direct_count = direct.get(pk, (0, 0))
+            for ancestor in cls.ancestor_ids(path):
+                if ancestor in totals:
+                    total_size, total_count = totals[ancestor]
+                    totals[ancestor] = (total_size + direct_size, total_count + direct_count)
+        fixed = 0
+        for pk, path, size, count in folders:
+            if (size, count) != totals[pk]:
+                cls.objects.filter(pk=pk).update(size=totals[pk][0], files_count=totals[pk][1])
+                fixed += 1
+        return fixed
+
+
+class StorageFilesQuerySet(models.QuerySet):
+    """Групповые операции над файлами: один запрос на всю выборку"""
+
+    def delete_files(self):
+        """Удаляет записи одним DELETE, содержимое освобождается после фиксации транзакции"""
+        with transaction.atomic():
+            rows = list(self.select_for_update().values_list(
+                'pk', 'owner_id', 'folder_id', 'size', 'file', 'blob_id', 'short_link',
+            ))
+            if not rows:
+                return []
+            ids = [row[0] for row in rows]
+            versions = list(FileVersion.objects.filter(file_id__in=ids).values_list(
+                'content', 'blob_id', 'size', 'file__owner_id',
+            ))
+            StorageFiles.objects.filter(pk__in=ids).delete()
+            usage = {}
+            folders = {}
+            for content, blob_id, size, owner_id in versions:
+                # место версий учитывается в занятом месте владельца
+                used, count = usage.get(owner_id, (0, 0))
+                usage[owner_id] = (used - size, count)
+            for pk, owner_id, folder_id, size, name, blob_id, short_link in rows:
+                used, count = usage.get(owner_id, (0, 0))
+                usage[owner_id] = (used - (size or 0), count - 1)
+                used, count = folders.get(folder_id, (0, 0))
+                folders[folder_id] = (used - (size or 0), count - 1)
+                short_link_resolver.invalidate(short_link)
+            UserStorage.change_usage_many(usage)
+            Folder.change_totals_many(folders)
+            FileChange.record(FileChange.DELETE, [(row[1], row[0]) for row in rows], locked=True)
+            release_files_content([(row[4], row[5]) for row in rows] + [version[:2] for version in versions])
+        return ids
+
+    def move_to_folder(self, folder):
+        """Переносит файлы в папку (None - в корень) одним UPDATE, содержимое файлов не затрагивается"""
+        folder_id = folder.pk if folder is not None else None
+        with transaction.atomic():
+            rows = list(self.select_for_update().values_list('pk', 'owner_id', 'folder_id', 'size', 'short_link'))
+            for owner_id in sorted({row[1] for row in rows}):
+                UserStorage.lock(owner_id)
+            moved = [row for row in rows if row[2] != folder_id]
+            if not moved:
+                return []
+            StorageFiles.objects.filter(pk__in=[row[0] for row in moved]).update(
+                folder=folder, last_update_date=timezone.now(),
+            )
+            changes = {folder_id: (sum(row[3] or 0 for row in moved), len(moved))}
+            for pk, owner_id, old_folder_id, size, short_link in moved:
+                used, count = changes.get(old_folder_id, (0, 0))
+                changes[old_folder_id] = (used - (size or 0), count - 1)
+                short_link_resolver.invalidate(short_link)
+            Folder.change_totals_many(changes)
+            FileChange.record(FileChange.UPDATE, [(row[1], row[0]) for row in moved], locked=True)
+        return [row[0] for row in moved]
+
+    def update_comment(self, comment):
+        with transaction.atomic():
+            rows = list(self.select_for_update().values_list('owner_id', 'pk', 'short_link'))
+            # update() не обновляет auto_now поля, поэтому дата изменения задаётся явно
+            updated = StorageFiles.objects.filter(pk__in=[pk for owner_id, pk, short_link in rows]).update(
+                comment=comment, last_update_date=timezone.now(),
+            )
+            for owner_id, pk, short_link in rows:
+                short_link_resolver.invalidate(short_link)
+            FileChange.record(FileChange.UPDATE, [(owner_id, pk) for owner_id, pk, short_link in rows])
+        return updated
+
+    def generate_short_links(self):
+        """Выпускает новые короткие ссылки одним UPDATE, возвращает {id: short_link}"""
+        with transaction.atomic():
+            rows = list(self.select_for_update().values_list('pk', 'short_link', 'owner_id'))
+            links = {pk: shortuuid.uuid() for pk, short_link, owner_id in rows}
+            if links:
+                StorageFiles.objects.filter(pk__in=links).update(
+                    short_link=Case(*(When(pk=pk, then=Value(link)) for pk, link in links.items())),
+                )
+            for pk, short_link, owner_id in rows:
+                short_link_resolver.invalidate(short_link)
+            FileChange.record(FileChange.LINK, [(owner_id, pk) for pk, short_link, owner_id in rows])
+        return links
+
+    def delete_short_links(self):
+        with transaction.atomic():
+            rows = list(self.select_for_update().values_list('pk', 'short_link', 'owner_id'))
+            StorageFiles.objects.filter(pk__in=[pk for pk, short_link, owner_id in rows]).update(short_link=None)
+            for pk, short_link, owner_id in rows:
+                short_link_resolver.invalidate(short_link)
+            FileChange.record(FileChange.LINK, [(owner_id, pk) for pk, short_link, owner_id in rows])
+        return [pk for pk, short_link, owner_id in rows]
+
 
 class StorageFiles(models.Model):
     '''Файлы пользователя'''
@@ -34,25 +455,522 @@ class StorageFiles(models.Model):
     upload_date = models.DateTimeField(auto_now_add=True)
     last_update_date = models.DateTimeField(auto_now=True)
     last_download_date = models.DateTimeField(null=True, blank=True)
+    download_count = models.PositiveIntegerField(default=0, editable=False)
     comment = models.TextField(blank=True)
-    short_link = models.CharField(max_length=255, blank=True, null=True)
+    short_link = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    checksum = models.CharField(max_length=64, blank=True, editable=False)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, editable=False)
+    # пусто - файл в корне; папку с файлами удаляет Folder.delete_tree, освобождающий их содержимое
+    folder = models.ForeignKey(Folder, on_delete=models.RESTRICT, null=True, blank=True, related_name='files')
 
-    def save(self, *args, **kwargs):
+    objects = StorageFilesQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # списки файлов пользователя с keyset-пагинацией по дате загрузки, имени и размеру
+            models.Index(fields=['owner', 'upload_date', 'id'], name='storagefile_owner_uploaded_idx'),
+            models.Index(fields=['owner', 'original_name', 'id'], name='storagefile_owner_name_idx'),
+            models.Index(fields=['owner', 'size', 'id'], name='storagefile_owner_size_idx'),
+            models.Index(fields=['owner', 'folder', 'upload_date', 'id'], name='storagefile_folder_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # при смене папки в save итоги пересчитываются у прежней и новой папки
+        if 'folder_id' in instance.__dict__:
+            instance._loaded_folder_id = instance.folder_id
+        return instance
+
+    def save(self, *args, change=None, **kwargs):
+        """change - запись журнала изменений вместо create / update (например, FileChange.LINK)"""
         if not self.owner_id and 'owner' in kwargs:
             self.owner = kwargs.pop('owner')
-        if self.file:
-            self.size = self.file.size
-            if self.original_name == '':
-                self.original_name = self.file.name
-        super(StorageFiles, self).save(*args, **kwargs)
+        with transaction.atomic():
+            previous = None
+            content = None
+            if self.file:
+                if self.original_name == '':
+                    self.original_name = self.file.name
+                if not self.file._committed:
+                    # новый файл ещё не сохранён в хранилище
+                    if self.pk:
+                        previous = StorageFiles.objects.filter(pk=self.pk).values(
+                            'file', 'blob_id', 'size', 'checksum', 'last_update_date',
+                        ).first()
+                    content = self.file.file
+                    # StorageUploadHandler считает контрольную сумму во время приёма файла
+                    self.checksum = getattr(content, 'checksum', None) or file_checksum(self.file)
+                    self.size = content.size
+                elif self.size is None:
+                    self.size = self.file.size
+            adding = self._state.adding
+            # место резервируется до записи файла в хранилище
+            if adding:
+                UserStorage.change_usage(self.owner_id, self.size or 0, 1, check_quota=True)
+            elif previous:
+                # если прежнее содержимое останется версией, его место остаётся занятым
+                kept = previous['size'] if self.keeps_version(previous) else 0
+                UserStorage.change_usage(self.owner_id, self.size - previous['size'] + kept, 0, check_quota=True)
+            if content is not None and settings.STORAGE_DEDUPLICATION:
+                self.attach_blob(content.size, lambda name: write_content(default_storage, name, content))
+            super(StorageFiles, self).save(*args, **kwargs)
+            self.update_folder_totals(adding, previous)
+            change = change or (FileChange.CREATE if adding else FileChange.UPDATE)
+            FileChange.record(change, [(self.owner_id, self.pk)])
+            if previous:
+                self.keep_version(previous)
+            short_link_resolver.invalidate(self.short_link)
+            if self.file and (adding or content is not None):
+                self.schedule_processing()
+
+    def update_folder_totals(self, adding, previous):
+        size = self.size or 0
+        loaded_folder_id = getattr(self, '_loaded_folder_id', self.folder_id)
+        changes = {}
+        if adding:
+            changes[self.folder_id] = (size, 1)
+        elif loaded_folder_id != self.folder_id:
+            UserStorage.lock(self.owner_id)
+            changes[loaded_folder_id] = (-(previous['size'] if previous else size), -1)
+            changes[self.folder_id] = (size, 1)
+        elif previous:
+            changes[self.folder_id] = (size - previous['size'], 0)
+        Folder.change_totals_many(changes)
+        self._loaded_folder_id = self.folder_id
+
+    def keeps_version(self, previous):
+        """Станет ли заменённое содержимое версией: без версионирования (FILE_VERSIONS=0) и при неизменном содержимом - нет"""
+        return bool(settings.FILE_VERSIONS) and not (previous['checksum'] and previous['checksum'] == self.checksum)
+
+    def keep_version(self, previous):
+        """
+        Заменённое содержимое становится версией файла: ссылка на него переходит к версии без копирования,
+        иначе оно освобождается. Место версии учитывает вызывающий (см. keeps_version).
+        """
+        if not self.keeps_version(previous):
+            release_file_content(previous['file'], previous['blob_id'])
+            return
+        FileVersion.objects.create(
+            file=self,
+            content=previous['file'],
+            blob_id=previous['blob_id'],
+            size=previous['size'],
+            checksum=previous['checksum'],
+            created_date=previous['last_update_date'],
+        )
+        # лишние по количеству версии удаляются в фоне, по возрасту - командой prune_versions
+        enqueue('prune_versions', file_id=self.pk)
+
+    def restore_version(self, version):
+        """Делает версию текущим содержимым, а текущее - версией; self и version заблокированы вызывающим"""
+        Folder.change_totals_many({self.folder_id: (version.size - (self.size or 0), 0)})
+        current = {
+            'file': self.file.name,
+            'blob_id': self.blob_id,
+            'size': self.size,
+            'checksum': self.checksum,
+            'last_update_date': self.last_update_date,
+        }
+        self.file = version.content.name
+        self.blob_id = version.blob_id
+        self.size = version.size
+        self.checksum = version.checksum
+        # место версии уже учтено, текущее содержимое остаётся занятым, только если станет версией
+        if not self.keeps_version(current):
+            UserStorage.change_usage(self.owner_id, -(current['size'] or 0), 0)
+        version.delete()
+        self.save(update_fields=['file', 'blob', 'size', 'checksum', 'last_update_date'])
+        self.keep_version(current)
+        if not self.checksum:
+            enqueue('compute_checksum', file_id=self.pk)
+
+    def schedule_processing(self):
+        """Фоновая обработка нового содержимого файла после фиксации транзакции"""
+        if not self.checksum:
+            enqueue('compute_checksum', file_id=self.pk)
+        if settings.FILE_SCAN_HOOK:
+            enqueue('scan_file', file_id=self.pk)
+        if settings.PREVIEW_ON_UPLOAD and preview_supported(self.original_name):
+            enqueue('generate_preview', file_id=self.pk)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pk = self.pk
+            versions_size = self.versions.aggregate(size=Coalesce(Sum('size'), 0))['size']
+            result = super().delete(*args, **kwargs)
+            UserStorage.change_usage(self.owner_id, -(self.size or 0) - versions_size, -1)
+            Folder.change_totals_many({self.folder_id: (-(self.size or 0), -1)})
+            FileChange.record(FileChange.DELETE, [(self.owner_id, pk)], locked=True)
+        return result
+
+    def attach_blob(self, size, write):
+        """Ссылается на общее содержимое с контрольной суммой self.checksum вместо отдельной копии"""
+        blob = Blob.acquire(self.checksum, size, write)
+        self.blob = blob
+        self.file = blob.name
+
+    def release_file(self):
+        versions = list(self.versions.values_list('content', 'blob_id'))
+        release_files_content([(self.file.name, self.blob_id)] + versions)
+        short_link_resolver.invalidate(self.short_link)
 
     def __str__(self):
         return self.original_name
 
     def generate_short_link(self):
+        short_link_resolver.invalidate(self.short_link)
         self.short_link = shortuuid.uuid()
-        self.save()
+        self.save(change=FileChange.LINK)
 
     def delete_short_link(self):
+        short_link_resolver.invalidate(self.short_link)
         self.short_link = None
-        self.save()
+        self.save(change=FileChange.LINK)
+
+
+class FileVersion(models.Model):
+    '''Прежнее содержимое файла: файл в хранилище или ссылка на общее содержимое (дедупликация)'''
+    file = models.ForeignKey(StorageFiles, on_delete=models.CASCADE, related_name='versions')
+    content = models.FileField(max_length=255)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name='versions')
+    size = models.BigIntegerField()
+    checksum = models.CharField(max_length=64, blank=True)
+    # когда содержимое стало текущим и когда его заменили
+    created_date = models.DateTimeField()
+    replaced_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['file', 'replaced_date'], name='fileversion_file_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.file_id} ({self.replaced_date})'
+
+    def as_file(self):
+        """Несохраняемый StorageFiles с содержимым версии: для file_response и проверки прав"""
+        return StorageFiles(
+            pk=self.file.pk,
+            owner_id=self.file.owner_id,
+            original_name=self.file.original_name,
+            file=self.content.name,
+            size=self.size,
+            checksum=self.checksum,
+            last_update_date=self.created_date,
+        )
+
+    @classmethod
+    def expired(cls, file_id=None):
+        """id версий сверх FILE_VERSIONS последних у файла и старше FILE_VERSION_MAX_AGE секунд"""
+        versions = cls.objects.all() if file_id is None else cls.objects.filter(file_id=file_id)
+        ranked = versions.annotate(number=Window(
+            RowNumber(),
+            partition_by=[F('file_id')],
+            order_by=[F('replaced_date').desc(), F('pk').desc()],
+        ))
+        pks = set(ranked.filter(number__gt=settings.FILE_VERSIONS).values_list('pk', flat=True))
+        if settings.FILE_VERSION_MAX_AGE:
+            cutoff = timezone.now() - timedelta(seconds=settings.FILE_VERSION_MAX_AGE)
+            pks.update(versions.filter(replaced_date__lt=cutoff).values_list('pk', flat=True))
+        return sorted(pks)
+
+    @classmethod
+    def delete_versions(cls, pks):
+        """Удаляет версии, содержимое освобождается после фиксации транзакции"""
+        with transaction.atomic():
+            rows = list(cls.objects.select_for_update().filter(pk__in=pks).values_list(
+                'pk', 'content', 'blob_id', 'size', 'file__owner_id',
+            ))
+            cls.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            usage = {}
+            for pk, content, blob_id, size, owner_id in rows:
+                used, count = usage.get(owner_id, (0, 0))
+                usage[owner_id] = (used - size, count)
+            UserStorage.change_usage_many(usage)
+            release_files_content([(content, blob_id) for pk, content, blob_id, size, owner_id in rows])
+        return len(rows)
+
+    @classmethod
+    def prune(cls, file_id=None, batch_size=1000):
+        """Применяет политику хранения версий, возвращает число удалённых версий"""
+        pks = cls.expired(file_id)
+        deleted = 0
+        for start in range(0, len(pks), batch_size):
+            deleted += cls.delete_versions(pks[start:start + batch_size])
+        return deleted
+
+
+class FileChange(models.Model):
+    '''Журнал изменений файлов для синхронизации клиентов: только добавление записей'''
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    LINK = 'link'
+    ACTIONS = [
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+        (LINK, 'Short link'),
+    ]
+
+    owner = models.ForeignKey(UserStorage, on_delete=models.CASCADE, related_name='changes')
+    # номер изменения: растёт без пропусков в порядке фиксации транзакций пользователя
+    seq = models.BigIntegerField()
+    # без внешнего ключа: запись об удалении переживает файл
+    file_id = models.BigIntegerField()
+    action = models.CharField(max_length=8, choices=ACTIONS)
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'seq'], name='filechange_owner_seq'),
+        ]
+
+    def __str__(self):
+        return f'{self.seq} {self.action} {self.file_id}'
+
+    @classmethod
+    def last_seq(cls, owner_id):
+        return cls.objects.filter(owner_id=owner_id).aggregate(seq=Coalesce(Max('seq'), 0))['seq']
+
+    @classmethod
+    def record(cls, action, files, locked=False):
+        """
+        Записывает изменения файлов [(owner_id, file_id), ...] в текущей транзакции.
+        Строка пользователя блокируется до фиксации, поэтому номера выдаются по очереди и клиент,
+        прочитавший изменения до номера N, не пропустит зафиксированное позже изменение с меньшим номером.
+        locked - строки пользователей уже заблокированы (например, UPDATE счётчиков занятого места).
+        """
+        by_owner = {}
+        for owner_id, file_id in files:
+            by_owner.setdefault(owner_id, []).append(file_id)
+        changes = []
+        for owner_id in sorted(by_owner):
+            if not locked:
+                UserStorage.lock(owner_id)
+            seq = cls.last_seq(owner_id)
+            for file_id in by_owner[owner_id]:
+                seq += 1
+                changes.append(cls(owner_id=owner_id, seq=seq, file_id=file_id, action=action))
+            transaction.on_commit(lambda owner_id=owner_id, seq=seq: change_notifier.notify(owner_id, seq))
+        cls.objects.bulk_create(changes)
+
+
+class UploadSession(models.Model):
+    '''Сессия загрузки файла по частям'''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(UserStorage, on_delete=models.CASCADE)
+    original_name = models.CharField(max_length=255)
+    comment = models.TextField(blank=True)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_date = models.DateTimeField(auto_now_add=True)
+    # в объектном хранилище части загружаются сразу в объект storage_name (multipart upload)
+    storage_name = models.CharField(max_length=255, blank=True, editable=False)
+    storage_upload_id = models.CharField(max_length=255, blank=True, editable=False)
+
+    def __str__(self):
+        return f'{self.original_name} ({self.id})'
+
+    @property
+    def chunks_count(self):
+        return -(-self.size // self.chunk_size)
+
+    @property
+    def temp_path(self):
+        # части складываются в STORAGE_PATH/<username>/.uploads/<id>.part
+        return os.path.join(upload_temp_dir(self.owner.username), f'{self.id}.part')
+
+    @property
+    def storage(self):
+        return StorageFiles._meta.get_field('file').storage
+
+    def chunk_length(self, index):
+        """Ожидаемый размер части с номером index"""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def start(self):
+        """Подготавливает место для частей: временный файл или загрузку по частям в объектном хранилище"""
+        if not is_local(self.storage):
+            if settings.STORAGE_DEDUPLICATION:
+                # имя содержимого станет известно только после подсчёта контрольной суммы
+                self.storage_name = os.path.join(self.owner.username, '.uploads', str(self.id))
+            else:
+                # объект появится только после сборки частей, поэтому имя сразу делается уникальным
+                name = user_directory_path(StorageFiles(owner=self.owner), self.original_name)
+                self.storage_name = self.storage.get_available_name(name)
+            self.storage_upload_id = self.storage.create_multipart_upload(self.storage_name)
+            self.save(update_fields=['storage_name', 'storage_upload_id'])
+            return
+        os.makedirs(os.path.dirname(self.temp_path), exist_ok=True)
+        with open(self.temp_path, 'wb') as f:
+            f.truncate(self.size)
+
+    def write_chunk_data(self, index, stream, block_size=64 * 1024):
+        """
+        Записывает часть по её смещению во временный файл или в объектное хранилище.
+        Возвращает число записанных байт и ETag части (для объектного хранилища).
+        """
+        length = self.chunk_length(index)
+        written = 0
+        if self.storage_upload_id:
+            # S3 требует длину части заранее, поэтому часть сначала принимается целиком
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024, dir=settings.FILE_UPLOAD_TEMP_DIR) as f:
+                written = copy_stream(stream, f, length, block_size)
+                if written != length:
+                    return written, ''
+                f.seek(0)
+                etag = self.storage.upload_part(self.storage_name, self.storage_upload_id, index + 1, f, length)
+            return written, etag
+        with open(self.temp_path, 'r+b') as f:
+            f.seek(index * self.chunk_size)
+            written = copy_stream(stream, f, length, block_size)
+        return written, ''
+
+    def write_chunk(self, index, stream):
+        written, etag = self.write_chunk_data(index, stream)
+        if written == self.chunk_length(index):
+            UploadChunk.objects.update_or_create(session=self, index=index, defaults={'size': written, 'etag': etag})
+        return written
+
+    def received_ranges(self):
+        """Полученные диапазоны байт в виде [[start, end), ...]"""
+        ranges = []
+        for index in self.chunks.order_by('index').values_list('index', flat=True):
+            start = index * self.chunk_size
+            end = start + self.chunk_length(index)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    def missing_chunks(self):
+        received = set(self.chunks.values_list('index', flat=True))
+        return [index for index in range(self.chunks_count) if index not in received]
+
+    def is_expired(self):
+        age = timezone.now() - self.created_date
+        return age.total_seconds() > settings.UPLOAD_SESSION_TTL
+
+    def commit(self):
+        """Переносит собранный файл в хранилище и создаёт запись StorageFiles"""
+        instance = StorageFiles(owner=self.owner, original_name=self.original_name, comment=self.comment)
+        storage = instance.file.storage
+        with transaction.atomic():
+            # повторный commit той же сессии дождётся блокировки и получит DoesNotExist
+            UploadSession.objects.select_for_update().get(pk=self.pk)
+            if self.storage_upload_id:
+                return self.commit_object(instance, storage)
+            if settings.STORAGE_DEDUPLICATION:
+                # содержимое ищется по контрольной сумме; без дедупликации сумму посчитает фоновая задача
+                with open(self.temp_path, 'rb') as f:
+                    instance.checksum = file_checksum(File(f))
+                instance.attach_blob(self.size, lambda name: move_file(storage, self.temp_path, name))
+                instance.save()
+                self.discard()
+                return instance
+            name = storage.get_available_name(user_directory_path(instance, self.original_name))
+            path = storage.path(name)
+            os.replace(self.temp_path, path)
+            try:
+                instance.file.name = name
+                instance.save()
+                self.delete()
+            except Exception:
+                os.replace(path, self.temp_path)
+                raise
+        return instance
+
+    def commit_object(self, instance, storage):
+        """Завершение загрузки по частям в объектном хранилище: части собираются на стороне хранилища"""
+        # после сборки части уже не вернуть, поэтому место проверяется заранее
+        UserStorage.check_quota(self.owner_id, self.size)
+        parts = self.chunks.order_by('index').values_list('index', 'etag')
+        storage.complete_multipart_upload(
+            self.storage_name,
+            self.storage_upload_id,
+            [(index + 1, etag) for index, etag in parts],
+        )
+        try:
+            if settings.STORAGE_DEDUPLICATION:
+                with storage.open(self.storage_name, 'rb') as f:
+                    instance.checksum = file_checksum(f)
+                instance.attach_blob(self.size, lambda name: storage.copy(self.storage_name, name))
+                instance.save()
+                storage.delete(self.storage_name)
+            else:
+                instance.file.name = self.storage_name
+                instance.save()
+        except Exception:
+            storage.delete(self.storage_name)
+            raise
+        self.delete()
+        return instance
+
+    def discard(self):
+        if self.storage_upload_id:
+            try:
+                self.storage.abort_multipart_upload(self.storage_name, self.storage_upload_id)
+            except Exception:
+                # загрузка уже завершена или удалена политикой жизненного цикла бакета
+                logger.warning("Failed to abort multipart upload %s", self.storage_upload_id, exc_info=True)
+        elif os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        self.delete()
+
+
+def copy_stream(stream, target, length, block_size):
+    """Копирует не больше length байт из stream в target, возвращает число скопированных байт"""
+    copied = 0
+    while copied < length:
+        data = stream.read(min(block_size, length - copied))
+        if not data:
+            break
+        target.write(data)
+        copied += len(data)
+    return copied
+
+
+class UploadChunk(models.Model):
+    '''Полученная часть файла'''
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    etag = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='unique_upload_chunk'),
+        ]
+
+
+class Job(models.Model):
+    '''Фоновая задача в очереди БД (JOB_QUEUE=database)'''
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # не раньше этого времени (задержка перед повтором)
+    run_after = models.DateTimeField(default=timezone.now)
+    # задача захвачена обработчиком до этого времени
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
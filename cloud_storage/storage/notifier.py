@@ -0,0 +1,63 @@
+"""
+Пробуждение запросов, ожидающих изменений файлов пользователя (long-poll журнала изменений).
+
+Уведомления доходят только до запросов в том же процессе; изменения из других процессов
+ожидающие запросы находят опросом БД раз в CHANGES_POLL_INTERVAL секунд.
+"""
+import asyncio
+import threading
+
+
+def wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class ChangeNotifier:
+    def __init__(self):
+        self.condition = threading.Condition()
+        # последний зафиксированный номер изменения по пользователям
+        self.latest = {}
+        # асинхронные ожидания: {owner_id: {future: event loop}}
+        self.waiters = {}
+
+    def last_seq(self, owner_id):
+        return self.latest.get(owner_id, 0)
+
+    def notify(self, owner_id, seq):
+        """Вызывается после фиксации транзакции с изменениями пользователя"""
+        with self.condition:
+            self.latest[owner_id] = max(seq, self.last_seq(owner_id))
+            self.condition.notify_all()
+            waiters = self.waiters.pop(owner_id, {})
+        for future, loop in waiters.items():
+            loop.call_soon_threadsafe(wake, future)
+
+    def wait(self, owner_id, seq, timeout):
+        """Ждёт изменения новее seq не дольше timeout секунд, возвращает True, если оно появилось"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.last_seq(owner_id) > seq, timeout)
+
+    async def async_wait(self, owner_id, seq, timeout):
+        """То же, что wait, без занятого на время ожидания потока"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.condition:
+            if self.last_seq(owner_id) > seq:
+                return True
+            self.waiters.setdefault(owner_id, {})[future] = loop
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self.condition:
+                waiters = self.waiters.get(owner_id)
+                if waiters is not None:
+                    waiters.pop(future, None)
+                    if not waiters:
+                        del self.waiters[owner_id]
+
+
+change_notifier = ChangeNotifier()
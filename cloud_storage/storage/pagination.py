@@ -0,0 +1,132 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# допустимые сортировки списка файлов; при равенстве значений порядок задаёт id
+ORDERINGS = ['upload_date', '-upload_date', 'original_name', '-original_name', 'size', '-size']
+# тип значения поля в курсоре; upload_date проверяется разбором даты
+CURSOR_TYPES = {'original_name': str, 'size': int}
+
+
+def get_ordering(request, default=None):
+    ordering = request.query_params.get('ordering', default)
+    return ordering if ordering in ORDERINGS else default
+
+
+def order_queryset(queryset, ordering):
+    tiebreaker = '-id' if ordering.startswith('-') else 'id'
+    return queryset.order_by(ordering, tiebreaker)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация: следующая страница выбирается условием (поле, id) > (значение, id)
+    последней записи, поэтому её стоимость не зависит от глубины.
+    Используются индексы (owner, <поле>, id).
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    max_limit = 1000
+    default_ordering = 'upload_date'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = get_ordering(request, self.default_ordering) or self.default_ordering
+        self.field = self.ordering.lstrip('-')
+        self.limit = self.get_limit(request)
+
+        queryset = order_queryset(queryset, self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            op = 'lt' if self.ordering.startswith('-') else 'gt'
+            queryset = queryset.filter(**{f'{self.field}__{op}e': value}).filter(
+                Q(**{f'{self.field}__{op}': value}) | Q(**{f'pk__{op}': pk})
+            )
+
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        results = results[:self.limit]
+        self.next_position = None
+        if self.has_next:
+            last = results[-1]
+            if isinstance(last, dict):
+                # строки queryset.values() быстрого вывода списка
+                self.next_position = (last[self.field], last['id'])
+            else:
+                self.next_position = (getattr(last, self.field), last.pk)
+        return results
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(limit, self.max_limit) if limit > 0 else api_settings.PAGE_SIZE
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if self.field == 'upload_date':
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError
+            elif not isinstance(value, CURSOR_TYPES[self.field]) or isinstance(value, bool):
+                raise ValueError
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                raise ValueError
+            return value, pk
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        value, pk = position
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        encoded = urlsafe_b64encode(json.dumps([value, pk]).encode()).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class StorageFilesPagination(LimitOffsetPagination):
+    """
+    Пагинация списка файлов: limit/offset по умолчанию,
+    keyset-пагинация при ?pagination=cursor (и в ссылках на следующие страницы с ?cursor=).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        ordering = get_ordering(request)
+        if ordering:
+            queryset = order_queryset(queryset, ordering)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,161 @@
+"""
+Превью (миниатюры) изображений.
+
+Превью хранятся в дисковом кэше PREVIEW_CACHE_DIR под ключом <id файла>-<время изменения>,
+поэтому после замены файла старое превью больше не используется и вытесняется первым.
+Размер кэша ограничен PREVIEW_CACHE_MAX_SIZE: при переполнении удаляются превью,
+к которым дольше всего не обращались.
+"""
+import io
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_CONTENT_TYPE = 'image/jpeg'
+
+
+class PreviewUnavailable(Exception):
+    """Файл не является изображением или не может быть прочитан"""
+
+
+def preview_supported(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    return bool(content_type) and content_type.startswith('image/')
+
+
+def preview_key(file_id, last_update_date):
+    return f'{file_id}-{int(last_update_date.timestamp() * 1000000)}'
+
+
+def render_preview(source, size):
+    """Миниатюра изображения (путь или файловый объект) не больше size x size в формате JPEG"""
+    try:
+        with Image.open(source) as image:
+            # для JPEG декодер сразу уменьшает изображение, не разворачивая его целиком
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=80, optimize=True)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise PreviewUnavailable(str(e)) from e
+    return output.getvalue()
+
+
+class PreviewCache:
+    """Дисковый кэш превью с вытеснением по времени последнего обращения"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # занятое место известно после первого обхода каталога
+        self.size = None
+
+    @property
+    def directory(self):
+        return os.path.join(settings.MEDIA_ROOT, settings.PREVIEW_CACHE_DIR)
+
+    def path(self, key):
+        file_id = key.partition('-')[0]
+        return os.path.join(self.directory, file_id[-2:].rjust(2, '0'), key + '.jpg')
+
+    def get(self, key):
+        """Содержимое превью или None; обращение продлевает жизнь превью в кэше"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # превью вытеснено другим процессом сразу после чтения
+            pass
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        # превью предыдущих версий файла больше не понадобятся
+        prefix = key.partition('-')[0] + '-'
+        freed = 0
+        for entry in os.scandir(directory):
+            if entry.name.startswith(prefix) and entry.path != path:
+                freed += self.remove(entry.path)
+
+        with self.lock:
+            if self.size is not None:
+                self.size += len(data) - freed
+        self.evict()
+
+    def remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def entries(self):
+        for subdir in os.scandir(self.directory):
+            if subdir.is_dir():
+                for entry in os.scandir(subdir.path):
+                    if entry.is_file() and not entry.name.startswith('.tmp-'):
+                        yield entry
+
+    def evict(self):
+        """Удаляет давно не использованные превью, пока кэш больше PREVIEW_CACHE_MAX_SIZE"""
+        max_size = settings.PREVIEW_CACHE_MAX_SIZE
+        with self.lock:
+            if self.size is not None and self.size <= max_size:
+                return
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self.entries()]
+            self.size = sum(size for mtime, size, path in entries)
+            if self.size <= max_size:
+                return
+            # освобождаем с запасом, чтобы не обходить каталог при каждой записи
+            target = max_size * 0.9
+            for mtime, size, path in sorted(entries):
+                if self.size <= target:
+                    break
+                self.size -= self.remove(path)
+
+    def clear(self):
+        with self.lock:
+            if os.path.isdir(self.directory):
+                for entry in list(self.entries()):
+                    self.remove(entry.path)
+            self.size = None
+
+
+preview_cache = PreviewCache()
+
+
+def get_preview(file_id, last_update_date, field_file):
+    """Превью файла; при отсутствии в кэше превью создаётся из содержимого файла в хранилище"""
+    key = preview_key(file_id, last_update_date)
+    data = preview_cache.get(key)
+    if data is None:
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            data = render_preview(source, settings.PREVIEW_SIZE)
+        preview_cache.put(key, data)
+    return data
@@ -0,0 +1,78 @@
+"""S3-совместимое объектное хранилище (STORAGE_BACKEND=s3)"""
+from django.conf import settings
+from django.utils.http import content_disposition_header
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+
+class ObjectStorage(S3Storage):
+    """
+    Хранилище django-storages с операциями, которые нужны файловому хранилищу:
+    запись под заданным именем, серверное копирование, загрузка по частям и подписанные ссылки.
+    """
+
+    def get_default_settings(self):
+        defaults = super().get_default_settings()
+        defaults.update(
+            bucket_name=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region_name=settings.S3_REGION,
+            querystring_expire=settings.S3_URL_EXPIRE,
+            # одинаковые имена не перезаписываются, как в FileSystemStorage
+            file_overwrite=False,
+        )
+        return defaults
+
+    def key(self, name):
+        return self._normalize_name(clean_name(name))
+
+    @property
+    def client(self):
+        return self.connection.meta.client
+
+    def write(self, name, content):
+        """Записывает объект под именем name, перезаписывая существующий (крупные файлы - по частям)"""
+        return self._save(name, content)
+
+    def copy(self, source_name, name):
+        self.client.copy(
+            {'Bucket': self.bucket_name, 'Key': self.key(source_name)},
+            self.bucket_name,
+            self.key(name),
+            Config=self.transfer_config,
+        )
+
+    def download_url(self, name, filename):
+        """Подписанная ссылка на скачивание с исходным именем файла"""
+        return self.url(name, parameters={'ResponseContentDisposition': content_disposition_header(True, filename)})
+
+    def create_multipart_upload(self, name):
+        params = self._get_write_parameters(self.key(name))
+        response = self.client.create_multipart_upload(Bucket=self.bucket_name, Key=self.key(name), **params)
+        return response['UploadId']
+
+    def upload_part(self, name, upload_id, number, body, length):
+        """Загружает часть number (с 1), возвращает её ETag"""
+        response = self.client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key(name),
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=body,
+            ContentLength=length,
+        )
+        return response['ETag']
+
+    def complete_multipart_upload(self, name, upload_id, parts):
+        """Собирает объект из частей [(номер, ETag), ...]"""
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.key(name),
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag in parts]},
+        )
+
+    def abort_multipart_upload(self, name, upload_id):
+        self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key(name), UploadId=upload_id)
@@ -0,0 +1,132 @@
+"""
+Поиск файлов по имени и комментарию.
+
+PostgreSQL: полнотекстовый поиск по to_tsvector('simple', имя и комментарий) и поиск подстроки
+в имени; оба условия обслуживаются GIN-индексами (tsvector и pg_trgm), ранг - ts_rank
+плюс триграммное сходство имени с запросом.
+SQLite (тесты, разработка): таблица FTS5 storage_file_search, которую поддерживают триггеры, ранг - bm25.
+Индексы PostgreSQL создаёт миграция 0012. Таблица FTS5 пересоздаётся после каждого migrate,
+так как SQLite при изменении таблицы файлов пересоздаёт её и удаляет триггеры.
+"""
+import mimetypes
+import re
+
+from django.db import connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+FTS_TABLE = 'storage_file_search'
+SEARCH_CONFIG = 'simple'
+
+# таблица FTS5 и триггеры для SQLite
+SQLITE_INDEX = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(original_name, comment, tokenize='unicode61')",
+    f"DELETE FROM {FTS_TABLE}",
+    f"INSERT INTO {FTS_TABLE}(rowid, original_name, comment) SELECT id, original_name, comment FROM storage_storagefiles",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON storage_storagefiles BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, original_name, comment) VALUES (new.id, new.original_name, new.comment);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF original_name, comment ON storage_storagefiles
+    BEGIN
+        UPDATE {FTS_TABLE} SET original_name = new.original_name, comment = new.comment WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON storage_storagefiles BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+]
+
+
+def ensure_sqlite_index(using='default', **kwargs):
+    """Создаёт таблицу FTS5 с триггерами и заполняет её (обработчик post_migrate)"""
+    db = connections[using]
+    if db.vendor != 'sqlite' or 'storage_storagefiles' not in db.introspection.table_names():
+        return
+    with db.cursor() as cursor:
+        for statement in SQLITE_INDEX:
+            cursor.execute(statement)
+
+
+def search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    # выражение должно совпадать с выражением индекса storagefile_search_idx
+    return SearchVector('original_name', 'comment', config=SEARCH_CONFIG)
+
+
+def fts_query(text):
+    """Запрос FTS5: все слова запроса как префиксы"""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def postgresql_search(queryset, text):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(document=search_vector()).filter(
+        Q(document=query) | Q(original_name__icontains=text)
+    ).annotate(
+        rank=SearchRank(search_vector(), query) + TrigramSimilarity('original_name', text),
+    )
+
+
+def sqlite_search(queryset, text):
+    match = fts_query(text)
+    if not match:
+        return queryset.filter(original_name__icontains=text).annotate(rank=Value(0.0, output_field=FloatField()))
+    table = queryset.model._meta.db_table
+    matched = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    # bm25 тем меньше, чем лучше совпадение
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+        [match],
+        output_field=FloatField(),
+    )
+    return queryset.filter(Q(pk__in=matched) | Q(original_name__icontains=text)).annotate(
+        rank=Coalesce(rank, Value(0.0)),
+    )
+
+
+def text_search(queryset, text):
+    """Файлы, подходящие под запрос, с рангом rank (больше - лучше)"""
+    if connection.vendor == 'postgresql':
+        return postgresql_search(queryset, text)
+    if connection.vendor == 'sqlite':
+        return sqlite_search(queryset, text)
+    return queryset.filter(Q(original_name__icontains=text) | Q(comment__icontains=text)).annotate(
+        rank=Value(0.0, output_field=FloatField()),
+    )
+
+
+def type_extensions(file_type):
+    """Расширения файлов типа: основной тип MIME (image, video, ...) или само расширение (pdf)"""
+    file_type = file_type.lower().lstrip('.')
+    extensions = sorted(
+        extension for extension, content_type in mimetypes.types_map.items()
+        if content_type.split('/')[0] == file_type
+    )
+    return extensions or ['.' + file_type]
+
+
+def search_files(queryset, params):
+    """Поиск по параметрам SearchSerializer; с текстом запроса - по убыванию ранга"""
+    if params.get('size_min') is not None:
+        queryset = queryset.filter(size__gte=params['size_min'])
+    if params.get('size_max') is not None:
+        queryset = queryset.filter(size__lte=params['size_max'])
+    for param, lookup in (
+        ('uploaded_after', 'upload_date__gte'),
+        ('uploaded_before', 'upload_date__lt'),
+        ('downloaded_after', 'last_download_date__gte'),
+        ('downloaded_before', 'last_download_date__lt'),
+    ):
+        if params.get(param) is not None:
+            queryset = queryset.filter(**{lookup: params[param]})
+    if params.get('type'):
+        extensions = Q()
+        for extension in type_extensions(params['type']):
+            extensions |= Q(original_name__iendswith=extension)
+        queryset = queryset.filter(extensions)
+    if params.get('q'):
+        return text_search(queryset, params['q']).order_by('-rank', '-id')
+    return queryset.order_by('-upload_date', '-id')
@@ -1,6 +1,11 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
-from storage.models import UserStorage, StorageFiles
+from storage.backends import MAX_PARTS, MIN_PART_SIZE, is_local
+from storage.models import FileChange, FileVersion, Folder, UserStorage, StorageFiles, UploadSession
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -15,13 +20,17 @@ class UserSerializer(serializers.ModelSerializer):
             'is_active',
             'is_staff',
             'is_superuser',
+            'used_bytes',
+            'files_count',
+            'quota_bytes',
         ]
+        read_only_fields = ['used_bytes', 'files_count']
 
 
 class StorageFilesSerializer(serializers.ModelSerializer):
     class Meta:
         model = StorageFiles
-        fields = '__all__'
+        exclude = ['blob']
         read_only_fields = [
             'owner',
             'original_name',
@@ -32,10 +41,212 @@ class StorageFilesSerializer(serializers.ModelSerializer):
             'short_link',
         ]
 
+    def validate_folder(self, folder):
+        owner_id = self.instance.owner_id if self.instance is not None else self.context['request'].user.pk
+        if folder is not None and folder.owner_id != owner_id:
+            raise serializers.ValidationError('Folder not found.')
+        return folder
+
     def create(self, validated_data):
         validated_data['owner'] = self.context['request'].user
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
         validated_data['owner'] = instance.owner
-        return super().update(instance, validated_data)
\ No newline at end of file
+        return super().update(instance, validated_data)
+
+
+class FileVersionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FileVersion
+        fields = ['id', 'size', 'checksum', 'created_date', 'replaced_date']
+
+
+class FolderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Folder
+        fields = ['id', 'name', 'parent', 'path', 'size', 'files_count', 'created_date', 'last_update_date']
+        read_only_fields = ['path', 'size', 'files_count', 'created_date', 'last_update_date']
+
+    def validate_parent(self, parent):
+        if parent is not None and parent.owner_id != self.context['request'].user.pk:
+            raise serializers.ValidationError('Folder not found.')
+        return parent
+
+    def validate(self, attrs):
+        instance = self.instance
+        name = attrs.get('name', instance.name if instance else None)
+        parent = attrs['parent'] if 'parent' in attrs else (instance.parent if instance else None)
+        siblings = Folder.objects.filter(owner=self.context['request'].user, parent=parent, name=name)
+        if instance is not None:
+            siblings = siblings.exclude(pk=instance.pk)
+        if siblings.exists():
+            raise serializers.ValidationError({'name': 'A folder with this name already exists.'})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['owner'] = self.context['request'].user
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'parent' in validated_data:
+            parent = validated_data.pop('parent')
+            if parent != instance.parent:
+                instance.move_to(parent)
+        return super().update(instance, validated_data)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.UPLOAD_MAX_CHUNK_SIZE,
+    )
+    chunks_count = serializers.IntegerField(read_only=True)
+    received_ranges = serializers.ListField(read_only=True)
+    missing_chunks = serializers.ListField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id',
+            'original_name',
+            'comment',
+            'size',
+            'chunk_size',
+            'chunks_count',
+            'received_ranges',
+            'missing_chunks',
+            'created_date',
+        ]
+        read_only_fields = ['id', 'created_date']
+
+    def validate_original_name(self, value):
+        # как у файлов обычной загрузки - только имя, без каталогов
+        name = os.path.basename(value.replace('\\', '/')).strip()
+        if name in ('', '.', '..'):
+            raise serializers.ValidationError("Invalid file name.")
+        return name
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("File size must be positive.")
+        # место проверяется заранее, чтобы не принимать части файла, который не поместится
+        UserStorage.check_quota(self.context['request'].user.pk, value)
+        return value
+
+    def validate(self, attrs):
+        chunk_size = attrs.setdefault('chunk_size', settings.UPLOAD_CHUNK_SIZE)
+        if not is_local(default_storage) and attrs['size'] > chunk_size:
+            if chunk_size < MIN_PART_SIZE:
+                raise serializers.ValidationError({'chunk_size': f"Chunk size must be at least {MIN_PART_SIZE} bytes."})
+            if -(-attrs['size'] // chunk_size) > MAX_PARTS:
+                raise serializers.ValidationError({'chunk_size': f"File must be split into at most {MAX_PARTS} chunks."})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['owner'] = self.context['request'].user
+        session = super().create(validated_data)
+        session.start()
+        return session
+
+
+class BulkFilesSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_FILES,
+    )
+
+
+class BulkMoveSerializer(BulkFilesSerializer):
+    folder = serializers.IntegerField(min_value=1, allow_null=True)
+
+
+class BulkCommentSerializer(BulkFilesSerializer):
+    comment = serializers.CharField(allow_blank=True)
+
+
+class BulkShortLinkSerializer(BulkFilesSerializer):
+    action = serializers.ChoiceField(choices=['generate', 'revoke'])
+
+
+class BlockSizeSerializer(serializers.Serializer):
+    block_size = serializers.IntegerField(
+        required=False,
+        min_value=4096,
+        max_value=settings.UPLOAD_MAX_CHUNK_SIZE,
+        default=settings.DELTA_BLOCK_SIZE,
+    )
+
+
+class DeltaSerializer(BlockSizeSerializer):
+    # [{"copy": <блок>, "count": <число блоков>} | {"data": <число байт>}, ...]
+    instructions = serializers.JSONField(binary=True)
+    data = serializers.FileField(required=False, allow_empty_file=True)
+    # SHA-256 новой версии
+    checksum = serializers.RegexField(r'^[0-9a-f]{64}$')
+
+    def validate_instructions(self, instructions):
+        if not isinstance(instructions, list):
+            raise serializers.ValidationError('A list of instructions is expected.')
+        for instruction in instructions:
+            if not isinstance(instruction, dict):
+                raise serializers.ValidationError('Each instruction must be an object.')
+            if set(instruction) in ({'copy'}, {'copy', 'count'}):
+                values = [instruction['copy'], instruction.get('count', 1)]
+                minimums = [0, 1]
+            elif set(instruction) == {'data'}:
+                values, minimums = [instruction['data']], [1]
+            else:
+                raise serializers.ValidationError('Each instruction must be {"copy": n[, "count": n]} or {"data": n}.')
+            if any(type(value) is not int or value < minimum for value, minimum in zip(values, minimums)):
+                raise serializers.ValidationError('Block numbers must be non-negative integers, counts and lengths positive.')
+        return instructions
+
+
+class ChangesSerializer(serializers.Serializer):
+    # без since возвращается только текущий номер журнала, с которого клиент начнёт синхронизацию
+    since = serializers.IntegerField(required=False, min_value=0)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=settings.CHANGES_PAGE_SIZE)
+    # long-poll: сколько секунд ждать изменений, если их ещё нет
+    wait = serializers.IntegerField(required=False, min_value=0, max_value=settings.CHANGES_MAX_WAIT, default=0)
+
+
+class FileChangeSerializer(serializers.ModelSerializer):
+    # текущее состояние файла (context['files']), у удалённых - null
+    file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FileChange
+        fields = ['seq', 'file_id', 'action', 'date', 'file']
+
+    def get_file(self, change):
+        instance = self.context['files'].get(change.file_id)
+        if instance is None:
+            return None
+        return StorageFilesSerializer(instance, context=self.context).data
+
+
+class SearchSerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, max_length=200)
+    size_min = serializers.IntegerField(required=False, min_value=0)
+    size_max = serializers.IntegerField(required=False, min_value=0)
+    uploaded_after = serializers.DateTimeField(required=False)
+    uploaded_before = serializers.DateTimeField(required=False)
+    downloaded_after = serializers.DateTimeField(required=False)
+    downloaded_before = serializers.DateTimeField(required=False)
+    # основной тип MIME (image, video, audio, text, application) или расширение (pdf)
+    type = serializers.RegexField(r'^\.?[\w-]+$', required=False, max_length=32)
+
+
+class SignedLinkSerializer(serializers.Serializer):
+    expires_in = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.SIGNED_URL_MAX_TTL,
+        default=settings.SIGNED_URL_TTL,
+    )
+
+
+class BulkSignedLinkSerializer(BulkFilesSerializer, SignedLinkSerializer):
+    pass
@@ -0,0 +1,58 @@
+"""
+Подписанные ссылки на скачивание.
+
+Токен ссылки содержит id файла, контрольную сумму, имя в хранилище, исходное имя, размер,
+время изменения и срок действия и подписан HMAC-SHA256 ключом SIGNED_URL_KEY.
+Для проверки и отдачи файла всё нужное берётся из токена, поэтому обращения к БД не требуется.
+Имена в хранилище не используются повторно (user_directory_path), поэтому ссылка на удалённый
+файл не откроет новое содержимое под тем же именем.
+Выданные ссылки нельзя отозвать до истечения срока иначе, чем сменой SIGNED_URL_KEY.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core import signing
+
+from .downloads import download_filename
+from .models import StorageFiles
+
+SALT = 'storage.signed-download'
+
+
+class LinkExpired(signing.BadSignature):
+    """Срок действия ссылки истёк"""
+
+
+def signer():
+    return signing.Signer(key=settings.SIGNED_URL_KEY, salt=SALT)
+
+
+def sign_download(file_instance, expires_in):
+    """Токен подписанной ссылки на файл и время окончания её действия (unix time)"""
+    expires = int(time.time()) + expires_in
+    payload = [
+        file_instance.pk,
+        file_instance.checksum,
+        file_instance.file.name,
+        download_filename(file_instance),
+        file_instance.size,
+        int(file_instance.last_update_date.timestamp()),
+        expires,
+    ]
+    return signer().sign_object(payload, compress=True), expires
+
+
+def unsign_download(token):
+    """Файл по токену ссылки (объект не из БД) или исключение BadSignature / LinkExpired"""
+    file_id, checksum, name, filename, size, modified, expires = signer().unsign_object(token)
+    if expires < time.time():
+        raise LinkExpired('Link expired')
+    return StorageFiles(
+        pk=file_id,
+        checksum=checksum,
+        file=name,
+        original_name=filename,
+        size=size,
+        last_update_date=datetime.fromtimestamp(modified, tz=timezone.utc),
+    )
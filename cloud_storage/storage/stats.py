@@ -0,0 +1,78 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+# число файлов в одном UPDATE
+FLUSH_BATCH_SIZE = 500
+
+
+class DownloadRecorder:
+    """
+    Накапливает статистику скачиваний в памяти процесса и записывает её пакетно:
+    не чаще раза в DOWNLOAD_STATS_FLUSH_INTERVAL секунд, одним UPDATE на пачку файлов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def record(self, file_id, when=None):
+        when = when or timezone.now()
+        interval = settings.DOWNLOAD_STATS_FLUSH_INTERVAL
+        with self._lock:
+            last_date, count = self._pending.get(file_id, (when, 0))
+            self._pending[file_id] = (max(last_date, when), count + 1)
+            if interval > 0 and self._timer is None:
+                self._timer = threading.Timer(interval, self._flush_in_thread)
+                self._timer.daemon = True
+                self._timer.start()
+        if interval <= 0:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """Записывает накопленную статистику, возвращает число обновлённых файлов"""
+        from .models import StorageFiles
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        items = list(pending.items())
+        updated = 0
+        for start in range(0, len(items), FLUSH_BATCH_SIZE):
+            batch = items[start:start + FLUSH_BATCH_SIZE]
+            # update() не трогает last_update_date (auto_now) и не перечитывает размер файла
+            updated += StorageFiles.objects.filter(pk__in=[pk for pk, stat in batch]).update(
+                last_download_date=Case(
+                    *(When(pk=pk, then=Value(last_date)) for pk, (last_date, count) in batch),
+                    default=F('last_download_date'),
+                ),
+                download_count=F('download_count') + Case(
+                    *(When(pk=pk, then=Value(count)) for pk, (last_date, count) in batch),
+                    default=Value(0),
+                ),
+            )
+        return updated
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            # у потока таймера собственные соединения с БД
+            connections.close_all()
+
+
+download_recorder = DownloadRecorder()
+
+# статистика, не записанная к моменту остановки процесса, сбрасывается при выходе
+atexit.register(download_recorder.flush)
@@ -0,0 +1,74 @@
+"""Фоновые задачи хранилища (см. jobs.py)"""
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .backends import local_file
+from .blobs import delete_files
+from .jobs import task
+from .models import Blob, FileChange, FileVersion, StorageFiles, file_checksum
+from .previews import PreviewUnavailable, get_preview
+
+logger = logging.getLogger(__name__)
+
+
+@task('delete_files')
+def delete_files_task(names):
+    delete_files(default_storage, names)
+
+
+@task('collect_blobs')
+def collect_blobs(pks):
+    for pk in pks:
+        Blob.collect(pk)
+
+
+@task('prune_versions')
+def prune_versions(file_id):
+    """Удаляет версии файла сверх FILE_VERSIONS"""
+    FileVersion.prune(file_id=file_id)
+
+
+@task('compute_checksum')
+def compute_checksum(file_id):
+    """Контрольная сумма файла, собранного без её подсчёта (загрузка по частям без дедупликации)"""
+    file_instance = StorageFiles.objects.only('owner_id', 'file', 'checksum').filter(pk=file_id).first()
+    if file_instance is None or file_instance.checksum or not file_instance.file:
+        return
+    with file_instance.file.open('rb') as f:
+        checksum = file_checksum(f)
+    with transaction.atomic():
+        # файл могли заменить, пока считалась сумма
+        if StorageFiles.objects.filter(pk=file_id, file=file_instance.file.name).update(checksum=checksum):
+            FileChange.record(FileChange.UPDATE, [(file_instance.owner_id, file_id)])
+
+
+@task('scan_file')
+def scan_file(file_id):
+    """
+    Проверка файла функцией FILE_SCAN_HOOK (например, антивирусом).
+    Функция получает путь к файлу; если она вернула False, файл удаляется.
+    """
+    file_instance = StorageFiles.objects.only('file').filter(pk=file_id).first()
+    if file_instance is None or not file_instance.file:
+        return
+    scan = import_string(settings.FILE_SCAN_HOOK)
+    with local_file(file_instance.file) as path:
+        accepted = scan(path) is not False
+    if not accepted:
+        logger.warning("File %s (%s) rejected by %s, deleting", file_id, file_instance.file.name, settings.FILE_SCAN_HOOK)
+        StorageFiles.objects.filter(pk=file_id).delete_files()
+
+
+@task('generate_preview')
+def generate_preview(file_id):
+    file_instance = StorageFiles.objects.only('file', 'last_update_date').filter(pk=file_id).first()
+    if file_instance is None or not file_instance.file:
+        return
+    try:
+        get_preview(file_instance.pk, file_instance.last_update_date, file_instance.file)
+    except PreviewUnavailable:
+        pass
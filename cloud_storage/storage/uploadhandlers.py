@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+def upload_temp_dir(username):
+    """Каталог временных файлов загрузки: в той же файловой системе, что и файлы пользователя"""
+    return os.path.join(settings.MEDIA_ROOT, username, '.uploads')
+
+
+class HashedUploadedFile(UploadedFile):
+    """Загруженный файл во временном файле рядом с хранилищем, с посчитанными размером и контрольной суммой"""
+
+    def __init__(self, file, name, content_type, size, charset, checksum, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.checksum = checksum
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            # если файл не был перенесён в хранилище, временная копия больше не нужна
+            if os.path.exists(self.file.name):
+                os.remove(self.file.name)
+
+
+class StorageUploadHandler(FileUploadHandler):
+    """
+    Пишет загружаемый файл сразу во временный файл в MEDIA_ROOT и считает SHA-256 по ходу приёма.
+    FileSystemStorage затем переносит его на место переименованием, без повторной записи и чтения,
+    объектное хранилище загружает его из временного файла.
+    """
+
+    def __init__(self, request=None, check_quota=False):
+        super().__init__(request)
+        self.check_quota = check_quota
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if self.check_quota:
+            # отклоняем загрузку по Content-Length до чтения тела запроса
+            from .models import UserStorage
+            UserStorage.check_quota(self.request.user.pk, content_length)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        directory = upload_temp_dir(self.request.user.username)
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix='.upload-', delete=False)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.digest.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return HashedUploadedFile(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            checksum=self.digest.hexdigest(),
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+            os.remove(self.file.name)
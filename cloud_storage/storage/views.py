@@ -1,24 +1,61 @@
-import os
 import logging
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.signing import BadSignature
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.middleware.csrf import get_token
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 from rest_framework import status
-from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.parsers import MultiPartParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny, SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from . import metrics
 from .forms import CustomUserCreationForm
-from .models import UserStorage, StorageFiles
-from .serializers import UserSerializer, StorageFilesSerializer
+from .models import FileVersion, Folder, UserStorage, StorageFiles, UploadSession
+from .serializers import (
+    UserSerializer,
+    StorageFilesSerializer,
+    UploadSessionSerializer,
+    BulkFilesSerializer,
+    BulkCommentSerializer,
+    BulkMoveSerializer,
+    FolderSerializer,
+    BulkShortLinkSerializer,
+    BlockSizeSerializer,
+    BulkSignedLinkSerializer,
+    ChangesSerializer,
+    DeltaSerializer,
+    FileVersionSerializer,
+    SearchSerializer,
+    SignedLinkSerializer,
+)
 from .decorators import handle_file_download
+from .archives import COMPRESSION, zip_stream
+from .authentication import issue_token, rotate_token
+from .cache import short_link_resolver
+from .changes import wait_for_changes
+from .delta import assemble, file_signatures
+from .listing import FastListing, stream_json
+from .downloads import can_download, conditional_response, file_etag, file_response
+from .pagination import StorageFilesPagination
+from .previews import PREVIEW_CONTENT_TYPE, PreviewUnavailable, get_preview, preview_key, preview_supported
+from .search import search_files
+from .signing import LinkExpired, sign_download, unsign_download
+from .stats import download_recorder
+from .uploadhandlers import StorageUploadHandler
 
 logger = logging.getLogger(__name__)
 
@@ -29,11 +66,46 @@ def csrf_token_view(request):
     return Response({'csrfToken': get_token(request)})
 
 
+def signed_url(request, token):
+    return request.build_absolute_uri(reverse('storagefiles-download-signed', kwargs={'token': token}))
+
+
+@require_safe
+def download_signed(request, token):
+    """Скачивание по подписанной ссылке: подпись проверяется без обращения к БД и авторизации"""
+    try:
+        file_instance = unsign_download(token)
+    except LinkExpired:
+        return JsonResponse({'detail': "Link expired."}, status=status.HTTP_410_GONE)
+    except BadSignature:
+        return JsonResponse({'detail': "Invalid link."}, status=status.HTTP_403_FORBIDDEN)
+
+    not_modified = conditional_response(request, file_instance)
+    if not_modified is not None:
+        return not_modified
+    download_recorder.record(file_instance.pk)
+    try:
+        return file_response(request, file_instance)
+    except FileNotFoundError:
+        raise Http404("File not found")
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class CustomAuthToken(ObtainAuthToken):
     def post(self, request, *args, **kwargs):
-        response = super(CustomAuthToken, self).post(request, *args, **kwargs)
-        token = Token.objects.get(key=response.data['token'])
-        user = token.user
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token = issue_token(user)
         return Response({
             'token': token.key,
             'user_id': user.id,
@@ -67,20 +139,84 @@ class UserViewSet(ModelViewSet):
     serializer_class = UserSerializer
     pagination_class = LimitOffsetPagination
 
+    @action(detail=True, methods=['post'])
+    def rotate_token(self, request, pk=None):
+        """Выдаёт пользователю новый токен; прежний перестаёт действовать"""
+        user = self.get_object()
+        token = rotate_token(user)
+        return Response({'token': token.key})
+
+
+class FolderViewSet(ModelViewSet):
+    """Папки пользователя; список - вложенные папки ?parent=<id> (без параметра - папки верхнего уровня)"""
+    serializer_class = FolderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = LimitOffsetPagination
+
+    def get_queryset(self):
+        queryset = Folder.objects.filter(owner=self.request.user)
+        if self.action == 'list':
+            parent = self.request.query_params.get('parent')
+            if parent is not None and not parent.isdigit():
+                raise ValidationError({'parent': 'A folder id is expected.'})
+            queryset = queryset.filter(parent_id=int(parent) if parent else None).order_by('name')
+        return queryset
+
+    def perform_destroy(self, instance):
+        # вложенные папки и файлы удаляются вместе с папкой
+        instance.delete_tree()
+
 
 class StorageFilesViewSet(ModelViewSet):
     queryset = StorageFiles.objects.all()
     serializer_class = StorageFilesSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser]
+    pagination_class = StorageFilesPagination
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            # файл пишется сразу в MEDIA_ROOT с подсчётом контрольной суммы во время приёма.
+            # Обработчик ставится до аутентификации: проверка CSRF для сессии уже разбирает тело запроса
+            request._request.upload_handlers = [
+                # при загрузке файла квота проверяется по Content-Length до чтения тела
+                StorageUploadHandler(request._request, check_quota=self.action == 'create'),
+            ]
+        return request
 
     def get_queryset(self):
         user = self.request.user
-        logger.debug(f"{self.__class__.__name__} user={user} request={self.request}")
+        logger.debug("%s user=%s request=%s", self.__class__.__name__, user, self.request)
         if (self.request.method not in SAFE_METHODS) and (user.is_superuser or user.is_staff):
             return StorageFiles.objects.all()
         return StorageFiles.objects.filter(owner=user)
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        folder = self.request.query_params.get('folder')
+        if self.action == 'list' and folder is not None:
+            # ?folder=<id> - файлы папки, ?folder=root - файлы вне папок
+            if folder == 'root':
+                return queryset.filter(folder__isnull=True)
+            if not folder.isdigit():
+                raise ValidationError({'folder': 'A folder id or "root" is expected.'})
+            queryset = queryset.filter(folder_id=int(folder))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # ?serializer=fast - вывод через values() и проекцию полей, ?stream=true - JSON по частям
+        stream = request.query_params.get('stream') in ('true', '1')
+        if request.query_params.get('serializer') != 'fast' and not stream:
+            return super().list(request, *args, **kwargs)
+        listing = FastListing(self.get_serializer_class(), request)
+        queryset = self.filter_queryset(self.get_queryset()).values(*listing.columns)
+        rows = listing.render(self.paginate_queryset(queryset), queryset.model)
+        if not stream:
+            return self.get_paginated_response(list(rows))
+        envelope = self.paginator.get_paginated_response([]).data
+        return StreamingHttpResponse(stream_json(envelope, rows), content_type='application/json')
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
@@ -89,16 +225,237 @@ class StorageFilesViewSet(ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         user = self.request.user
-        logger.debug(f"{self.__class__.__name__} Start file upload by user={user} request={self.request}")
-        file = request.data.get('file', None)
-        if file is None:
-            logger.error(f"{self.__class__.__name__} File field is null by user={user} request={self.request}")
+        logger.debug("%s Start file upload by user=%s request=%s", self.__class__.__name__, user, self.request)
+        with metrics.transfer('upload') as transfer:
+            # тело запроса читается при разборе request.data
+            file = request.data.get('file', None)
+            if file is None:
+                logger.error("%s File field is null by user=%s request=%s", self.__class__.__name__, user, self.request)
+                return Response(
+                    {"detail": "File field cannot be null."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            logger.debug(
+                "%s File uploaded: %s by user=%s request=%s", self.__class__.__name__, file.name, user, self.request
+            )
+            response = super().create(request, *args, **kwargs)
+            transfer.size = file.size
+        return response
+
+    def get_upload_session(self, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, owner=self.request.user)
+        if session.is_expired():
+            session.discard()
+            raise Http404("Upload session expired")
+        return session
+
+    @action(detail=False, methods=['post'], url_path='uploads', parser_classes=[JSONParser, MultiPartParser])
+    def upload_init(self, request):
+        # эндпоинт /storagefiles/uploads/ - начало загрузки файла по частям
+        serializer = UploadSessionSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)')
+    def upload_status(self, request, upload_id=None):
+        # эндпоинт /storagefiles/uploads/<upload_id>/ - полученные диапазоны или отмена загрузки
+        session = self.get_upload_session(upload_id)
+        if request.method == 'DELETE':
+            session.discard()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(UploadSessionSerializer(session).data)
+
+    @action(detail=False, methods=['put'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/chunks/(?P<index>[0-9]+)')
+    def upload_chunk(self, request, upload_id=None, index=None):
+        # эндпоинт /storagefiles/uploads/<upload_id>/chunks/<index>/ - тело запроса содержит часть файла
+        session = self.get_upload_session(upload_id)
+        index = int(index)
+        if index >= session.chunks_count:
+            return Response({"detail": "Chunk index out of range."}, status=status.HTTP_400_BAD_REQUEST)
+        length = session.chunk_length(index)
+        if int(request.META.get('CONTENT_LENGTH') or 0) != length:
+            return Response(
+                {"detail": f"Chunk {index} must be {length} bytes."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with metrics.transfer('upload') as transfer:
+            written = session.write_chunk(index, request.stream)
+            if written == length:
+                transfer.size = written
+        if written != length:
             return Response(
-                {"detail": "File field cannot be null."},
+                {"detail": f"Chunk {index} is incomplete: {written} of {length} bytes received."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        logger.debug(f"{self.__class__.__name__} File uploaded: {file.name} by user={user} request={self.request}")
-        return super().create(request, *args, **kwargs)
+        return Response({'index': index, 'size': written}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/commit')
+    def upload_commit(self, request, upload_id=None):
+        # эндпоинт /storagefiles/uploads/<upload_id>/commit/ - сборка файла
+        session = self.get_upload_session(upload_id)
+        missing = session.missing_chunks()
+        if missing:
+            return Response(
+                {"detail": "Upload is incomplete.", "missing_chunks": missing},
+                status=status.HTTP_409_CONFLICT
+            )
+        instance = session.commit()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def archive_response(self, files, filename):
+        compression = self.request.query_params.get('compression', 'store')
+        if compression not in COMPRESSION:
+            return Response(
+                {"detail": "compression must be one of: " + ", ".join(COMPRESSION)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        files = files.order_by('id').iterator()
+        content = zip_stream(files, COMPRESSION[compression], on_file=lambda f: download_recorder.record(f.pk))
+        response = StreamingHttpResponse(content, content_type='application/zip')
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        response['Access-Control-Expose-Headers'] = 'Content-Disposition'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def archive(self, request):
+        # эндпоинт /storagefiles/archive/?ids=1,2,3&compression=deflate - без ids архивируются все файлы
+        files = self.get_queryset()
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                files = files.filter(pk__in=[int(pk) for pk in ids.split(',')])
+            except ValueError:
+                return Response({"detail": "ids must be a comma separated list of integers"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return self.archive_response(files, f'{request.user.username}.zip')
+
+    @action(detail=False, methods=['get'], url_path='by_user/archive')
+    def by_user_archive(self, request):
+        # эндпоинт /storagefiles/by_user/archive/?user_id=1 - выгрузка всех файлов пользователя
+        if not request.user.is_staff and not request.user.is_superuser:
+            return redirect('/')
+        user_id = request.query_params.get('user_id', '')
+        if not user_id.isdigit():
+            return Response({"detail": "user_id parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+        user = get_object_or_404(UserStorage, pk=user_id)
+        return self.archive_response(StorageFiles.objects.filter(owner=user), f'{user.username}.zip')
+
+    @action(detail=True, methods=['get'])
+    def blocks(self, request, pk=None):
+        # эндпоинт /storagefiles/<id>/blocks/?block_size=<байт> - подписи блоков для обновления по блокам
+        file = self.get_object()
+        serializer = BlockSizeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        block_size = serializer.validated_data['block_size']
+        etag = file_etag(file)
+        signatures = file_signatures(file, etag, block_size)
+        response = Response({
+            'size': file.size,
+            'block_size': block_size,
+            'blocks': [{'weak': weak, 'strong': strong} for weak, strong in signatures],
+        })
+        # ETag передаётся в If-Match при отправке изменений
+        response['ETag'] = etag
+        return response
+
+    @action(detail=True, methods=['post'])
+    def delta(self, request, pk=None):
+        # эндпоинт /storagefiles/<id>/delta/ - новая версия файла из блоков хранимой и присланных данных
+        file = self.get_object()
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if not if_match:
+            return Response(
+                {"detail": "If-Match header with the ETag of the blocks is required."},
+                status=status.HTTP_428_PRECONDITION_REQUIRED
+            )
+        etag = file_etag(file)
+        if etag not in parse_etags(if_match):
+            return Response({"detail": "The file has changed."}, status=status.HTTP_412_PRECONDITION_FAILED)
+        serializer = DeltaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        with metrics.transfer('upload') as transfer:
+            content = assemble(file, data['block_size'], data['instructions'], data.get('data'), data['checksum'])
+            transfer.size = data['data'].size if data.get('data') else 0
+        try:
+            with transaction.atomic():
+                # пока собиралась новая версия, файл могли изменить
+                file = StorageFiles.objects.select_for_update().get(pk=file.pk)
+                if file_etag(file) != etag:
+                    return Response({"detail": "The file has changed."}, status=status.HTTP_412_PRECONDITION_FAILED)
+                file.file = content
+                file.save()
+        finally:
+            content.close()
+        return Response(self.get_serializer(file).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def versions(self, request, pk=None):
+        # эндпоинт /storagefiles/<id>/versions/ - прежние версии файла, новые первыми
+        file = self.get_object()
+        versions = file.versions.order_by('-replaced_date', '-id')
+        return Response(FileVersionSerializer(versions, many=True).data)
+
+    def get_version(self, version_id):
+        file = self.get_object()
+        return get_object_or_404(FileVersion.objects.select_related('file'), pk=version_id, file=file)
+
+    @action(detail=True, methods=['get'], url_path=r'versions/(?P<version_id>[0-9]+)/download')
+    def download_version(self, request, pk=None, version_id=None):
+        # эндпоинт /storagefiles/<id>/versions/<version_id>/download/
+        file_instance = self.get_version(version_id).as_file()
+        not_modified = conditional_response(request, file_instance)
+        if not_modified is not None:
+            return not_modified
+        try:
+            return file_response(request, file_instance)
+        except FileNotFoundError:
+            raise Http404("File not found")
+
+    @action(detail=True, methods=['post'], url_path=r'versions/(?P<version_id>[0-9]+)/restore')
+    def restore_version(self, request, pk=None, version_id=None):
+        # эндпоинт /storagefiles/<id>/versions/<version_id>/restore/ - текущее содержимое становится версией
+        version = self.get_version(version_id)
+        with transaction.atomic():
+            file = StorageFiles.objects.select_for_update().get(pk=version.file_id)
+            version = get_object_or_404(FileVersion.objects.select_for_update(), pk=version.pk)
+            file.restore_version(version)
+        return Response(self.get_serializer(file).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        # эндпоинт /storagefiles/search/?q=...&type=image&size_min=... - поиск среди своих файлов
+        serializer = SearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        queryset = search_files(StorageFiles.objects.filter(owner=request.user), serializer.validated_data)
+        paginator = LimitOffsetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        # эндпоинт /storagefiles/changes/?since=<seq>&wait=<секунды> - изменения файлов после номера since
+        serializer = ChangesSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        page = wait_for_changes(
+            request.user.pk,
+            data.get('since'),
+            data.get('limit', settings.CHANGES_PAGE_SIZE),
+            # ожидание занимает рабочий процесс WSGI
+            min(data['wait'], settings.CHANGES_SYNC_MAX_WAIT),
+            self.get_serializer_context(),
+        )
+        return Response(page)
+
+    @action(detail=False, methods=['get'])
+    def usage(self, request):
+        # эндпоинт /storagefiles/usage/ - занятое место и квота текущего пользователя
+        user = UserStorage.objects.values('used_bytes', 'files_count', 'quota_bytes').get(pk=request.user.pk)
+        user['quota_bytes'] = UserStorage.effective_quota(user['quota_bytes'])
+        return Response(user)
 
     @action(detail=False, methods=['get'])
     def by_user(self, request, pk=None):
@@ -118,6 +475,54 @@ class StorageFilesViewSet(ModelViewSet):
         else:
             return Response({"detail": "user_id parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
 
+    def get_bulk_queryset(self, serializer_class):
+        serializer = serializer_class(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data['ids'])
+        return self.get_queryset().filter(pk__in=ids), ids, serializer.validated_data
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def bulk_delete(self, request):
+        # эндпоинт /storagefiles/bulk_delete/ {"ids": [...]}
+        queryset, ids, data = self.get_bulk_queryset(BulkFilesSerializer)
+        deleted = queryset.delete_files()
+        return Response({'deleted': deleted, 'not_found': sorted(ids - set(deleted))}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def bulk_move(self, request):
+        # эндпоинт /storagefiles/bulk_move/ {"ids": [...], "folder": <id папки> | null}
+        queryset, ids, data = self.get_bulk_queryset(BulkMoveSerializer)
+        folder = None
+        if data['folder'] is not None:
+            folder = get_object_or_404(Folder, pk=data['folder'], owner=request.user)
+            queryset = queryset.filter(owner=request.user)
+        with transaction.atomic():
+            found = list(queryset.values_list('pk', flat=True))
+            queryset.filter(pk__in=found).move_to_folder(folder)
+        return Response({'moved': found, 'not_found': sorted(ids - set(found))}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def bulk_comment(self, request):
+        # эндпоинт /storagefiles/bulk_comment/ {"ids": [...], "comment": "..."}
+        queryset, ids, data = self.get_bulk_queryset(BulkCommentSerializer)
+        with transaction.atomic():
+            updated = list(queryset.values_list('pk', flat=True))
+            queryset.filter(pk__in=updated).update_comment(data['comment'])
+        return Response({'updated': updated, 'not_found': sorted(ids - set(updated))}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def bulk_short_link(self, request):
+        # эндпоинт /storagefiles/bulk_short_link/ {"ids": [...], "action": "generate" | "revoke"}
+        queryset, ids, data = self.get_bulk_queryset(BulkShortLinkSerializer)
+        if data['action'] == 'generate':
+            links = queryset.generate_short_links()
+        else:
+            links = {pk: None for pk in queryset.delete_short_links()}
+        return Response(
+            {'short_links': links, 'not_found': sorted(ids - set(links))},
+            status=status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['post'])
     def generate_short_link(self, request, pk=None):
         # эндпоинт /storagefiles/<id>/generate_short_link/
@@ -125,6 +530,29 @@ class StorageFilesViewSet(ModelViewSet):
         file.generate_short_link()
         return Response({'short_link': file.short_link}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser])
+    def generate_signed_link(self, request, pk=None):
+        # эндпоинт /storagefiles/<id>/generate_signed_link/ {"expires_in": <секунды>}
+        file = self.get_object()
+        serializer = SignedLinkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, expires = sign_download(file, serializer.validated_data['expires_in'])
+        return Response({'url': signed_url(request, token), 'expires': expires}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def bulk_signed_link(self, request):
+        # эндпоинт /storagefiles/bulk_signed_link/ {"ids": [...], "expires_in": <секунды>}
+        queryset, ids, data = self.get_bulk_queryset(BulkSignedLinkSerializer)
+        links = {}
+        expires = None
+        for file in queryset.only('id', 'file', 'checksum', 'original_name', 'size', 'last_update_date'):
+            token, expires = sign_download(file, data['expires_in'])
+            links[file.pk] = signed_url(request, token)
+        return Response(
+            {'urls': links, 'expires': expires, 'not_found': sorted(ids - set(links))},
+            status=status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['post'])
     def delete_short_link(self, request, pk=None):
         # эндпоинт /storagefiles/<id>/delete_short_link/
@@ -141,7 +569,7 @@ class StorageFilesViewSet(ModelViewSet):
     @handle_file_download
     def download_by_short_link(self, request, short_link=None):
         """This function downloads a file by short_link"""
-        return StorageFiles.objects.get(short_link=short_link)
+        return short_link_resolver.resolve(short_link)
 
     @action(detail=True, methods=['get'], url_path='download')
     @handle_file_download
@@ -149,17 +577,44 @@ class StorageFilesViewSet(ModelViewSet):
         """This function downloads a file by ID"""
         return get_object_or_404(StorageFiles, pk=pk)
 
+    @action(detail=True, methods=['get'])
+    def preview(self, request, pk=None):
+        # эндпоинт /storagefiles/<pk>/preview/ - миниатюра изображения вместо исходного файла
+        file_instance = get_object_or_404(
+            StorageFiles.objects.only('owner_id', 'original_name', 'file', 'last_update_date'), pk=pk
+        )
+        if not self.has_permission_to_download(request.user, file_instance):
+            return Response(
+                {"detail": "You do not have permission to download this file."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        if not file_instance.file or not preview_supported(file_instance.original_name):
+            raise Http404("Preview is not available for this file")
+
+        etag = quote_etag(preview_key(file_instance.pk, file_instance.last_update_date))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        try:
+            data = get_preview(file_instance.pk, file_instance.last_update_date, file_instance.file)
+        except (PreviewUnavailable, FileNotFoundError):
+            raise Http404("Preview is not available for this file")
+        response = HttpResponse(data, content_type=PREVIEW_CONTENT_TYPE)
+        response['ETag'] = etag
+        # браузер перепроверяет превью по ETag: после замены файла адрес превью тот же
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def perform_destroy(self, instance):
-        file_path = instance.file.path
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        instance.delete()
+        # файл (или ссылка на общее содержимое) освобождается после фиксации транзакции
+        with transaction.atomic():
+            instance.release_file()
+            instance.delete()
 
     def has_permission_to_download(self, user, file_instance):
-        # Проверка прав доступа: разрешить только администратору или владельцу файла
-        return user.is_superuser or user.is_staff or user == file_instance.owner
+        return can_download(user, file_instance)
@@ -1,9 +1,11 @@
 import os
 
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from model_bakery import baker
 from django.contrib.auth.hashers import make_password
+from rest_framework import status
 from rest_framework.test import APIClient
 from storage.models import UserStorage
 
@@ -25,6 +27,25 @@ def client():
     return client
 
 
+@pytest.fixture
+def media_root(settings, tmp_path):
+    # файлы теста пишутся во временный каталог
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def upload():
+    """Загрузка файла через API: upload(client, name, content, **поля формы) возвращает данные ответа"""
+    def upload_file(client, name, content, **fields):
+        data = {'file': SimpleUploadedFile(name, content, content_type='text/plain'), **fields}
+        response = client.post(reverse('storagefiles-list'), data, format='multipart')
+        assert response.status_code == status.HTTP_201_CREATED, response.data
+        return response.data
+
+    return upload_file
+
+
 @pytest.fixture
 def users_factory():
     def factory(count_users=5, *args, **kwargs):
@@ -65,3 +86,15 @@ def cleanup(request):
 
     request.addfinalizer(cleanup_files)
     return add_file
+
+
+@pytest.fixture(autouse=True)
+def download_stats_sync(settings):
+    # в тестах статистика скачиваний записывается сразу, без фонового таймера
+    settings.DOWNLOAD_STATS_FLUSH_INTERVAL = 0
+
+
+@pytest.fixture(autouse=True)
+def inline_jobs(settings):
+    # в тестах фоновые задачи выполняются сразу после фиксации транзакции
+    settings.JOB_QUEUE = 'inline'
@@ -0,0 +1,55 @@
+import io
+import zipfile
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from storage.models import StorageFiles
+
+
+@pytest.fixture
+def files_on_disk(users, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    contents = [('a.txt', b'first file'), ('b.txt', b'second file' * 100), ('a.txt', b'same name')]
+    return [
+        StorageFiles.objects.create(owner=users[0], file=SimpleUploadedFile(name, content))
+        for name, content in contents
+    ]
+
+
+def read_archive(response):
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+    assert archive.testzip() is None
+    return {name: archive.read(name) for name in archive.namelist()}
+
+
+@pytest.mark.django_db
+def test_archive_selected_files(client, users, files_on_disk):
+    """Архив выбранных файлов со сжатием"""
+    client = client.login(users[0])
+    ids = f'{files_on_disk[0].id},{files_on_disk[2].id}'
+    response = client.get(reverse('storagefiles-archive'), {'ids': ids, 'compression': 'deflate'})
+    assert read_archive(response) == {'a.txt': b'first file', 'a (1).txt': b'same name'}
+
+
+@pytest.mark.django_db
+def test_archive_whole_storage(client, users, admin_user, files_on_disk):
+    """Архив всех файлов пользователя: самим пользователем и администратором через by_user"""
+    expected = {'a.txt': b'first file', 'b.txt': b'second file' * 100, 'a (1).txt': b'same name'}
+    response = client.login(users[0]).get(reverse('storagefiles-archive'))
+    assert read_archive(response) == expected
+
+    # другой пользователь получает пустой архив
+    response = client.login(users[1]).get(reverse('storagefiles-archive'))
+    assert read_archive(response) == {}
+
+    client = client.login(admin_user)
+    response = client.get(reverse('storagefiles-by-user-archive'), {'user_id': users[0].id})
+    assert read_archive(response) == expected
+
+    response = client.get(reverse('storagefiles-archive'), {'compression': 'rar'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
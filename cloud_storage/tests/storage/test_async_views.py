@@ -0,0 +1,83 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory
+from rest_framework.authtoken.models import Token
+
+from storage import async_views
+from storage.models import StorageFiles, UploadSession
+from storage.signing import sign_download
+
+
+async def consume(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+@pytest.fixture
+def token(users):
+    return Token.objects.create(user=users[0])
+
+
+@pytest.fixture
+def uploaded_file(users, cleanup):
+    instance = StorageFiles.objects.create(
+        owner=users[0],
+        file=SimpleUploadedFile("video.bin", b"abcdefghij" * 3, content_type="application/octet-stream"),
+    )
+    cleanup(instance.file.path)
+    return instance
+
+
+@pytest.mark.django_db
+def test_async_download(token, uploaded_file):
+    """Асинхронное скачивание файла целиком и по диапазону"""
+    factory = AsyncRequestFactory()
+    auth = {'headers': {'Authorization': f'Token {token.key}'}}
+
+    request = factory.get('/storagefiles/1/download/', **auth)
+    response = async_to_sync(async_views.download_by_id)(request, pk=uploaded_file.id)
+    assert response.status_code == 200
+    assert response.is_async
+    assert async_to_sync(consume)(response) == b"abcdefghij" * 3
+
+    request = factory.get('/storagefiles/1/download/', headers={**auth['headers'], 'Range': 'bytes=10-12'})
+    response = async_to_sync(async_views.download_by_id)(request, pk=uploaded_file.id)
+    assert response.status_code == 206
+    assert async_to_sync(consume)(response) == b"abc"
+
+    request = factory.get('/storagefiles/1/download/')
+    response = async_to_sync(async_views.download_by_id)(request, pk=uploaded_file.id)
+    assert response.status_code == 401
+
+
+@pytest.mark.django_db
+def test_async_upload_chunk(users, token, cleanup):
+    """Асинхронный приём части файла"""
+    session = UploadSession.objects.create(owner=users[0], original_name='a.bin', size=6, chunk_size=4)
+    session.start()
+    cleanup(session.temp_path)
+    factory = AsyncRequestFactory()
+    auth = {'headers': {'Authorization': f'Token {token.key}'}}
+
+    request = factory.put('/', b'ef', content_type='application/octet-stream', **auth)
+    response = async_to_sync(async_views.upload_chunk)(request, upload_id=session.id, index=1)
+    assert response.status_code == 200
+    assert session.missing_chunks() == [0]
+
+    request = factory.put('/', b'abc', content_type='application/octet-stream', **auth)
+    response = async_to_sync(async_views.upload_chunk)(request, upload_id=session.id, index=0)
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_async_signed_download(uploaded_file):
+    """Асинхронное скачивание по подписанной ссылке"""
+    token, expires = sign_download(uploaded_file, 60)
+    request = AsyncRequestFactory().get(f'/storagefiles/signed/{token}/')
+    response = async_to_sync(async_views.download_signed)(request, token=token)
+    assert response.status_code == 200
+    assert async_to_sync(consume)(response) == b"abcdefghij" * 3
+
+    request = AsyncRequestFactory().get('/storagefiles/signed/bad/')
+    response = async_to_sync(async_views.download_signed)(request, token='bad')
+    assert response.status_code == 403
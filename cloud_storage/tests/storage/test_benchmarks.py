@@ -0,0 +1,36 @@
+import pytest
+from django.db import connection
+
+from storage.benchmarks import Benchmark, compare, parse_size
+
+
+def test_parse_size():
+    assert parse_size('4096') == 4096
+    assert parse_size('64k') == 64 * 1024
+    assert parse_size('16M') == 16 * 1024 * 1024
+
+
+@pytest.mark.django_db
+def test_benchmark_results():
+    """Короткий прогон всех замеров на маленьких данных"""
+    results = Benchmark(repeat=2, upload_sizes=[1024], list_counts=[30], page_size=10).run()
+    assert results['meta']['database'] == connection.vendor
+    assert results['upload']['1024']['count'] == 2
+    assert results['upload']['1024']['mb_per_sec'] > 0
+    assert set(results['download']) == {'python', 'nginx'}
+    assert set(results['list']['30']) == {'0', '15', '20'}
+    assert results['list']['30']['20']['cursor']['median_ms'] > 0
+    assert results['list']['30']['20']['fast']['median_ms'] > 0
+    assert set(results['short_link']) == {'cold', 'warm'}
+    assert results['auth']['token']['queries'] == 1
+    assert results['auth']['cached_token']['queries'] == 0
+
+
+def test_compare():
+    baseline = {'upload': {'1024': {'median_ms': 10.0, 'mb_per_sec': 100.0, 'count': 5}}}
+    current = {'upload': {'1024': {'median_ms': 12.0, 'mb_per_sec': 105.0, 'count': 5}}}
+    rows = {path: (change, regression) for path, old, new, change, regression in compare(baseline, current)}
+    assert rows == {
+        'upload.1024.median_ms': (-0.2, True),
+        'upload.1024.mb_per_sec': (0.05, False),
+    }
@@ -0,0 +1,62 @@
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+
+from storage.models import StorageFiles
+
+
+@pytest.fixture
+def user_files(users):
+    return baker.make(StorageFiles, owner=users[0], size=100, _quantity=3)
+
+
+@pytest.mark.django_db
+def test_bulk_delete(client, users, user_files, django_assert_max_num_queries):
+    """Групповое удаление только своих файлов"""
+    other_file = baker.make(StorageFiles, owner=users[1], size=100)
+    client = client.login(users[0])
+    ids = [f.id for f in user_files[:2]] + [other_file.id]
+
+    # два запроса - запись в журнал изменений, ещё два - выбор и удаление версий файлов
+    with django_assert_max_num_queries(10):
+        response = client.post(reverse('storagefiles-bulk-delete'), {'ids': ids}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert sorted(response.data['deleted']) == sorted(ids[:2])
+    assert response.data['not_found'] == [other_file.id]
+    assert list(StorageFiles.objects.filter(owner=users[0])) == [user_files[2]]
+    assert StorageFiles.objects.filter(pk=other_file.id).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_comment(client, users, user_files):
+    """Групповое изменение комментария"""
+    client = client.login(users[0])
+    ids = [f.id for f in user_files]
+    response = client.post(reverse('storagefiles-bulk-comment'), {'ids': ids, 'comment': 'archived'}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert sorted(response.data['updated']) == sorted(ids)
+    assert set(StorageFiles.objects.filter(pk__in=ids).values_list('comment', flat=True)) == {'archived'}
+
+    response = client.post(reverse('storagefiles-bulk-comment'), {'ids': [], 'comment': 'x'}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_bulk_short_link(client, users, user_files):
+    """Групповой выпуск и отзыв коротких ссылок"""
+    client = client.login(users[0])
+    ids = [f.id for f in user_files]
+    url = reverse('storagefiles-bulk-short-link')
+
+    response = client.post(url, {'ids': ids, 'action': 'generate'}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    links = response.data['short_links']
+    assert len(set(links.values())) == 3
+    for f in user_files:
+        f.refresh_from_db()
+        assert f.short_link == links[f.id]
+
+    response = client.post(url, {'ids': ids, 'action': 'revoke'}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert not StorageFiles.objects.filter(pk__in=ids, short_link__isnull=False).exists()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from storage import async_views
+from storage.models import FileChange, StorageFiles
+from storage.notifier import ChangeNotifier
+
+
+def get_changes(client, **params):
+    response = client.get(reverse('storagefiles-changes'), params)
+    assert response.status_code == status.HTTP_200_OK, response.data
+    return response.data
+
+
+@pytest.mark.django_db
+def test_change_journal(client, users, media_root, upload):
+    client = client.login(users[0])
+    cursor = get_changes(client)['cursor']
+    assert cursor == 0
+
+    first = upload(client, 'a.txt', b'a')
+    second = upload(client, 'b.txt', b'b')
+    url = reverse('storagefiles-detail', kwargs={'pk': first['id']})
+    assert client.patch(url, {'comment': 'new'}, format='multipart').status_code == status.HTTP_200_OK
+    client.post(reverse('storagefiles-generate-short-link', kwargs={'pk': first['id']}))
+    assert client.delete(reverse('storagefiles-detail', kwargs={'pk': second['id']})).status_code == 204
+
+    page = get_changes(client, since=cursor)
+    assert [(change['seq'], change['file_id'], change['action']) for change in page['changes']] == [
+        (1, first['id'], 'create'),
+        (2, second['id'], 'create'),
+        (3, first['id'], 'update'),
+        (4, first['id'], 'link'),
+        (5, second['id'], 'delete'),
+    ]
+    assert page['cursor'] == 5
+    assert not page['has_more']
+    # у существующего файла - текущее состояние, у удалённого - null
+    assert page['changes'][0]['file']['comment'] == 'new'
+    assert page['changes'][1]['file'] is None
+
+    page = get_changes(client, since=2, limit=2)
+    assert [change['seq'] for change in page['changes']] == [3, 4]
+    assert page['cursor'] == 4
+    assert page['has_more']
+
+    # журнал у каждого пользователя свой
+    other = client.login(users[1])
+    assert get_changes(other, since=0)['changes'] == []
+
+
+@pytest.mark.django_db
+def test_bulk_operations_journal(client, users, media_root, upload):
+    client = client.login(users[0])
+    ids = [upload(client, f'{index}.txt', b'x')['id'] for index in range(3)]
+    cursor = get_changes(client)['cursor']
+
+    client.post(reverse('storagefiles-bulk-comment'), {'ids': ids, 'comment': 'c'}, format='json')
+    client.post(reverse('storagefiles-bulk-short-link'), {'ids': ids[:2], 'action': 'generate'}, format='json')
+    client.post(reverse('storagefiles-bulk-delete'), {'ids': ids[2:]}, format='json')
+
+    actions = [(change['file_id'], change['action']) for change in get_changes(client, since=cursor)['changes']]
+    assert sorted(actions[:3]) == [(pk, 'update') for pk in ids]
+    assert sorted(actions[3:5]) == [(pk, 'link') for pk in ids[:2]]
+    assert actions[5:] == [(ids[2], 'delete')]
+    seqs = list(FileChange.objects.filter(owner=users[0]).order_by('seq').values_list('seq', flat=True))
+    assert seqs == list(range(1, len(seqs) + 1))
+
+
+@pytest.mark.django_db
+def test_long_poll_timeout(client, users, settings):
+    settings.CHANGES_POLL_INTERVAL = 0.1
+    client = client.login(users[0])
+    # по умолчанию синхронное представление не ждёт, чтобы не занимать рабочий процесс
+    start = time.monotonic()
+    assert get_changes(client, since=0, wait=5) == {'changes': [], 'cursor': 0, 'has_more': False}
+    assert time.monotonic() - start < 1
+
+    settings.CHANGES_SYNC_MAX_WAIT = 1
+    start = time.monotonic()
+    page = get_changes(client, since=0, wait=5)
+    assert time.monotonic() - start >= 1
+    assert page == {'changes': [], 'cursor': 0, 'has_more': False}
+
+    response = client.get(reverse('storagefiles-changes'), {'since': 0, 'wait': settings.CHANGES_MAX_WAIT + 1})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_async_changes(users):
+    token = Token.objects.create(user=users[0])
+    StorageFiles.objects.create(owner=users[0], original_name='a.txt', file='a.txt', size=1)
+    request = AsyncRequestFactory().get(
+        '/storagefiles/changes/', {'since': 0, 'wait': 5}, headers={'Authorization': f'Token {token.key}'},
+    )
+    response = async_to_sync(async_views.changes)(request)
+    assert response.status_code == 200
+    changes = json.loads(response.content)['changes']
+    assert [(change['seq'], change['action'], change['file']['original_name']) for change in changes] == [
+        (1, 'create', 'a.txt'),
+    ]
+
+
+def test_notifier_wakes_waiters():
+    notifier = ChangeNotifier()
+    timer = threading.Timer(0.1, notifier.notify, args=(1, 5))
+    timer.start()
+    assert notifier.wait(1, 4, timeout=5)
+    assert not notifier.wait(1, 5, timeout=0.01)
+    assert not notifier.wait(2, 0, timeout=0.01)
+
+    async def wait_async():
+        waiter = asyncio.ensure_future(notifier.async_wait(1, 5, timeout=5))
+        await asyncio.sleep(0.05)
+        threading.Thread(target=notifier.notify, args=(1, 6)).start()
+        return await waiter
+
+    assert asyncio.run(wait_async())
+    assert notifier.waiters == {}
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from storage.models import StorageFiles, UploadSession
+
+
+def init_upload(client, data):
+    return client.post(reverse('storagefiles-upload-init'), data, format='json')
+
+
+def put_chunk(client, upload_id, index, content):
+    url = reverse('storagefiles-upload-chunk', kwargs={'upload_id': upload_id, 'index': index})
+    return client.put(url, content, content_type='application/octet-stream')
+
+
+@pytest.mark.django_db
+def test_chunked_upload(client, users, cleanup):
+    """Загрузка файла по частям в произвольном порядке с последующей сборкой"""
+    user = users[0]
+    client = client.login(user)
+    content = b'0123456789abcdefghij-tail'
+
+    response = init_upload(client, {'original_name': 'big.bin', 'comment': 'chunked', 'size': len(content), 'chunk_size': 10})
+    assert response.status_code == status.HTTP_201_CREATED
+    upload_id = response.data['id']
+    assert response.data['chunks_count'] == 3
+    assert response.data['missing_chunks'] == [0, 1, 2]
+
+    assert put_chunk(client, upload_id, 2, content[20:]).status_code == status.HTTP_200_OK
+    assert put_chunk(client, upload_id, 0, content[:10]).status_code == status.HTTP_200_OK
+
+    # сборка незавершённой загрузки невозможна
+    commit_url = reverse('storagefiles-upload-commit', kwargs={'upload_id': upload_id})
+    response = client.post(commit_url)
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.data['missing_chunks'] == [1]
+
+    response = client.get(reverse('storagefiles-upload-status', kwargs={'upload_id': upload_id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['received_ranges'] == [[0, 10], [20, len(content)]]
+
+    assert put_chunk(client, upload_id, 1, content[10:20]).status_code == status.HTTP_200_OK
+
+    response = client.post(commit_url)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data['original_name'] == 'big.bin'
+    assert response.data['size'] == len(content)
+    assert response.data['comment'] == 'chunked'
+
+    new_file = StorageFiles.objects.get(pk=response.data['id'])
+    cleanup(new_file.file.path)
+    with new_file.file.open('rb') as f:
+        assert f.read() == content
+    assert not UploadSession.objects.filter(pk=upload_id).exists()
+
+
+@pytest.mark.django_db
+def test_chunked_upload_rejects_bad_chunks(client, users):
+    """Проверка размера и номера части, доступ к чужой сессии"""
+    user = users[0]
+    client = client.login(user)
+    response = init_upload(client, {'original_name': 'file.bin', 'size': 15, 'chunk_size': 10})
+    upload_id = response.data['id']
+
+    assert put_chunk(client, upload_id, 1, b'123').status_code == status.HTTP_400_BAD_REQUEST
+    assert put_chunk(client, upload_id, 2, b'12345').status_code == status.HTTP_400_BAD_REQUEST
+
+    client.login(users[1])
+    assert put_chunk(client, upload_id, 0, b'0' * 10).status_code == status.HTTP_404_NOT_FOUND
+
+    client.login(user)
+    session = UploadSession.objects.get(pk=upload_id)
+    temp_path = session.temp_path
+    response = client.delete(reverse('storagefiles-upload-status', kwargs={'upload_id': upload_id}))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert not os.path.exists(temp_path)
+
+
+@pytest.mark.django_db
+def test_chunked_upload_name_without_path(client, users, settings, tmp_path):
+    """Каталоги в имени файла отбрасываются при создании загрузки, имя без файла отклоняется"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    client = client.login(users[0])
+    response = init_upload(client, {'original_name': '../docs/report.txt', 'size': 3})
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data['original_name'] == 'report.txt'
+    upload_id = response.data['id']
+    assert put_chunk(client, upload_id, 0, b'abc').status_code == status.HTTP_200_OK
+    response = client.post(reverse('storagefiles-upload-commit', kwargs={'upload_id': upload_id}))
+    assert response.status_code == status.HTTP_201_CREATED
+    path = StorageFiles.objects.get(pk=response.data['id']).file.path
+    assert os.path.dirname(path) == os.path.join(str(tmp_path), users[0].username)
+
+    assert init_upload(client, {'original_name': 'C:\\docs\\', 'size': 3}).status_code == status.HTTP_400_BAD_REQUEST
+    assert init_upload(client, {'original_name': 'docs/..', 'size': 3}).status_code == status.HTTP_400_BAD_REQUEST
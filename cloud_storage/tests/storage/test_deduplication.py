@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from storage.models import Blob, StorageFiles
+
+
+@pytest.fixture
+def dedup_settings(settings, tmp_path):
+    settings.STORAGE_DEDUPLICATION = True
+    settings.MEDIA_ROOT = str(tmp_path)
+    return settings
+
+
+@pytest.mark.django_db
+def test_same_content_stored_once(client, users, dedup_settings, django_capture_on_commit_callbacks, upload):
+    """Одинаковое содержимое разных пользователей хранится одним blob со счётчиком ссылок"""
+    first = StorageFiles.objects.get(pk=upload(client.login(users[0]), 'installer.bin', b'same content')['id'])
+    second = StorageFiles.objects.get(pk=upload(client.login(users[1]), 'copy.bin', b'same content')['id'])
+
+    assert first.blob_id == second.blob_id
+    assert first.file.name == second.file.name
+    blob = Blob.objects.get(pk=first.blob_id)
+    assert blob.ref_count == 2
+    assert second.original_name == 'copy.bin'
+    blob_path = first.file.path
+    assert os.path.exists(blob_path)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.delete(reverse('storagefiles-detail', kwargs={'pk': second.id}))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    blob.refresh_from_db()
+    assert blob.ref_count == 1
+    assert os.path.exists(blob_path)
+
+    client.login(users[0])
+    with django_capture_on_commit_callbacks(execute=True):
+        client.delete(reverse('storagefiles-detail', kwargs={'pk': first.id}))
+    assert not Blob.objects.filter(pk=blob.pk).exists()
+    assert not os.path.exists(blob_path)
+
+
+@pytest.mark.django_db
+def test_download_uses_original_name(client, users, dedup_settings, upload):
+    """Скачивание файла из blob отдаёт исходное имя файла"""
+    client = client.login(users[0])
+    instance = StorageFiles.objects.get(pk=upload(client, 'report.txt', b'report')['id'])
+    response = client.get(reverse('storagefiles-download-by-id', kwargs={'pk': instance.id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert 'filename="report.txt"' in response['Content-Disposition']
+    assert b''.join(response.streaming_content) == b'report'
+
+
+@pytest.mark.django_db
+def test_chunked_upload_reuses_blob(client, users, dedup_settings, upload):
+    """Сборка загрузки по частям ссылается на уже существующее содержимое"""
+    client = client.login(users[0])
+    existing = StorageFiles.objects.get(pk=upload(client, 'data.bin', b'0123456789')['id'])
+
+    response = client.post(reverse('storagefiles-upload-init'), {'original_name': 'again.bin', 'size': 10}, format='json')
+    upload_id = response.data['id']
+    url = reverse('storagefiles-upload-chunk', kwargs={'upload_id': upload_id, 'index': 0})
+    client.put(url, b'0123456789', content_type='application/octet-stream')
+    response = client.post(reverse('storagefiles-upload-commit', kwargs={'upload_id': upload_id}))
+    assert response.status_code == status.HTTP_201_CREATED
+
+    instance = StorageFiles.objects.get(pk=response.data['id'])
+    assert instance.blob_id == existing.blob_id
+    assert Blob.objects.get(pk=existing.blob_id).ref_count == 2
@@ -0,0 +1,184 @@
+import hashlib
+import io
+import json
+import os
+import zlib
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from storage.delta import block_signatures
+from storage.models import FileChange, StorageFiles, UserStorage
+
+BLOCK_SIZE = 4096
+ADLER_MOD = 65521
+
+
+def make_delta(signatures, block_size, content):
+    """
+    Инструкции и данные для перехода к content (bytes) от версии с подписями signatures.
+    Реализация клиентской части для тестов: блоки ищутся по скользящей сумме Adler-32 в каждой позиции.
+    """
+    blocks = {}
+    for index, (weak, strong) in enumerate(signatures):
+        blocks.setdefault(weak, []).append((strong, index))
+
+    instructions = []
+    literal = bytearray()
+
+    def add_copy(index):
+        last = instructions[-1] if instructions else None
+        if last and 'copy' in last and last['copy'] + last.get('count', 1) == index:
+            last['count'] = last.get('count', 1) + 1
+        else:
+            instructions.append({'copy': index})
+
+    def flush_literal():
+        if literal:
+            instructions.append({'data': len(literal)})
+            data.extend(literal)
+            literal.clear()
+
+    data = bytearray()
+    position = 0
+    weak = None
+    while position < len(content):
+        window = content[position:position + block_size]
+        if weak is None:
+            weak = zlib.adler32(window)
+        match = None
+        for strong, index in blocks.get(weak, ()):
+            # последний блок хранимой версии может быть короче block_size
+            if strong == hashlib.sha256(window).hexdigest():
+                match = index
+                break
+        if match is not None:
+            flush_literal()
+            add_copy(match)
+            position += len(window)
+            weak = None
+            continue
+        literal.append(content[position])
+        # сдвиг окна на байт: пересчёт суммы за O(1)
+        if position + block_size < len(content):
+            a, b = weak & 0xffff, weak >> 16
+            removed, added = content[position], content[position + block_size]
+            a = (a - removed + added) % ADLER_MOD
+            b = (b - block_size * removed + a - 1) % ADLER_MOD
+            weak = (b << 16) | a
+        else:
+            weak = None
+        position += 1
+    flush_literal()
+    return instructions, bytes(data)
+
+
+@pytest.fixture
+def stored(client, users, media_root):
+    client = client.login(users[0])
+    content = os.urandom(BLOCK_SIZE * 5 + 100)
+    data = {'file': SimpleUploadedFile('disk.img', content)}
+    response = client.post(reverse('storagefiles-list'), data, format='multipart')
+    assert response.status_code == status.HTTP_201_CREATED
+    return client, StorageFiles.objects.get(pk=response.data['id']), content
+
+
+def get_blocks(client, file_instance):
+    url = reverse('storagefiles-blocks', kwargs={'pk': file_instance.pk})
+    response = client.get(url, {'block_size': BLOCK_SIZE})
+    assert response.status_code == status.HTTP_200_OK
+    return response
+
+
+def send_delta(client, file_instance, etag, instructions, data, checksum):
+    payload = {
+        'block_size': BLOCK_SIZE,
+        'instructions': json.dumps(instructions),
+        'checksum': checksum,
+    }
+    if data:
+        payload['data'] = SimpleUploadedFile('delta.bin', data)
+    url = reverse('storagefiles-delta', kwargs={'pk': file_instance.pk})
+    headers = {'HTTP_IF_MATCH': etag} if etag else {}
+    return client.post(url, payload, format='multipart', **headers)
+
+
+def test_make_delta_finds_shifted_blocks():
+    old = os.urandom(BLOCK_SIZE * 4 + 10)
+    # вставка в начало сдвигает все блоки, изменение в середине затрагивает один блок
+    new = b'inserted' + old[:BLOCK_SIZE * 2] + b'X' * 20 + old[BLOCK_SIZE * 2 + 20:]
+    signatures = block_signatures(io.BytesIO(old), BLOCK_SIZE)
+    assert signatures[0] == (zlib.adler32(old[:BLOCK_SIZE]), hashlib.sha256(old[:BLOCK_SIZE]).hexdigest())
+
+    instructions, data = make_delta(signatures, BLOCK_SIZE, new)
+    assert instructions[:2] == [{'data': 8}, {'copy': 0, 'count': 2}]
+    assert instructions[-1] == {'copy': 3, 'count': 2}
+    assert len(data) == 8 + BLOCK_SIZE
+
+
+@pytest.mark.django_db
+def test_delta_update(stored, users, django_capture_on_commit_callbacks):
+    client, file_instance, content = stored
+    response = get_blocks(client, file_instance)
+    assert response.data['size'] == len(content)
+    assert len(response.data['blocks']) == 6
+    signatures = [(block['weak'], block['strong']) for block in response.data['blocks']]
+    old_path = file_instance.file.path
+
+    new = content[:BLOCK_SIZE * 3] + b'edited' + content[BLOCK_SIZE * 3 + 6:] + b'appended'
+    instructions, data = make_delta(signatures, BLOCK_SIZE, new)
+    assert len(data) < BLOCK_SIZE * 2
+    cursor = FileChange.last_seq(users[0].pk)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = send_delta(
+            client, file_instance, response['ETag'], instructions, data, hashlib.sha256(new).hexdigest(),
+        )
+    assert response.status_code == status.HTTP_200_OK, response.data
+    file_instance.refresh_from_db()
+    with file_instance.file.open('rb') as f:
+        assert f.read() == new
+    assert file_instance.size == len(new)
+    assert file_instance.checksum == hashlib.sha256(new).hexdigest()
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == len(new)
+    assert not os.path.exists(old_path)
+    assert list(FileChange.objects.filter(seq__gt=cursor).values_list('action', flat=True)) == ['update']
+
+
+@pytest.mark.django_db
+def test_delta_preconditions(stored):
+    client, file_instance, content = stored
+    etag = get_blocks(client, file_instance)['ETag']
+    checksum = hashlib.sha256(content).hexdigest()
+    instructions = [{'copy': 0, 'count': 6}]
+
+    assert send_delta(client, file_instance, None, instructions, b'', checksum).status_code == 428
+    assert send_delta(client, file_instance, '"other"', instructions, b'', checksum).status_code == 412
+
+    # блок за пределами файла, лишние данные, неверная сумма результата
+    response = send_delta(client, file_instance, etag, [{'copy': 6}], b'', checksum)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = send_delta(client, file_instance, etag, instructions, b'extra', checksum)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = send_delta(client, file_instance, etag, [{'copy': 0}], b'', checksum)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = send_delta(client, file_instance, etag, [{'move': 1}], b'', checksum)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    with file_instance.file.open('rb') as f:
+        assert f.read() == content
+    assert not [name for name in os.listdir(os.path.dirname(file_instance.file.path) + '/.uploads')
+                if name.startswith('.delta-')]
+
+    # копирование всех блоков - та же версия
+    response = send_delta(client, file_instance, etag, instructions, b'', checksum)
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_delta_other_user(stored, users, client):
+    _, file_instance, content = stored
+    other = client.login(users[1])
+    url = reverse('storagefiles-blocks', kwargs={'pk': file_instance.pk})
+    assert other.get(url).status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,124 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from storage.models import StorageFiles
+from storage.stats import download_recorder
+
+
+@pytest.fixture
+def uploaded_file(users, cleanup):
+    """Файл пользователя, сохранённый в хранилище"""
+    content = SimpleUploadedFile("report.txt", b"0123456789" * 10, content_type="text/plain")
+    instance = StorageFiles.objects.create(owner=users[0], file=content)
+    cleanup(instance.file.path)
+    return instance
+
+
+@pytest.mark.django_db
+def test_download_python_backend(client, users, uploaded_file):
+    """По умолчанию файл отдаётся воркером Django"""
+    client = client.login(users[0])
+    response = client.get(reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content) == b"0123456789" * 10
+    assert 'attachment' in response['Content-Disposition']
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.last_download_date is not None
+
+
+@pytest.mark.django_db
+def test_download_nginx_backend(client, users, uploaded_file, settings):
+    """При DOWNLOAD_BACKEND=nginx ответ содержит только X-Accel-Redirect"""
+    settings.DOWNLOAD_BACKEND = 'nginx'
+    client = client.login(users[0])
+    response = client.get(reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert response['X-Accel-Redirect'] == '/protected/' + uploaded_file.file.name
+    assert response['Content-Type'] == 'text/plain'
+    assert response.content == b''
+
+
+@pytest.mark.django_db
+def test_download_sendfile_backend(client, users, uploaded_file, settings):
+    """При DOWNLOAD_BACKEND=sendfile ответ содержит абсолютный путь в X-Sendfile"""
+    settings.DOWNLOAD_BACKEND = 'sendfile'
+    client = client.login(users[0])
+    response = client.get(reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert response['X-Sendfile'] == uploaded_file.file.path
+
+
+@pytest.mark.django_db
+def test_download_single_range(client, users, uploaded_file):
+    """Запрос одного диапазона возвращает 206 и Content-Range"""
+    client = client.login(users[0])
+    url = reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id})
+    response = client.get(url, HTTP_RANGE='bytes=5-14')
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response['Content-Range'] == 'bytes 5-14/100'
+    assert b''.join(response.streaming_content) == b"5678901234"
+
+    response = client.get(url, HTTP_RANGE='bytes=-3')
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b''.join(response.streaming_content) == b"789"
+
+    response = client.get(url, HTTP_RANGE='bytes=500-')
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response['Content-Range'] == 'bytes */100'
+
+
+@pytest.mark.django_db
+def test_download_multi_range(client, users, uploaded_file):
+    """Несколько диапазонов отдаются как multipart/byteranges"""
+    client = client.login(users[0])
+    url = reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id})
+    response = client.get(url, HTTP_RANGE='bytes=0-1,98-')
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response['Content-Type'].startswith('multipart/byteranges; boundary=')
+    body = b''.join(response.streaming_content)
+    assert len(body) == int(response['Content-Length'])
+    assert b'Content-Range: bytes 0-1/100\r\n\r\n01' in body
+    assert b'Content-Range: bytes 98-99/100\r\n\r\n89' in body
+
+
+@pytest.mark.django_db
+def test_download_conditional(client, users, uploaded_file):
+    """If-None-Match и If-Range по сохранённой контрольной сумме"""
+    client = client.login(users[0])
+    url = reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id})
+    response = client.get(url)
+    etag = response['ETag']
+    assert etag == f'"{uploaded_file.checksum}"'
+    assert response['Accept-Ranges'] == 'bytes'
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = client.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+
+    response = client.get(url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_download_stats_are_buffered(client, users, uploaded_file, settings):
+    """Скачивания накапливаются в памяти и записываются одним пакетом"""
+    settings.DOWNLOAD_STATS_FLUSH_INTERVAL = 3600
+    last_update_date = uploaded_file.last_update_date
+    client = client.login(users[0])
+    url = reverse('storagefiles-download-by-id', kwargs={'pk': uploaded_file.id})
+    for _ in range(3):
+        assert client.get(url).status_code == status.HTTP_200_OK
+
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.download_count == 0
+    assert download_recorder.pending()[uploaded_file.id][1] == 3
+
+    assert download_recorder.flush() == 1
+    uploaded_file.refresh_from_db()
+    assert uploaded_file.download_count == 3
+    assert uploaded_file.last_download_date is not None
+    assert uploaded_file.last_update_date == last_update_date
@@ -0,0 +1,196 @@
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+
+from storage.models import Folder, StorageFiles, UserStorage
+
+
+def make_folder(client, name, parent=None):
+    response = client.post(reverse('folders-list'), {'name': name, 'parent': parent}, format='json')
+    assert response.status_code == status.HTTP_201_CREATED, response.data
+    return response.data
+
+
+def totals(folder_id):
+    return Folder.objects.values_list('size', 'files_count').get(pk=folder_id)
+
+
+@pytest.mark.django_db
+def test_folder_tree_totals(client, users, media_root, upload):
+    """Размер и число файлов папки учитывают всё поддерево"""
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    reports = make_folder(client, 'reports', docs['id'])
+    assert reports['path'] == f"/{docs['id']}/{reports['id']}/"
+
+    upload(client, 'a.txt', b'x' * 10, folder=docs['id'])
+    second = upload(client, 'b.txt', b'y' * 5, folder=reports['id'])
+    upload(client, 'c.txt', b'z' * 3)
+    assert totals(docs['id']) == (15, 2)
+    assert totals(reports['id']) == (5, 1)
+
+    # замена содержимого и удаление файла
+    url = reverse('storagefiles-detail', kwargs={'pk': second['id']})
+    data = {'file': SimpleUploadedFile('b.txt', b'y' * 8, content_type='text/plain')}
+    assert client.patch(url, data, format='multipart').status_code == status.HTTP_200_OK
+    assert totals(docs['id']) == (18, 2)
+    assert client.delete(url).status_code == status.HTTP_204_NO_CONTENT
+    assert totals(docs['id']) == (10, 1)
+    assert totals(reports['id']) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_list_folder_children(client, users, media_root, upload):
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    make_folder(client, 'b', docs['id'])
+    make_folder(client, 'a', docs['id'])
+    make_folder(client, 'other')
+    in_folder = upload(client, 'a.txt', b'x', folder=docs['id'])
+    in_root = upload(client, 'b.txt', b'y')
+
+    response = client.get(reverse('folders-list'), {'parent': docs['id']})
+    assert [folder['name'] for folder in response.data['results']] == ['a', 'b']
+    response = client.get(reverse('folders-list'))
+    assert [folder['name'] for folder in response.data['results']] == ['docs', 'other']
+
+    response = client.get(reverse('storagefiles-list'), {'folder': docs['id']})
+    assert [item['id'] for item in response.data['results']] == [in_folder['id']]
+    response = client.get(reverse('storagefiles-list'), {'folder': 'root'})
+    assert [item['id'] for item in response.data['results']] == [in_root['id']]
+    assert client.get(reverse('storagefiles-list'), {'folder': 'x'}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_move_folder(client, users, media_root, upload):
+    """Перенос папки меняет пути вложенных папок и итоги, но не файлы"""
+    client = client.login(users[0])
+    src = make_folder(client, 'src')
+    child = make_folder(client, 'child', src['id'])
+    grandchild = make_folder(client, 'grandchild', child['id'])
+    dst = make_folder(client, 'dst')
+    uploaded = upload(client, 'a.txt', b'x' * 7, folder=grandchild['id'])
+    name_on_disk = StorageFiles.objects.get(pk=uploaded['id']).file.name
+
+    url = reverse('folders-detail', kwargs={'pk': child['id']})
+    response = client.patch(url, {'parent': dst['id'], 'name': 'moved'}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['path'] == f"/{dst['id']}/{child['id']}/"
+    assert response.data['name'] == 'moved'
+    assert Folder.objects.get(pk=grandchild['id']).path == f"/{dst['id']}/{child['id']}/{grandchild['id']}/"
+    assert totals(src['id']) == (0, 0)
+    assert totals(dst['id']) == (7, 1)
+    assert totals(child['id']) == (7, 1)
+    assert StorageFiles.objects.get(pk=uploaded['id']).file.name == name_on_disk
+
+    # в собственную вложенную папку переносить нельзя
+    response = client.patch(url, {'parent': grandchild['id']}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # в корень
+    assert client.patch(url, {'parent': None}, format='json').status_code == status.HTTP_200_OK
+    assert totals(dst['id']) == (0, 0)
+    assert Folder.objects.get(pk=grandchild['id']).path == f"/{child['id']}/{grandchild['id']}/"
+
+
+@pytest.mark.django_db
+def test_folder_names_and_owners(client, users):
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    response = client.post(reverse('folders-list'), {'name': 'docs'}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    make_folder(client, 'docs', docs['id'])
+
+    foreign = baker.make(Folder, owner=users[1], path='/')
+    response = client.post(reverse('folders-list'), {'name': 'x', 'parent': foreign.pk}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    url = reverse('folders-detail', kwargs={'pk': foreign.pk})
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_folder_depth_limit(client, users, settings):
+    settings.FOLDER_MAX_DEPTH = 2
+    client = client.login(users[0])
+    first = make_folder(client, 'a')
+    second = make_folder(client, 'b', first['id'])
+    response = client.post(reverse('folders-list'), {'name': 'c', 'parent': second['id']}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    other = make_folder(client, 'other')
+    url = reverse('folders-detail', kwargs={'pk': first['id']})
+    response = client.patch(url, {'parent': other['id']}, format='json')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_move_files(client, users, media_root, upload):
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    archive = make_folder(client, 'archive')
+    first = upload(client, 'a.txt', b'x' * 4, folder=docs['id'])
+    second = upload(client, 'b.txt', b'y' * 6)
+
+    url = reverse('storagefiles-detail', kwargs={'pk': first['id']})
+    assert client.patch(url, {'folder': archive['id']}, format='multipart').status_code == status.HTTP_200_OK
+    assert totals(docs['id']) == (0, 0)
+    assert totals(archive['id']) == (4, 1)
+
+    response = client.post(
+        reverse('storagefiles-bulk-move'), {'ids': [first['id'], second['id'], 999999], 'folder': docs['id']},
+        format='json',
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert sorted(response.data['moved']) == [first['id'], second['id']]
+    assert response.data['not_found'] == [999999]
+    assert totals(docs['id']) == (10, 2)
+    assert totals(archive['id']) == (0, 0)
+
+    foreign = baker.make(Folder, owner=users[1], path='/')
+    response = client.post(reverse('storagefiles-bulk-move'), {'ids': [first['id']], 'folder': foreign.pk}, format='json')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_delete_folder_tree(client, users, media_root, django_capture_on_commit_callbacks, upload):
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    reports = make_folder(client, 'reports', docs['id'])
+    upload(client, 'a.txt', b'x' * 4, folder=reports['id'])
+    kept = upload(client, 'b.txt', b'y' * 6)
+    path = StorageFiles.objects.get(owner=users[0], folder=reports['id']).file.path
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.delete(reverse('folders-detail', kwargs={'pk': docs['id']}))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert not Folder.objects.filter(owner=users[0]).exists()
+    assert list(StorageFiles.objects.filter(owner=users[0]).values_list('pk', flat=True)) == [kept['id']]
+    assert UserStorage.objects.values_list('used_bytes', 'files_count').get(pk=users[0].pk) == (6, 1)
+    assert not os.path.exists(path)
+
+
+@pytest.mark.django_db
+def test_reconcile_folder_totals(client, users, media_root, upload):
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    reports = make_folder(client, 'reports', docs['id'])
+    upload(client, 'a.txt', b'x' * 4, folder=reports['id'])
+    Folder.objects.update(size=0, files_count=5)
+
+    call_command('reconcile_storage_usage')
+    assert totals(docs['id']) == (4, 1)
+    assert totals(reports['id']) == (4, 1)
+
+
+@pytest.mark.django_db
+def test_delete_user_with_folders(client, users, media_root, upload):
+    client = client.login(users[0])
+    docs = make_folder(client, 'docs')
+    upload(client, 'a.txt', b'x', folder=docs['id'])
+    UserStorage.objects.get(pk=users[0].pk).delete()
+    assert not Folder.objects.exists()
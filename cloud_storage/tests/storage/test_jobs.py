@@ -0,0 +1,151 @@
+import hashlib
+import os
+from datetime import timedelta
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from storage.jobs import claim_job, enqueue, run_job, task
+from storage.models import Job, StorageFiles
+
+calls = []
+
+
+@task('test_record')
+def record(value):
+    calls.append(value)
+
+
+@task('test_fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+@pytest.fixture
+def database_queue(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.JOB_QUEUE = 'database'
+    settings.JOB_MAX_ATTEMPTS = 2
+    calls.clear()
+
+
+@pytest.mark.django_db
+def test_delete_deferred_to_worker(client, users, database_queue, tmp_path):
+    """Удаление файла с диска выполняет обработчик очереди, а не запрос"""
+    client = client.login(users[0])
+    data = {'file': SimpleUploadedFile('a.txt', b'content')}
+    file_id = client.post(reverse('storagefiles-list'), data, format='multipart').data['id']
+    stored = StorageFiles.objects.get(pk=file_id).file
+    path = stored.path
+    Job.objects.all().delete()
+
+    response = client.delete(reverse('storagefiles-detail', kwargs={'pk': file_id}))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert list(Job.objects.values_list('name', 'payload')) == [('delete_files', {'names': [stored.name]})]
+    assert os.path.exists(path)
+
+    call_command('run_jobs', '--once')
+    assert not Job.objects.exists()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.django_db
+def test_job_rolled_back_with_transaction(database_queue):
+    """Задача не попадает в очередь, если транзакция отменена"""
+    with pytest.raises(RuntimeError):
+        with transaction.atomic():
+            enqueue('test_record', value=1)
+            raise RuntimeError
+    assert not Job.objects.exists()
+
+
+@pytest.mark.django_db
+def test_job_retries(database_queue):
+    """Упавшая задача повторяется с задержкой, после JOB_MAX_ATTEMPTS попыток помечается как failed"""
+    enqueue('test_fail')
+    job = claim_job()
+    assert not run_job(job)
+    job.refresh_from_db()
+    assert job.status == Job.PENDING
+    assert job.attempts == 1
+    assert 'boom' in job.last_error
+    # повтор отложен
+    assert job.run_after > timezone.now()
+    assert claim_job() is None
+
+    Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+    assert not run_job(claim_job())
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert claim_job() is None
+
+
+@pytest.mark.django_db
+def test_job_visibility_timeout(database_queue):
+    """Захваченная задача недоступна другим обработчикам, пока не истечёт JOB_VISIBILITY_TIMEOUT"""
+    enqueue('test_record', value='x')
+    job = claim_job()
+    assert job.locked_until > timezone.now()
+    assert claim_job() is None
+
+    # обработчик «упал», не завершив задачу
+    Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+    job = claim_job()
+    assert job.attempts == 2
+    assert run_job(job)
+    assert calls == ['x']
+    assert not Job.objects.exists()
+
+
+@pytest.mark.django_db
+def test_job_visibility_timeout_on_last_attempt(database_queue):
+    """Задача, обработчик которой упал на последней попытке, не захватывается снова, а помечается failed"""
+    enqueue('test_record', value='x')
+    job = claim_job()
+    Job.objects.filter(pk=job.pk).update(attempts=job.max_attempts, locked_until=timezone.now() - timedelta(seconds=1))
+    assert claim_job() is None
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert job.locked_until is None
+    assert calls == []
+
+
+@pytest.mark.django_db
+def test_scan_hook_rejects_file(client, users, settings, tmp_path, django_capture_on_commit_callbacks):
+    """Файл, отклонённый FILE_SCAN_HOOK, удаляется"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.FILE_SCAN_HOOK = 'tests.storage.test_jobs.reject_infected'
+    client = client.login(users[0])
+    for name, content in [('clean.txt', b'clean'), ('virus.txt', b'EICAR')]:
+        data = {'file': SimpleUploadedFile(name, content)}
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(reverse('storagefiles-list'), data, format='multipart')
+        assert response.status_code == status.HTTP_201_CREATED
+    assert list(StorageFiles.objects.values_list('original_name', flat=True)) == ['clean.txt']
+
+
+def reject_infected(path):
+    with open(path, 'rb') as f:
+        return b'EICAR' not in f.read()
+
+
+@pytest.mark.django_db
+def test_chunked_upload_checksum_deferred(client, users, database_queue):
+    """Контрольная сумма собранного по частям файла считается обработчиком очереди"""
+    client = client.login(users[0])
+    content = b'0123456789'
+    upload_id = client.post(reverse('storagefiles-upload-init'), {'original_name': 'big.bin', 'size': 10}, format='json').data['id']
+    url = reverse('storagefiles-upload-chunk', kwargs={'upload_id': upload_id, 'index': 0})
+    client.put(url, content, content_type='application/octet-stream')
+    response = client.post(reverse('storagefiles-upload-commit', kwargs={'upload_id': upload_id}))
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data['checksum'] == ''
+    assert Job.objects.filter(name='compute_checksum').exists()
+
+    call_command('run_jobs', '--once')
+    assert StorageFiles.objects.get(pk=response.data['id']).checksum == hashlib.sha256(content).hexdigest()
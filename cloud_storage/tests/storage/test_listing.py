@@ -0,0 +1,80 @@
+import json
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.utils.urls import remove_query_param
+
+from storage.models import Folder, StorageFiles
+
+
+@pytest.fixture
+def files(users):
+    user = users[0]
+    folder = baker.make(Folder, owner=user, name='docs')
+    now = timezone.now()
+    created = [
+        baker.make(
+            StorageFiles, owner=user, original_name=f'{index}.txt', file=f'files/{index}.txt', size=index % 3,
+            comment='' if index % 2 else f'comment {index}', short_link=f'link{index}' if index % 4 == 0 else None,
+            last_download_date=now - timedelta(hours=index) if index % 2 else None,
+            folder=folder if index < 3 else None,
+        )
+        for index in range(7)
+    ]
+    baker.make(StorageFiles, owner=users[1])
+    return user, folder, created
+
+
+def get_list(client, params):
+    response = client.get(reverse('storagefiles-list'), params)
+    assert response.status_code == status.HTTP_200_OK
+    return response
+
+
+def without_param(data, param):
+    """Ответ с ссылками на страницы без параметра режима вывода (ссылки его сохраняют)"""
+    for link in ('next', 'previous'):
+        if data.get(link):
+            assert f'{param}=' in data[link]
+            data[link] = remove_query_param(data[link], param)
+    return data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [
+    {'limit': 4},
+    {'limit': 3, 'offset': 2, 'ordering': '-size'},
+    {'pagination': 'cursor', 'ordering': 'original_name', 'limit': 3},
+    {'pagination': 'cursor', 'ordering': '-upload_date', 'limit': 10},
+])
+def test_fast_listing_matches_serializer(client, files, params):
+    user, folder, created = files
+    client = client.login(user)
+    expected = json.loads(get_list(client, params).content)
+    response = get_list(client, {**params, 'serializer': 'fast'})
+    assert without_param(json.loads(response.content), 'serializer') == expected
+
+    # следующая страница тоже выводится быстрым путём
+    if expected['next']:
+        assert without_param(json.loads(client.get(response.data['next']).content), 'serializer') == json.loads(
+            client.get(expected['next']).content
+        )
+
+
+@pytest.mark.django_db
+def test_stream_listing(client, files):
+    user, folder, created = files
+    client = client.login(user)
+    for params in ({'limit': 5, 'folder': folder.pk}, {'pagination': 'cursor', 'ordering': 'size', 'limit': 4}):
+        expected = json.loads(get_list(client, params).content)
+        response = get_list(client, {**params, 'stream': 'true'})
+        assert response.streaming
+        assert response['Content-Type'] == 'application/json'
+        assert without_param(json.loads(b''.join(response.streaming_content)), 'stream') == expected
+
+    response = get_list(client, {'stream': 'true', 'folder': 'root', 'offset': 100})
+    assert json.loads(b''.join(response.streaming_content))['results'] == []
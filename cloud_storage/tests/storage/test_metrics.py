@@ -0,0 +1,77 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from storage import metrics
+
+
+@pytest.fixture
+def metrics_enabled(settings, tmp_path):
+    settings.METRICS_ENABLED = True
+    settings.MEDIA_ROOT = str(tmp_path)
+    metrics.registry.clear()
+    yield
+    metrics.registry.clear()
+
+
+def scrape(client):
+    response = client.get(reverse('metrics'))
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'].startswith('text/plain')
+    return response.content.decode().splitlines()
+
+
+@pytest.mark.django_db
+def test_metrics_disabled(client):
+    assert client.get(reverse('metrics')).status_code == status.HTTP_404_NOT_FOUND
+    assert metrics.transfer('upload') is metrics.null_transfer
+
+
+@pytest.mark.django_db
+def test_transfer_metrics(client, users, metrics_enabled):
+    client = client.login(users[0])
+    content = b"0123456789" * 10
+    data = {'file': SimpleUploadedFile('report.txt', content, content_type='text/plain')}
+    response = client.post(reverse('storagefiles-list'), data, format='multipart')
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.get(reverse('storagefiles-download-by-id', kwargs={'pk': response.data['id']}))
+    # тестовый клиент закрывает потоковый ответ после чтения содержимого
+    assert b''.join(response.streaming_content) == content
+
+    lines = scrape(client)
+    assert 'storage_transfers_in_progress{direction="download"} 0' in lines
+    assert 'storage_transfer_bytes_total{direction="upload"} 100' in lines
+    assert 'storage_transfer_bytes_total{direction="download"} 100' in lines
+    assert 'storage_transfer_duration_seconds_count{direction="download"} 1' in lines
+    assert 'storage_transfer_bytes_per_second_count{direction="upload"} 1' in lines
+    assert 'storage_downloads_total{backend="python"} 1' in lines
+    assert 'storage_http_requests_total{view="storagefiles-list",method="POST",status="201"} 1' in lines
+    assert 'storage_http_request_duration_seconds_count{view="storagefiles-download-by-id",method="GET"} 1' in lines
+    assert any(line.startswith('storage_http_request_db_queries_sum{view="storagefiles-list"}') for line in lines)
+
+
+@pytest.mark.django_db
+def test_metrics_token(client, metrics_enabled, settings):
+    settings.METRICS_TOKEN = 'secret'
+    assert client.get(reverse('metrics')).status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram('test_seconds', 'Test.', ['kind'], buckets=(1, 5))
+    metrics.registry.metrics.remove(histogram)
+    histogram.observe(0.5, 'a')
+    histogram.observe(3, 'a')
+    histogram.observe(10, 'a')
+    assert histogram.render() == [
+        '# HELP test_seconds Test.',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{kind="a",le="1"} 1',
+        'test_seconds_bucket{kind="a",le="5"} 2',
+        'test_seconds_bucket{kind="a",le="+Inf"} 3',
+        'test_seconds_sum{kind="a"} 13.5',
+        'test_seconds_count{kind="a"} 3',
+    ]
@@ -0,0 +1,144 @@
+import hashlib
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+import pytest
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from moto import mock_aws
+from rest_framework import status
+
+from storage.models import Blob, StorageFiles
+
+BUCKET = 'cloud-storage-test'
+
+
+@pytest.fixture
+def s3(settings, tmp_path):
+    """Default storage в S3-совместимом хранилище (локальная имитация moto)"""
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        settings.MEDIA_ROOT = str(tmp_path)
+        settings.S3_BUCKET = BUCKET
+        settings.S3_REGION = 'us-east-1'
+        settings.S3_ACCESS_KEY = settings.S3_SECRET_KEY = 'test'
+        settings.STORAGES = {
+            'default': {'BACKEND': 'storage.s3.ObjectStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+        settings.DOWNLOAD_BACKEND = 'redirect'
+        yield client
+
+
+def keys(client):
+    return sorted(item['Key'] for item in client.list_objects_v2(Bucket=BUCKET).get('Contents', []))
+
+
+def read_object(client, key):
+    return client.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+
+
+def chunked_upload(client, name, content, chunk_size):
+    response = client.post(
+        reverse('storagefiles-upload-init'),
+        {'original_name': name, 'size': len(content), 'chunk_size': chunk_size},
+        format='json',
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    upload_id = response.data['id']
+    # части в обратном порядке: S3 собирает их по номерам
+    for index in reversed(range(response.data['chunks_count'])):
+        url = reverse('storagefiles-upload-chunk', kwargs={'upload_id': upload_id, 'index': index})
+        chunk = content[index * chunk_size:(index + 1) * chunk_size]
+        assert client.put(url, chunk, content_type='application/octet-stream').status_code == status.HTTP_200_OK
+    return client.post(reverse('storagefiles-upload-commit', kwargs={'upload_id': upload_id}))
+
+
+@pytest.mark.django_db
+def test_upload_download_delete(client, users, s3, tmp_path, django_capture_on_commit_callbacks, upload):
+    """Файл хранится в бакете, скачивание - перенаправлением на подписанную ссылку"""
+    user = users[0]
+    client = client.login(user)
+    file_id = upload(client, 'report.txt', b'report')['id']
+    name = StorageFiles.objects.get(pk=file_id).file.name
+    assert name.startswith(f'{user.username}/report_') and name.endswith('.txt')
+    assert keys(s3) == [name]
+    assert read_object(s3, name) == b'report'
+    # на диске приложения ничего не остаётся
+    assert not [path for path in (tmp_path / user.username).rglob('*') if path.is_file()]
+
+    response = client.get(reverse('storagefiles-download-by-id', kwargs={'pk': file_id}))
+    assert response.status_code == status.HTTP_302_FOUND
+    url = urlparse(response['Location'])
+    assert url.path.endswith(f'/{name}')
+    query = parse_qs(url.query)
+    assert query['response-content-disposition'] == ['attachment; filename="report.txt"']
+    assert 'Signature' in query
+    assert response['ETag'] == f'"{hashlib.sha256(b"report").hexdigest()}"'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.delete(reverse('storagefiles-detail', kwargs={'pk': file_id}))
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert keys(s3) == []
+
+
+@pytest.mark.django_db
+def test_python_backend_reads_object(client, users, s3, settings, upload):
+    """DOWNLOAD_BACKEND=python проксирует файл из бакета, в том числе по диапазонам"""
+    settings.DOWNLOAD_BACKEND = 'python'
+    client = client.login(users[0])
+    file_id = upload(client, 'digits.txt', b'0123456789')['id']
+    url = reverse('storagefiles-download-by-id', kwargs={'pk': file_id})
+
+    response = client.get(url)
+    assert b''.join(response.streaming_content) == b'0123456789'
+    response = client.get(url, HTTP_RANGE='bytes=2-4')
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert b''.join(response.streaming_content) == b'234'
+
+
+@pytest.mark.django_db
+def test_chunked_upload_uses_multipart(client, users, s3, tmp_path, django_capture_on_commit_callbacks):
+    """Части загружаются сразу в бакет и собираются на стороне хранилища"""
+    user = users[0]
+    client = client.login(user)
+    chunk_size = 5 * 1024 * 1024
+    content = b'a' * chunk_size + b'tail'
+
+    response = client.post(
+        reverse('storagefiles-upload-init'),
+        {'original_name': 'big.bin', 'size': len(content), 'chunk_size': 1024},
+        format='json',
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = chunked_upload(client, 'big.bin', content, chunk_size)
+    assert response.status_code == status.HTTP_201_CREATED
+    instance = StorageFiles.objects.get(pk=response.data['id'])
+    assert instance.file.name.startswith(f'{user.username}/big_')
+    assert keys(s3) == [instance.file.name]
+    assert read_object(s3, instance.file.name) == content
+    assert instance.checksum == hashlib.sha256(content).hexdigest()
+    assert not any((tmp_path / user.username).rglob('*.part'))
+
+
+@pytest.mark.django_db
+def test_deduplication_in_object_storage(client, users, s3, settings, django_capture_on_commit_callbacks, upload):
+    """Одинаковое содержимое хранится в бакете одним объектом"""
+    settings.STORAGE_DEDUPLICATION = True
+    client = client.login(users[0])
+    checksum = hashlib.sha256(b'same').hexdigest()
+    upload(client, 'a.txt', b'same')
+    response = chunked_upload(client, 'b.txt', b'same', 4)
+    assert response.status_code == status.HTTP_201_CREATED
+
+    blob = Blob.objects.get()
+    assert blob.ref_count == 2
+    assert keys(s3) == [f'.blobs/{checksum[:2]}/{checksum[2:4]}/{checksum}']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        StorageFiles.objects.all().delete_files()
+    assert keys(s3) == []
+    assert default_storage.exists(blob.name) is False
@@ -0,0 +1,71 @@
+import json
+from base64 import urlsafe_b64encode
+
+import pytest
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+
+from storage.models import StorageFiles
+
+
+def walk_pages(client, url, params):
+    """Обходит все страницы по ссылкам next, возвращает id файлов"""
+    ids = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        ids.extend(item['id'] for item in response.data['results'])
+        if response.data['next'] is None:
+            return ids
+        response = client.get(response.data['next'])
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_by_size(client, users):
+    """Keyset-пагинация по размеру с повторяющимися значениями не теряет и не повторяет записи"""
+    user = users[0]
+    sizes = [30, 10, 20, 10, 30, 10, 40]
+    files = [baker.make(StorageFiles, owner=user, size=size) for size in sizes]
+    baker.make(StorageFiles, owner=users[1], size=5)
+    client = client.login(user)
+
+    ids = walk_pages(client, reverse('storagefiles-list'), {'pagination': 'cursor', 'ordering': 'size', 'limit': 2})
+    expected = [f.id for f in sorted(files, key=lambda f: (f.size, f.id))]
+    assert ids == expected
+
+    ids = walk_pages(client, reverse('storagefiles-list'), {'pagination': 'cursor', 'ordering': '-size', 'limit': 3})
+    assert ids == expected[::-1]
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_by_upload_date(client, users, admin_user):
+    """Keyset-пагинация по дате загрузки в by_user"""
+    user = users[0]
+    files = baker.make(StorageFiles, owner=user, size=100, _quantity=5)
+    client = client.login(admin_user)
+    params = {'user_id': user.id, 'pagination': 'cursor', 'ordering': '-upload_date'}
+    ids = walk_pages(client, reverse('storagefiles-by-user'), params)
+    assert ids == [f.id for f in sorted(files, key=lambda f: (f.upload_date, f.id), reverse=True)]
+
+    response = client.get(reverse('storagefiles-by-user'), {'user_id': user.id, 'cursor': 'broken'})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering, position', [
+    ('size', [[1], 2]),
+    ('size', ['big', 2]),
+    ('original_name', [{'a': 1}, 2]),
+    ('original_name', ['a.txt', [2]]),
+    ('upload_date', [123, 2]),
+])
+def test_cursor_with_wrong_value_type(client, users, ordering, position):
+    """Курсор со значением не того типа отклоняется, а не доходит до запроса"""
+    baker.make(StorageFiles, owner=users[0], _quantity=3)
+    client = client.login(users[0])
+    cursor = urlsafe_b64encode(json.dumps(position).encode()).decode('ascii')
+    params = {'pagination': 'cursor', 'ordering': ordering, 'cursor': cursor}
+    response = client.get(reverse('storagefiles-list'), params)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,104 @@
+import io
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+
+from storage.models import StorageFiles
+from storage.previews import PreviewCache, preview_cache, preview_key
+
+
+@pytest.fixture
+def preview_settings(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.PREVIEW_SIZE = 64
+    yield settings
+    preview_cache.clear()
+
+
+def image_content(size=(400, 300), image_format='PNG'):
+    output = io.BytesIO()
+    Image.new('RGB', size, 'red').save(output, image_format)
+    return output.getvalue()
+
+
+def cached_previews(tmp_path):
+    return sorted(name for root, dirs, files in os.walk(tmp_path / '.previews') for name in files)
+
+
+@pytest.mark.django_db
+def test_preview(client, users, preview_settings, tmp_path, upload):
+    """Превью создаётся при первом запросе и затем отдаётся из кэша"""
+    client = client.login(users[0])
+    file_id = upload(client, 'photo.png', image_content())['id']
+    url = reverse('storagefiles-preview', kwargs={'pk': file_id})
+
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'image/jpeg'
+    with Image.open(io.BytesIO(response.content)) as preview:
+        assert preview.size == (64, 48)
+    etag = response['ETag']
+    assert len(cached_previews(tmp_path)) == 1
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # после замены файла превью создаётся заново, старое удаляется
+    data = {'file': SimpleUploadedFile('photo.png', image_content((100, 200)))}
+    client.patch(reverse('storagefiles-detail', kwargs={'pk': file_id}), data, format='multipart')
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response['ETag'] != etag
+    file_instance = StorageFiles.objects.get(pk=file_id)
+    assert cached_previews(tmp_path) == [preview_key(file_id, file_instance.last_update_date) + '.jpg']
+
+
+@pytest.mark.django_db
+def test_preview_unavailable(client, users, preview_settings, upload):
+    """Превью есть только у изображений и только для владельца"""
+    client = client.login(users[0])
+    text_id = upload(client, 'notes.txt', b'text')['id']
+    broken_id = upload(client, 'broken.jpg', b'not an image')['id']
+    image_id = upload(client, 'photo.jpg', image_content(image_format='JPEG'))['id']
+
+    assert client.get(reverse('storagefiles-preview', kwargs={'pk': text_id})).status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(reverse('storagefiles-preview', kwargs={'pk': broken_id})).status_code == status.HTTP_404_NOT_FOUND
+
+    client = client.login(users[1])
+    response = client.get(reverse('storagefiles-preview', kwargs={'pk': image_id}))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_preview_on_upload(client, users, preview_settings, tmp_path, django_capture_on_commit_callbacks, upload):
+    """При PREVIEW_ON_UPLOAD превью создаётся фоновой задачей сразу после загрузки"""
+    preview_settings.PREVIEW_ON_UPLOAD = True
+    client = client.login(users[0])
+    with django_capture_on_commit_callbacks(execute=True):
+        file_id = upload(client, 'photo.png', image_content())['id']
+
+    file_instance = StorageFiles.objects.get(pk=file_id)
+    assert cached_previews(tmp_path) == [preview_key(file_id, file_instance.last_update_date) + '.jpg']
+
+
+def test_preview_cache_eviction(settings, tmp_path):
+    """При переполнении кэша вытесняются превью, к которым дольше всего не обращались"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.PREVIEW_CACHE_MAX_SIZE = 350
+    cache = PreviewCache()
+    for index in range(3):
+        cache.put(f'{index}-1', b'x' * 100)
+        path = cache.path(f'{index}-1')
+        os.utime(path, (index, index))
+    # обращение к самому старому превью защищает его от вытеснения
+    assert cache.get('0-1') == b'x' * 100
+
+    cache.put('3-1', b'x' * 100)
+    assert cache.get('0-1') is not None
+    assert cache.get('1-1') is None
+    assert cache.get('2-1') is not None
+    assert cache.get('3-1') is not None
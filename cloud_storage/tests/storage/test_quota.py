@@ -0,0 +1,115 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test.client import FakePayload
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from storage.exceptions import QuotaExceeded
+from storage.models import StorageFiles, UserStorage
+
+
+def usage(user):
+    return UserStorage.objects.values_list('used_bytes', 'files_count').get(pk=user.pk)
+
+
+@pytest.mark.django_db
+def test_usage_follows_uploads_and_deletes(client, users, media_root, upload):
+    """Счётчики занятого места меняются при загрузке, замене и удалении файлов"""
+    user = users[0]
+    client = client.login(user)
+    first = upload(client, 'a.txt', b'x' * 10)
+    upload(client, 'b.txt', b'y' * 5)
+    assert usage(user) == (15, 2)
+
+    url = reverse('storagefiles-detail', kwargs={'pk': first['id']})
+    data = {'file': SimpleUploadedFile('a.txt', b'z' * 3, content_type='text/plain')}
+    assert client.patch(url, data, format='multipart').status_code == status.HTTP_200_OK
+    assert usage(user) == (8, 2)
+
+    assert client.delete(url).status_code == status.HTTP_204_NO_CONTENT
+    assert usage(user) == (5, 1)
+
+    response = client.get(reverse('storagefiles-usage'))
+    assert response.data == {'used_bytes': 5, 'files_count': 1, 'quota_bytes': 0}
+
+
+@pytest.mark.django_db
+def test_bulk_delete_updates_usage(client, users):
+    """Групповое удаление уменьшает счётчики всех владельцев"""
+    files = baker.make(StorageFiles, owner=users[0], size=100, _quantity=3)
+    other_file = baker.make(StorageFiles, owner=users[1], size=7)
+    assert usage(users[0]) == (300, 3)
+
+    client = client.login(baker.make(UserStorage, is_staff=True))
+    ids = [files[0].id, other_file.id]
+    assert client.post(reverse('storagefiles-bulk-delete'), {'ids': ids}, format='json').status_code == status.HTTP_200_OK
+    assert usage(users[0]) == (200, 2)
+    assert usage(users[1]) == (0, 0)
+
+
+@pytest.mark.django_db
+def test_upload_over_quota_rejected(client, users, media_root, tmp_path):
+    """Загрузка сверх квоты отклоняется по Content-Length, файл не сохраняется"""
+    user = users[0]
+    user.quota_bytes = 100
+    user.save()
+    client = client.login(user)
+
+    data = {'file': SimpleUploadedFile('big.txt', b'x' * 200, content_type='text/plain')}
+    response = client.post(reverse('storagefiles-list'), data, format='multipart')
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert not StorageFiles.objects.filter(owner=user).exists()
+    assert not (tmp_path / user.username).exists()
+
+    response = client.post(reverse('storagefiles-upload-init'), {'original_name': 'big.bin', 'size': 101}, format='json')
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.mark.django_db
+def test_upload_over_quota_body_not_read(users, media_root, monkeypatch):
+    """Загрузка сверх квоты отклоняется до чтения тела, в том числе при входе по сессии с проверкой CSRF"""
+    user = users[0]
+    user.quota_bytes = 100
+    user.save()
+    client = APIClient(enforce_csrf_checks=True)
+    assert client.login(username=user.username, password='password0')
+    token = client.get(reverse('api-csrf')).cookies['csrftoken'].value
+
+    reads = []
+    read = FakePayload.read
+
+    def tracked_read(self, *args, **kwargs):
+        reads.append(args)
+        return read(self, *args, **kwargs)
+
+    monkeypatch.setattr(FakePayload, 'read', tracked_read)
+    data = {'file': SimpleUploadedFile('big.txt', b'x' * 200, content_type='text/plain'), 'csrfmiddlewaretoken': token}
+    response = client.post(reverse('storagefiles-list'), data, format='multipart')
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert reads == []
+    assert not StorageFiles.objects.filter(owner=user).exists()
+
+
+@pytest.mark.django_db
+def test_quota_checked_on_save(users, settings):
+    """Квота проверяется атомарно при сохранении, даже если ранняя проверка пройдена"""
+    settings.DEFAULT_USER_QUOTA = 150
+    baker.make(StorageFiles, owner=users[0], size=100)
+    with pytest.raises(QuotaExceeded):
+        baker.make(StorageFiles, owner=users[0], size=100)
+    assert usage(users[0]) == (100, 1)
+
+
+@pytest.mark.django_db
+def test_reconcile_storage_usage(users):
+    """Команда пересчёта восстанавливает счётчики по таблице файлов"""
+    baker.make(StorageFiles, owner=users[0], size=10, _quantity=2)
+    UserStorage.objects.filter(pk=users[0].pk).update(used_bytes=999, files_count=0)
+    UserStorage.objects.filter(pk=users[1].pk).update(used_bytes=5, files_count=1)
+
+    call_command('reconcile_storage_usage')
+    assert usage(users[0]) == (20, 2)
+    assert usage(users[1]) == (0, 0)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+
+from storage.models import StorageFiles
+
+
+def make_file(owner, name, comment='', size=100, **kwargs):
+    return baker.make(StorageFiles, owner=owner, original_name=name, comment=comment, size=size, **kwargs)
+
+
+def search(client, **params):
+    response = client.get(reverse('storagefiles-search'), {'limit': 50, **params})
+    assert response.status_code == status.HTTP_200_OK, response.data
+    return [item['original_name'] for item in response.data['results']]
+
+
+@pytest.mark.django_db
+def test_search_by_name_and_comment(client, users):
+    make_file(users[0], 'annual report.pdf', 'Finance report for 2023, final report')
+    make_file(users[0], 'report.txt')
+    make_file(users[0], 'holiday.jpg', 'photo from the report trip', file='photos/holiday.jpg')
+    for index in range(5):
+        make_file(users[0], f'notes-{index}.txt')
+    make_file(users[1], 'report.doc')
+    client = client.login(users[0])
+
+    found = search(client, q='report')
+    assert sorted(found) == ['annual report.pdf', 'holiday.jpg', 'report.txt']
+    # совпадение в имени выше, чем единичное упоминание в длинном комментарии
+    assert found[-1] == 'holiday.jpg'
+
+    # префикс слова и подстрока имени
+    assert search(client, q='holi') == ['holiday.jpg']
+    assert search(client, q='liday') == ['holiday.jpg']
+    assert search(client, q='finance 2023') == ['annual report.pdf']
+    assert search(client, q='missing') == []
+
+    # ссылки на файлы абсолютные, как в списке файлов
+    response = client.get(reverse('storagefiles-search'), {'q': 'holiday'})
+    file_instance = StorageFiles.objects.get(original_name='holiday.jpg')
+    assert response.data['results'][0]['file'] == f'http://testserver{file_instance.file.url}'
+
+
+@pytest.mark.django_db
+def test_search_filters(client, users):
+    now = timezone.now()
+    make_file(users[0], 'small.png', size=10)
+    big = make_file(users[0], 'big.png', size=5000)
+    make_file(users[0], 'movie.mp4', size=1000, last_download_date=now - timedelta(days=10))
+    make_file(users[0], 'paper.pdf', size=20)
+    StorageFiles.objects.filter(pk=big.pk).update(upload_date=now - timedelta(days=30))
+    client = client.login(users[0])
+
+    assert sorted(search(client, type='image')) == ['big.png', 'small.png']
+    assert search(client, type='pdf') == ['paper.pdf']
+    assert sorted(search(client, size_min=100)) == ['big.png', 'movie.mp4']
+    assert search(client, size_min=100, size_max=2000) == ['movie.mp4']
+    assert search(client, uploaded_before=(now - timedelta(days=1)).isoformat()) == ['big.png']
+    assert search(client, downloaded_after=(now - timedelta(days=20)).isoformat()) == ['movie.mp4']
+    assert search(client, q='png', size_max=100) == ['small.png']
+
+    response = client.get(reverse('storagefiles-search'), {'size_min': -1})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_search_index_follows_changes(client, users):
+    file_instance = make_file(users[0], 'draft.txt', 'first version')
+    client = client.login(users[0])
+    assert search(client, q='version') == ['draft.txt']
+
+    file_instance.comment = 'approved'
+    file_instance.save(update_fields=['comment'])
+    assert search(client, q='version') == []
+    assert search(client, q='approved') == ['draft.txt']
+
+    file_instance.delete()
+    assert search(client, q='approved') == []
+
+
+@pytest.mark.django_db
+def test_search_requires_auth(client):
+    assert client.get(reverse('storagefiles-search')).status_code == status.HTTP_401_UNAUTHORIZED
@@ -0,0 +1,104 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from storage.cache import TTLCache, short_link_resolver
+from storage.models import Folder, StorageFiles
+
+
+@pytest.fixture
+def shared_file(users, cleanup):
+    """Файл с короткой ссылкой"""
+    short_link_resolver.local.clear()
+    instance = StorageFiles.objects.create(
+        owner=users[0],
+        file=SimpleUploadedFile("shared.txt", b"shared content", content_type="text/plain"),
+    )
+    instance.generate_short_link()
+    cleanup(instance.file.path)
+    return instance
+
+
+def short_link_url(short_link):
+    return reverse('storagefiles-download-by-short-link', kwargs={'short_link': short_link})
+
+
+@pytest.mark.django_db
+def test_short_link_resolution_is_cached(client, users, shared_file, django_assert_num_queries):
+    """Повторное скачивание по короткой ссылке не обращается к БД за файлом"""
+    client = client.login(users[0])
+    response = client.get(short_link_url(shared_file.short_link))
+    assert response.status_code == status.HTTP_200_OK
+    assert b''.join(response.streaming_content) == b"shared content"
+
+    # остаётся только запись статистики скачивания
+    with django_assert_num_queries(1):
+        response = client.get(short_link_url(shared_file.short_link))
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_short_link_invalidation(client, users, shared_file, django_capture_on_commit_callbacks):
+    """Перевыпуск и удаление ссылки сбрасывают кэш"""
+    client = client.login(users[0])
+    old_link = shared_file.short_link
+    assert client.get(short_link_url(old_link)).status_code == status.HTTP_200_OK
+
+    with django_capture_on_commit_callbacks(execute=True):
+        shared_file.generate_short_link()
+    assert client.get(short_link_url(old_link)).status_code == status.HTTP_404_NOT_FOUND
+    assert client.get(short_link_url(shared_file.short_link)).status_code == status.HTTP_200_OK
+
+    new_link = shared_file.short_link
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(reverse('storagefiles-delete-short-link', kwargs={'pk': shared_file.id}))
+    assert response.status_code == status.HTTP_200_OK
+    assert client.get(short_link_url(new_link)).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_bulk_comment_invalidates_short_link(client, users, shared_file, django_capture_on_commit_callbacks):
+    """Групповое изменение комментария сбрасывает кэш короткой ссылки: дата изменения в ответе не устаревает"""
+    client = client.login(users[0])
+    cached = short_link_resolver.lookup(shared_file.short_link)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            reverse('storagefiles-bulk-comment'), {'ids': [shared_file.id], 'comment': 'new'}, format='json',
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert short_link_resolver.local.get(short_link_resolver.key_prefix + shared_file.short_link) is None
+    updated = short_link_resolver.lookup(shared_file.short_link)
+    assert updated['last_update_date'] > cached['last_update_date']
+
+
+@pytest.mark.django_db
+def test_bulk_move_invalidates_short_link(client, users, shared_file, django_capture_on_commit_callbacks):
+    """Перенос файлов в папку сбрасывает кэш короткой ссылки"""
+    client = client.login(users[0])
+    short_link_resolver.lookup(shared_file.short_link)
+    folder = Folder.objects.create(owner=users[0], name='docs')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            reverse('storagefiles-bulk-move'), {'ids': [shared_file.id], 'folder': folder.pk}, format='json',
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert short_link_resolver.local.get(short_link_resolver.key_prefix + shared_file.short_link) is None
+
+
+def test_ttl_cache_eviction():
+    """LRU вытесняет давно не использованные записи"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+    expired = TTLCache(maxsize=2, ttl=-1)
+    expired.set('a', 1)
+    assert expired.get('a') is None
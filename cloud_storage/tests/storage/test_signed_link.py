@@ -0,0 +1,122 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from storage.models import StorageFiles
+from storage.signing import sign_download
+from storage.stats import download_recorder
+
+
+@pytest.fixture
+def stored_file(users, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return StorageFiles.objects.create(
+        owner=users[0],
+        file=SimpleUploadedFile("video.mp4", b"0123456789", content_type="video/mp4"),
+    )
+
+
+def signed_path(token):
+    return reverse('storagefiles-download-signed', kwargs={'token': token})
+
+
+@pytest.mark.django_db
+def test_signed_link_download_without_db(client, users, stored_file, settings, django_assert_num_queries):
+    """Скачивание по подписанной ссылке не требует авторизации и запросов к БД"""
+    settings.DOWNLOAD_STATS_FLUSH_INTERVAL = 3600
+    client = client.login(users[0])
+    response = client.post(reverse('storagefiles-generate-signed-link', kwargs={'pk': stored_file.pk}), {'expires_in': 60})
+    assert response.status_code == status.HTTP_200_OK
+    url = response.data['url']
+    assert url.startswith('http://testserver/storagefiles/signed/')
+
+    anonymous = APIClient()
+    with django_assert_num_queries(0):
+        response = anonymous.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert b''.join(response.streaming_content) == b"0123456789"
+        assert response['ETag'] == f'"{stored_file.checksum}"'
+        assert 'filename="video.mp4"' in response['Content-Disposition']
+
+        response = anonymous.get(url, HTTP_RANGE='bytes=2-3')
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert b''.join(response.streaming_content) == b"23"
+
+    # статистика скачиваний копится в памяти и записывается пакетно
+    assert download_recorder.pending()[stored_file.pk][1] == 2
+    download_recorder.flush()
+
+
+@pytest.mark.django_db
+def test_signed_link_nginx_backend(stored_file, settings):
+    """С nginx файл отдаётся через X-Accel-Redirect"""
+    settings.DOWNLOAD_BACKEND = 'nginx'
+    token, expires = sign_download(stored_file, 60)
+    response = APIClient().get(signed_path(token))
+    assert response.status_code == status.HTTP_200_OK
+    assert response['X-Accel-Redirect'] == f'/protected/{stored_file.file.name}'
+
+
+@pytest.mark.django_db
+def test_signed_link_rejected(stored_file):
+    """Подделанная или просроченная ссылка отклоняется"""
+    client = APIClient()
+    token, expires = sign_download(stored_file, 60)
+    other_token, expires = sign_download(StorageFiles.objects.create(owner=stored_file.owner, file=SimpleUploadedFile("b.txt", b"b")), 60)
+    forged = other_token.rsplit(':', 1)[0] + ':' + token.rsplit(':', 1)[1]
+    assert client.get(signed_path(forged)).status_code == status.HTTP_403_FORBIDDEN
+
+    token, expires = sign_download(stored_file, -1)
+    assert client.get(signed_path(token)).status_code == status.HTTP_410_GONE
+
+    token, expires = sign_download(stored_file, 60)
+    assert client.post(signed_path(token)).status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+@pytest.mark.django_db
+def test_signed_link_to_replaced_file(stored_file, django_capture_on_commit_callbacks):
+    """Новый файл с тем же именем не получает имя удалённого в хранилище, ссылка на удалённый не отдаёт его"""
+    token, expires = sign_download(stored_file, 60)
+    client = APIClient()
+    assert client.get(signed_path(token)).status_code == status.HTTP_200_OK
+
+    with django_capture_on_commit_callbacks(execute=True):
+        StorageFiles.objects.filter(pk=stored_file.pk).delete_files()
+    replacement = StorageFiles.objects.create(
+        owner=stored_file.owner,
+        file=SimpleUploadedFile("video.mp4", b"other content", content_type="video/mp4"),
+    )
+    assert replacement.file.name != stored_file.file.name
+    assert client.get(signed_path(token)).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_signed_link_permissions(client, users, stored_file, settings):
+    """Ссылки выдаются только на свои файлы и на ограниченный срок"""
+    client = client.login(users[1])
+    url = reverse('storagefiles-generate-signed-link', kwargs={'pk': stored_file.pk})
+    assert client.post(url).status_code == status.HTTP_404_NOT_FOUND
+
+    client = client.login(users[0])
+    response = client.post(url, {'expires_in': settings.SIGNED_URL_MAX_TTL + 1})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_bulk_signed_links(client, users, stored_file):
+    """Ссылки на несколько файлов выдаются одним запросом"""
+    other = StorageFiles.objects.create(owner=users[1], file=SimpleUploadedFile("other.txt", b"other"))
+    client = client.login(users[0])
+    response = client.post(
+        reverse('storagefiles-bulk-signed-link'),
+        {'ids': [stored_file.pk, other.pk]},
+        format='json',
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert list(response.data['urls']) == [stored_file.pk]
+    assert response.data['not_found'] == [other.pk]
+
+    response = APIClient().get(response.data['urls'][stored_file.pk])
+    assert b''.join(response.streaming_content) == b"0123456789"
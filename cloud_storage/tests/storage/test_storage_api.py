@@ -13,7 +13,7 @@ def storage_files(users):
     """Генератор файлов для пользователей"""
     files = []
     for user in users:
-        user_files = baker.make(StorageFiles, owner=user, _quantity=2)
+        user_files = baker.make(StorageFiles, owner=user, size=100, _quantity=2)
         files.extend(user_files)
     return files
 
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from storage.authentication import CachedTokenAuthentication
+from storage.cache import token_cache
+from storage.models import UserStorage
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.local.clear()
+    yield
+    token_cache.local.clear()
+
+
+def token_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    return client
+
+
+@pytest.mark.django_db
+def test_cached_token_without_queries(users, django_assert_num_queries):
+    """Повторная аутентификация тем же токеном не обращается к БД"""
+    token = Token.objects.create(user=users[0])
+    auth = CachedTokenAuthentication()
+    with django_assert_num_queries(1):
+        user, request_token = auth.authenticate_credentials(token.key)
+    assert user.pk == users[0].pk
+    with django_assert_num_queries(0):
+        user, request_token = auth.authenticate_credentials(token.key)
+    assert user.pk == users[0].pk
+    assert request_token.key == token.key
+
+    with pytest.raises(AuthenticationFailed):
+        auth.authenticate_credentials('0' * 40)
+
+
+@pytest.mark.django_db
+def test_deactivated_user_rejected(users):
+    token = Token.objects.create(user=users[0])
+    client = token_client(token)
+    assert client.get(reverse('storagefiles-list')).status_code == status.HTTP_200_OK
+
+    user = UserStorage.objects.get(pk=users[0].pk)
+    user.is_active = False
+    user.save()
+    assert client.get(reverse('storagefiles-list')).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_rotate_token(users):
+    token = Token.objects.create(user=users[0])
+    client = token_client(token)
+    assert client.get(reverse('storagefiles-list')).status_code == status.HTTP_200_OK
+
+    admin = UserStorage.objects.create_superuser('admin', 'admin@admin.com', 'admin123')
+    admin_client = APIClient()
+    admin_client.force_authenticate(admin)
+    response = admin_client.post(reverse('users-rotate-token', kwargs={'pk': users[0].pk}))
+    assert response.status_code == status.HTTP_200_OK
+    new_key = response.data['token']
+    assert new_key != token.key
+    assert Token.objects.get(user=users[0]).key == new_key
+
+    assert client.get(reverse('storagefiles-list')).status_code == status.HTTP_401_UNAUTHORIZED
+    client.credentials(HTTP_AUTHORIZATION='Token ' + new_key)
+    assert client.get(reverse('storagefiles-list')).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_rotate_token_requires_admin(users):
+    client = APIClient()
+    client.force_authenticate(users[1])
+    response = client.post(reverse('users-rotate-token', kwargs={'pk': users[0].pk}))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_token_expiry(users, settings):
+    settings.TOKEN_EXPIRE = 3600
+    token = Token.objects.create(user=users[0])
+    Token.objects.filter(pk=token.pk).update(created=timezone.now() - timedelta(hours=2))
+    client = token_client(token)
+    response = client.get(reverse('storagefiles-list'))
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # при входе просроченный токен заменяется новым
+    response = APIClient().post(
+        reverse('api_token_auth'),
+        {'username': users[0].username, 'password': 'password0'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['token'] != token.key
+    assert response.data['user_id'] == users[0].pk
+    client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+    assert client.get(reverse('storagefiles-list')).status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_login_returns_existing_token(users):
+    token = Token.objects.create(user=users[0])
+    response = APIClient().post(
+        reverse('api_token_auth'),
+        {'username': users[0].username, 'password': 'password0'},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['token'] == token.key
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from storage import models
+from storage.models import StorageFiles
+from storage.uploadhandlers import upload_temp_dir
+
+
+@pytest.mark.django_db
+def test_upload_is_hashed_while_streaming(client, users, settings, tmp_path, monkeypatch):
+    """Файл хешируется при приёме и переносится в хранилище без повторного чтения"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    user = users[0]
+    client = client.login(user)
+    content = b'streamed content' * 1000
+
+    def fail(*args, **kwargs):
+        raise AssertionError('file must not be re-read to compute the checksum')
+
+    monkeypatch.setattr(models, 'file_checksum', fail)
+
+    data = {'file': SimpleUploadedFile('stream.bin', content, content_type='application/octet-stream')}
+    response = client.post(reverse('storagefiles-list'), data, format='multipart')
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data['checksum'] == hashlib.sha256(content).hexdigest()
+    assert response.data['size'] == len(content)
+
+    instance = StorageFiles.objects.get(pk=response.data['id'])
+    with instance.file.open('rb') as f:
+        assert f.read() == content
+    # временный файл перенесён, а не скопирован
+    assert os.listdir(upload_temp_dir(user.username)) == []
+
+
+@pytest.mark.django_db
+def test_upload_with_session_and_csrf(users, settings, tmp_path):
+    """При входе по сессии тело разбирается уже при проверке CSRF - обработчик загрузки должен быть установлен до неё"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    user = users[0]
+    client = APIClient(enforce_csrf_checks=True)
+    assert client.login(username=user.username, password='password0')
+    token = client.get(reverse('api-csrf')).cookies['csrftoken'].value
+
+    data = {
+        'file': SimpleUploadedFile('session.txt', b'session upload', content_type='text/plain'),
+        'csrfmiddlewaretoken': token,
+    }
+    response = client.post(reverse('storagefiles-list'), data, format='multipart')
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data['checksum'] == hashlib.sha256(b'session upload').hexdigest()
+
+    data = {'original_name': 'chunked.bin', 'size': 10, 'csrfmiddlewaretoken': token}
+    response = client.post(reverse('storagefiles-upload-init'), data, format='multipart')
+    assert response.status_code == status.HTTP_201_CREATED
+
+    # без токена запрос отклоняется проверкой CSRF
+    data = {'file': SimpleUploadedFile('session.txt', b'x', content_type='text/plain')}
+    assert client.post(reverse('storagefiles-list'), data, format='multipart').status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,157 @@
+import os
+from datetime import timedelta
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from storage.models import Blob, FileVersion, StorageFiles, UserStorage
+
+
+@pytest.fixture
+def versioning(settings, media_root):
+    settings.FILE_VERSIONS = 2
+
+
+def replace(client, pk, content):
+    data = {'file': SimpleUploadedFile('notes.txt', content, content_type='text/plain')}
+    url = reverse('storagefiles-detail', kwargs={'pk': pk})
+    assert client.patch(url, data, format='multipart').status_code == status.HTTP_200_OK
+
+
+def list_versions(client, pk):
+    response = client.get(reverse('storagefiles-versions', kwargs={'pk': pk}))
+    assert response.status_code == status.HTTP_200_OK
+    return response.data
+
+
+def read(response):
+    return b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_versions_keep_previous_content(client, users, versioning, django_capture_on_commit_callbacks, upload):
+    client = client.login(users[0])
+    pk = upload(client, 'notes.txt', b'v1')['id']
+    first_path = StorageFiles.objects.get(pk=pk).file.path
+    with django_capture_on_commit_callbacks(execute=True):
+        replace(client, pk, b'v2')
+        # то же содержимое версию не создаёт
+        replace(client, pk, b'v2')
+        replace(client, pk, b'v3')
+
+    versions = list_versions(client, pk)
+    assert [version['size'] for version in versions] == [2, 2]
+    # прежнее содержимое не копируется: версия ссылается на исходный файл
+    assert FileVersion.objects.get(pk=versions[1]['id']).content.path == first_path
+
+    url = reverse('storagefiles-download-version', kwargs={'pk': pk, 'version_id': versions[1]['id']})
+    response = client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert read(response) == b'v1'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        replace(client, pk, b'v4')
+    # сверх FILE_VERSIONS удаляется самая старая версия вместе с содержимым
+    assert len(list_versions(client, pk)) == 2
+    assert not os.path.exists(first_path)
+    # хранимые версии учитываются в занятом месте
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 2 + 2 * 2
+
+
+@pytest.mark.django_db
+def test_restore_version(client, users, versioning, upload):
+    client = client.login(users[0])
+    pk = upload(client, 'notes.txt', b'first')['id']
+    replace(client, pk, b'second version')
+    version_id = list_versions(client, pk)[0]['id']
+
+    url = reverse('storagefiles-restore-version', kwargs={'pk': pk, 'version_id': version_id})
+    response = client.post(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['size'] == 5
+    file_instance = StorageFiles.objects.get(pk=pk)
+    with file_instance.file.open('rb') as f:
+        assert f.read() == b'first'
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 5 + 14
+
+    # текущее содержимое стало версией
+    versions = list_versions(client, pk)
+    assert [version['size'] for version in versions] == [14]
+    assert client.post(url).status_code == status.HTTP_404_NOT_FOUND
+
+    other = client.login(users[1])
+    assert other.get(reverse('storagefiles-versions', kwargs={'pk': pk})).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_delete_file_releases_versions(client, users, versioning, django_capture_on_commit_callbacks, upload):
+    client = client.login(users[0])
+    pk = upload(client, 'notes.txt', b'v1')['id']
+    version_path = StorageFiles.objects.get(pk=pk).file.path
+    replace(client, pk, b'v2')
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(reverse('storagefiles-bulk-delete'), {'ids': [pk]}, format='json')
+    assert response.status_code == status.HTTP_200_OK
+    assert not FileVersion.objects.exists()
+    assert not os.path.exists(version_path)
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 0
+
+
+@pytest.mark.django_db
+def test_versions_share_blobs(client, users, versioning, settings, django_capture_on_commit_callbacks, upload):
+    settings.STORAGE_DEDUPLICATION = True
+    client = client.login(users[0])
+    pk = upload(client, 'notes.txt', b'same')['id']
+    replace(client, pk, b'other')
+    replace(client, pk, b'same')
+    # одинаковое содержимое текущей версии и прежней хранится один раз
+    blob = Blob.objects.get(checksum=StorageFiles.objects.get(pk=pk).checksum)
+    assert blob.ref_count == 2
+
+    call_command('collect_blobs')
+    blob.refresh_from_db()
+    assert blob.ref_count == 2
+
+
+@pytest.mark.django_db
+def test_prune_versions_command(client, users, versioning, settings, django_capture_on_commit_callbacks, upload):
+    client = client.login(users[0])
+    pk = upload(client, 'notes.txt', b'v1')['id']
+    replace(client, pk, b'v2')
+    replace(client, pk, b'v3')
+    old, recent = FileVersion.objects.order_by('replaced_date', 'id')
+    FileVersion.objects.filter(pk=old.pk).update(replaced_date=timezone.now() - timedelta(days=10))
+    settings.FILE_VERSION_MAX_AGE = 24 * 60 * 60
+
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('prune_versions')
+    assert list(FileVersion.objects.values_list('pk', flat=True)) == [recent.pk]
+    assert not os.path.exists(old.content.path)
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 2 + 2
+
+    # после отключения версий удаляются все
+    settings.FILE_VERSIONS = 0
+    call_command('prune_versions')
+    assert not FileVersion.objects.exists()
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 2
+
+
+@pytest.mark.django_db
+def test_kept_version_counts_against_quota(client, users, versioning, upload):
+    client = client.login(users[0])
+    pk = upload(client, 'notes.txt', b'first')['id']
+    UserStorage.objects.filter(pk=users[0].pk).update(quota_bytes=10)
+    # новое содержимое (6 байт) и версия прежнего (5 байт) не помещаются в квоту
+    data = {'file': SimpleUploadedFile('notes.txt', b'second', content_type='text/plain')}
+    response = client.patch(reverse('storagefiles-detail', kwargs={'pk': pk}), data, format='multipart')
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    assert not FileVersion.objects.exists()
+
+    replace(client, pk, b'2nd')
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 3 + 5
+    call_command('reconcile_storage_usage')
+    assert UserStorage.objects.get(pk=users[0].pk).used_bytes == 3 + 5